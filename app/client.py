@@ -0,0 +1,313 @@
+"""Library API for services that poll Tesla orders from a long-lived process.
+
+Unlike the command line tool, nothing here parses ``sys.argv``, touches
+settings, prints, or calls ``sys.exit``. Everything is passed in
+explicitly and returned as plain data; failures raise :class:`TeslaAPIError`::
+
+    from app.client import TeslaOrderClient
+
+    client = TeslaOrderClient(access_token, language="de", country="DE")
+    orders = client.fetch_orders()
+    changes = client.diff(previous_orders, orders)
+    timeline = client.get_timeline(orders["RN123456789"], history["RN123456789"])
+
+For long-running services a :class:`~app.utils.tokens.TokenManager` keeps
+the tool's ``tesla_tokens.json`` fresh::
+
+    client = TeslaOrderClient(TokenManager(), background_refresh=True)
+
+Each ``fetch_*``/``diff`` method has an ``a``-prefixed coroutine twin
+(``afetch_orders`` ...) that runs the blocking HTTP calls in the default
+executor and fetches the tasks of all orders concurrently.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+import requests
+
+from app.config import (
+    TESLA_APP_VERSION,
+    TESLA_BASE_URLS,
+    TESLA_USER_AGENT,
+    TESLA_X_USER_AGENT,
+)
+from app.utils.orderdata import (
+    OrderMap,
+    build_timeline,
+    compare_orders,
+    filter_history_changes,
+    group_changes_by_reference,
+    has_relevant_changes,
+    project_orders,
+)
+from app.utils.shards import load_history as load_stored_history
+from app.utils.tokens import TokenManager
+
+TokenSource = Union[str, Callable[[], str], TokenManager]
+HistoryStore = Dict[str, List[Dict[str, Any]]]
+
+
+class TeslaAPIError(Exception):
+    """A request failed; ``status_code`` is ``None`` for network errors."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TeslaOrderClient:
+    """Fetch orders and derive changes, history and timelines as data.
+
+    *access_token* is a token string, a callable returning a current one
+    (called before every fetch, so the caller can refresh tokens however it
+    likes) or a :class:`TokenManager`, which refreshes ahead of expiry and,
+    with *background_refresh*, in a daemon thread until :meth:`close`. *base_urls* overrides entries of
+    ``TESLA_BASE_URLS`` (e.g. the stand-in server of
+    ``benchmarks.fake_tesla_api``). *projection* and *projection_paths*
+    work like the ``snapshot_projection`` settings of the tool and apply to
+    fetched orders and to both sides of :meth:`diff`.
+    """
+
+    def __init__(
+        self,
+        access_token: TokenSource,
+        *,
+        language: str = "en",
+        country: str = "US",
+        base_urls: Optional[Mapping[str, str]] = None,
+        session: Optional[requests.Session] = None,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        projection: str = "hash",
+        projection_paths: Sequence[str] = (),
+        background_refresh: bool = False,
+    ):
+        self._access_token = access_token
+        self._refreshing = background_refresh and isinstance(access_token, TokenManager)
+        if self._refreshing:
+            access_token.start_background_refresh()
+        self.language = language
+        self.country = country
+        urls = {**TESLA_BASE_URLS, **(base_urls or {})}
+        self.base_urls = {service: url.rstrip("/") for service, url in urls.items()}
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.max_retries = max(1, max_retries)
+        self.backoff = backoff
+        self.projection = projection
+        self.projection_paths = tuple(projection_paths)
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+    def _token(self) -> str:
+        if isinstance(self._access_token, TokenManager):
+            try:
+                return self._access_token.get_access_token()
+            except (requests.exceptions.RequestException, KeyError, ValueError) as e:
+                status_code = getattr(getattr(e, "response", None), "status_code", None)
+                raise TeslaAPIError(f"Token refresh failed: {e}", status_code) from e
+        token = self._access_token() if callable(self._access_token) else self._access_token
+        if not token:
+            raise TeslaAPIError("No access token")
+        return token
+
+    def _get_json(self, url: str, token: str) -> Any:
+        headers = {
+            'Authorization': f'Bearer {token}',
+            'User-Agent': TESLA_USER_AGENT,
+            'X-Tesla-User-Agent': TESLA_X_USER_AGENT,
+        }
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            headers['X-Request-Id'] = str(uuid.uuid4())
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                if last_attempt:
+                    raise TeslaAPIError(f"Request to {url} failed: {e}") from e
+                time.sleep(self.backoff * 2 ** attempt)
+                continue
+            if response.status_code >= 500 and not last_attempt:
+                time.sleep(self.backoff * 5 ** attempt)
+                continue
+            if response.status_code >= 400:
+                raise TeslaAPIError(f"{url} answered {response.status_code}", response.status_code)
+            try:
+                return response.json()
+            except ValueError as e:
+                raise TeslaAPIError(f"{url} answered with invalid JSON", response.status_code) from e
+        raise TeslaAPIError(f"Request to {url} failed")
+
+    # -------------------------
+    # Orders
+    # -------------------------
+    def fetch_order_list(self, token: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Return the raw order list of the account."""
+        payload = self._get_json(f"{self.base_urls['owner_api']}/api/1/users/orders", token or self._token())
+        orders = payload.get('response') if isinstance(payload, dict) else None
+        if not isinstance(orders, list):
+            raise TeslaAPIError("Unexpected order list response")
+        return orders
+
+    def fetch_order_details(self, reference: str, token: Optional[str] = None) -> Dict[str, Any]:
+        """Return the tasks payload of one order."""
+        url = (
+            f"{self.base_urls['tasks_api']}/tasks"
+            f"?deviceLanguage={self.language}"
+            f"&deviceCountry={self.country}"
+            f"&referenceNumber={reference}"
+            f"&appVersion={TESLA_APP_VERSION}"
+        )
+        details = self._get_json(url, token or self._token())
+        if not isinstance(details, dict) or not details.get('tasks'):
+            raise TeslaAPIError(f"Empty response for order {reference}")
+        return details
+
+    def fetch_orders(self) -> OrderMap:
+        """Return all orders as ``{reference: {"order": ..., "details": ...}}``.
+
+        This is the structure the tool stores per order in ``data/private/orders``.
+        """
+        token = self._token()
+        orders: OrderMap = OrderedDict()
+        for order in self.fetch_order_list(token):
+            reference = str(order['referenceNumber'])
+            orders[reference] = {'order': order, 'details': self.fetch_order_details(reference, token)}
+        return project_orders(orders, self.projection, self.projection_paths)
+
+    def diff(self, snapshot: Any, orders: Any = None) -> List[Dict[str, Any]]:
+        """Return the changes from *snapshot* to *orders* (fetched when omitted).
+
+        Every change carries ``operation``, ``key`` and ``order_reference``,
+        like the changes the tool appends to its history.
+        """
+        if orders is None:
+            orders = self.fetch_orders()
+        return self._compare(snapshot, orders)
+
+    def _compare(self, snapshot: Any, orders: Any) -> List[Dict[str, Any]]:
+        return compare_orders(
+            project_orders(snapshot, self.projection, self.projection_paths),
+            project_orders(orders, self.projection, self.projection_paths),
+        )
+
+    # -------------------------
+    # History and timeline
+    # -------------------------
+    @staticmethod
+    def history_entries(changes: List[Dict[str, Any]], timestamp: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Group *changes* of :meth:`diff` into one history entry per order.
+
+        Appending these to the lists of the history store is what the tool
+        does after every run that found changes.
+        """
+        timestamp = timestamp or time.strftime('%Y-%m-%d')
+        return {
+            reference: {'timestamp': timestamp, 'changes': reference_changes}
+            for reference, reference_changes in group_changes_by_reference(changes).items()
+        }
+
+    @staticmethod
+    def has_relevant_changes(changes: List[Dict[str, Any]]) -> bool:
+        """Return what ``--status`` reports as exit code 1: a change outside the ignored keys."""
+        return has_relevant_changes(changes)
+
+    @staticmethod
+    def load_history(path: Optional[Union[str, Path]] = None) -> HistoryStore:
+        """Read the history the tool stored in ``data/private/orders``.
+
+        *path* reads a single history file of the layout before the per-order
+        storage instead; missing files give ``{}``.
+        """
+        if path is None:
+            return load_stored_history()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                history = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            raise TeslaAPIError(f"Cannot read history {path}: {e}") from e
+        if not isinstance(history, dict):
+            return {}
+        return {
+            str(reference): [entry for entry in entries if isinstance(entry, dict)]
+            for reference, entries in history.items()
+            if isinstance(entries, list)
+        }
+
+    @staticmethod
+    def get_history(
+        history_entries: List[Dict[str, Any]],
+        *,
+        details: bool = False,
+        all_keys: bool = False,
+        anonymize: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Return the readable changes of one order's raw *history_entries*.
+
+        The flags correspond to ``--details``, ``--all`` and ``--share``.
+        """
+        return filter_history_changes(history_entries, all_keys=all_keys, details=details, anonymize=anonymize)
+
+    @staticmethod
+    def get_timeline(
+        detailed_order: Dict[str, Any],
+        history_entries: Optional[List[Dict[str, Any]]] = None,
+        *,
+        anonymize: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """Return the sorted timeline of one order.
+
+        Entries have ``timestamp``, ``key``, ``value`` and ``epoch``; values
+        that were emptied carry ``"removed": True`` instead of a translated
+        text.
+        """
+        return build_timeline(detailed_order, history_entries or [], anonymize)
+
+    # -------------------------
+    # asyncio
+    # -------------------------
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+    async def afetch_orders(self) -> OrderMap:
+        """Coroutine version of :meth:`fetch_orders`; order tasks are fetched concurrently."""
+        token = await self._run(self._token)
+        order_list = await self._run(self.fetch_order_list, token)
+        references = [str(order['referenceNumber']) for order in order_list]
+        details = await asyncio.gather(*(self._run(self.fetch_order_details, reference, token) for reference in references))
+        orders: OrderMap = OrderedDict()
+        for reference, order, order_details in zip(references, order_list, details):
+            orders[reference] = {'order': order, 'details': order_details}
+        return project_orders(orders, self.projection, self.projection_paths)
+
+    async def adiff(self, snapshot: Any, orders: Any = None) -> List[Dict[str, Any]]:
+        """Coroutine version of :meth:`diff`."""
+        if orders is None:
+            orders = await self.afetch_orders()
+        return self._compare(snapshot, orders)
+
+    def close(self) -> None:
+        if self._refreshing:
+            self._access_token.stop_background_refresh()
+            self._refreshing = False
+        self.session.close()
+
+    def __enter__(self) -> "TeslaOrderClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
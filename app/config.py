@@ -1,8 +1,9 @@
 import json
+import os
 import re
 import time
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Tuple
 
 # -------------------------
 # Constants
@@ -14,6 +15,22 @@ TODAY = time.strftime('%Y-%m-%d')
 TELEMETRIC_URL = "https://www.tesla-order-status-tracker.de/push/telemetry.php"
 OPTION_CODES_URL = "https://www.tesla-order-status-tracker.de/push/option_codes.php"
 VERSION = "p1.2.5"
+# Base URLs of the Tesla services and the option code catalogue, see get_base_url()
+TESLA_BASE_URLS = {
+    "owner_api": "https://owner-api.teslamotors.com",
+    "tasks_api": "https://akamai-apigateway-vfx.tesla.com",
+    "auth": "https://auth.tesla.com",
+    "option_codes": "https://www.tesla-order-status-tracker.de",
+}
+# What happens to UI-only subtrees of order snapshots, see get_snapshot_projection()
+SNAPSHOT_PROJECTION_MODES = ("hash", "drop", "off")
+# Rules of the history compaction, see get_history_compaction_policy(); 0 disables a limit
+HISTORY_COMPACTION_DEFAULTS = {
+    "coalesce_same_day": True,
+    "max_changes_per_key": 20,
+    "archive_after_days": 365,
+    "auto_compact_kb": 256,
+}
 
 # -------------------------
 # Directory structure (new)
@@ -25,19 +42,30 @@ PUBLIC_DIR = DATA_DIR / "public"
 PRIVATE_DIR = DATA_DIR / "private"
 
 TOKEN_FILE = PRIVATE_DIR / 'tesla_tokens.json'
+# one snapshot and one history file per order, see app/utils/shards.py
+ORDERS_DIR = PRIVATE_DIR / 'orders'
+ORDERS_INDEX_FILE = ORDERS_DIR / 'index.json'
+# single-file layout before the per-order storage, only read by migrations
 ORDERS_FILE = PRIVATE_DIR / 'tesla_orders.json'
 HISTORY_FILE = PRIVATE_DIR / 'tesla_order_history.json'
+TIMELINE_FILE = PRIVATE_DIR / 'tesla_order_timeline.json'
+HISTORY_INDEX_FILE = PRIVATE_DIR / 'tesla_order_history_index.json'
 TESLA_STORES_FILE = PUBLIC_DIR / 'tesla_locations.json'
 SETTINGS_FILE = PRIVATE_DIR / 'settings.json'
+RESPONSE_CACHE_DIR = PRIVATE_DIR / 'response_cache'
+
+# Seconds a cached API response is fresh, and how much longer it may be served
+# while a fresh one is fetched in the background. Override per endpoint with
+# "response_cache": {"tasks": {"max_age": 120}} in settings.json.
+RESPONSE_CACHE_POLICY = {
+    "orders": {"max_age": 60, "stale_while_revalidate": 300},
+    "tasks": {"max_age": 60, "stale_while_revalidate": 300},
+}
 
 # -------------------------
 # Dataobjects
 # -------------------------
-try:
-    with open(TESLA_STORES_FILE, encoding="utf-8") as f:
-        TESLA_STORES = json.load(f)
-except:
-    TESLA_STORES = {}
+# Tesla stores are loaded lazily as a compact table, see app/utils/stores.py
 
 class Config:
     def __init__(self, path: Path):
@@ -75,7 +103,14 @@ class Config:
         return self._cfg.get(key, default)
 
     def set(self, key: str, value: Any) -> None:
-        self._cfg[key] = value
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """Set several keys with a single write; unchanged values are not written."""
+        changed = {key: value for key, value in values.items() if key not in self._cfg or self._cfg[key] != value}
+        if not changed:
+            return
+        self._cfg.update(changed)
         self.save()
 
     def has(self, key: str) -> bool:
@@ -86,3 +121,57 @@ class Config:
         self.save()
 
 cfg = Config(SETTINGS_FILE)
+
+
+def get_base_url(service: str) -> str:
+    """Return the base URL of a *service* (a key of TESLA_BASE_URLS) without trailing slash.
+
+    ``TOST_<SERVICE>_URL`` in the environment or ``"<service>_url"`` in
+    settings.json take precedence, e.g. to point the tool at the local
+    stand-in server (``python -m benchmarks.fake_tesla_api``).
+    """
+    override = os.environ.get(f"TOST_{service.upper()}_URL") or cfg.get(f"{service}_url")
+    if isinstance(override, str) and override.strip():
+        return override.strip().rstrip("/")
+    return TESLA_BASE_URLS[service]
+
+
+def get_snapshot_projection() -> Tuple[str, List[str]]:
+    """Return the mode and extra paths of the order snapshot projection.
+
+    ``"snapshot_projection"`` in settings.json is ``"hash"`` (default: UI-only
+    subtrees are replaced by a digest, so changes are still noticed),
+    ``"drop"`` or ``"off"``. ``"snapshot_projection_paths"`` adds subtree
+    prefixes like ``"details.tasks.insurance.strings."``.
+    """
+    mode = cfg.get("snapshot_projection", SNAPSHOT_PROJECTION_MODES[0])
+    if mode not in SNAPSHOT_PROJECTION_MODES:
+        mode = SNAPSHOT_PROJECTION_MODES[0]
+    paths = cfg.get("snapshot_projection_paths", [])
+    if not isinstance(paths, list):
+        paths = []
+    return mode, [path for path in paths if isinstance(path, str) and path]
+
+
+def get_history_compaction_policy() -> Dict[str, Any]:
+    """Return the rules of the history compaction.
+
+    ``"history_compaction"`` in settings.json overrides single values of
+    ``HISTORY_COMPACTION_DEFAULTS``: ``coalesce_same_day`` merges the changes
+    of one day per order and key, ``max_changes_per_key`` and
+    ``archive_after_days`` move older changes into the archive and
+    ``auto_compact_kb`` compacts an order automatically once its history file
+    is larger. Numbers of ``0`` switch the rule off.
+    """
+    policy: Dict[str, Any] = dict(HISTORY_COMPACTION_DEFAULTS)
+    overrides = cfg.get("history_compaction", {})
+    if not isinstance(overrides, dict):
+        return policy
+    for name, default in HISTORY_COMPACTION_DEFAULTS.items():
+        value = overrides.get(name)
+        if isinstance(default, bool):
+            if isinstance(value, bool):
+                policy[name] = value
+        elif isinstance(value, int) and not isinstance(value, bool) and value >= 0:
+            policy[name] = value
+    return policy
@@ -5,6 +5,7 @@ Migration: 2025-11-12-history-reference
   und speichert die Änderungen gruppiert pro Order.
 - Verwendet `tesla_orders.json`, um alte numerische Indizes den richtigen Referenzen zuzuordnen.
 - Idempotent: Wenn die Datei bereits im neuen Dict-Format vorliegt, passiert nichts.
+- Streamt Eintrag für Eintrag (siehe app.utils.migration.regroup_history), inkl. Checkpoint/Resume und Dry-Run.
 """
 from __future__ import annotations
 
@@ -14,6 +15,9 @@ from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
 from app.config import ORDERS_FILE, HISTORY_FILE
+from app.utils.migration import regroup_history
+
+MIGRATION_NAME = "2025-11-12-history-reference"
 
 
 def _load_json(path: Path) -> Any:
@@ -21,12 +25,6 @@ def _load_json(path: Path) -> Any:
         return json.load(f)
 
 
-def _save_json(path: Path, data: Any) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f)
-
-
 def _extract_reference(entry: Any) -> Optional[str]:
     if not isinstance(entry, dict):
         return None
@@ -96,55 +94,42 @@ def _resolve_reference_and_key(change: Dict[str, Any], index_map: Dict[str, str]
     return ref_str, normalized_key
 
 
-def _migrate_history(history: List[Dict[str, Any]], index_map: Dict[str, str]) -> Dict[str, List[Dict[str, Any]]]:
-    grouped_history: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-
-    for entry in history:
-        if not isinstance(entry, dict):
-            continue
-        timestamp = entry.get("timestamp")
-        entry_changes = entry.get("changes", [])
-        if not isinstance(entry_changes, list):
+def _split_entry(entry: Any, index_map: Dict[str, str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """Teilt einen alten History-Eintrag in je einen Eintrag pro Referenz auf."""
+    if not isinstance(entry, dict):
+        return []
+    entry_changes = entry.get("changes", [])
+    if not isinstance(entry_changes, list):
+        return []
+
+    per_reference: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for change in entry_changes:
+        reference, key = _resolve_reference_and_key(change, index_map)
+        if not reference:
             continue
-
-        per_reference: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
-        for change in entry_changes:
-            reference, key = _resolve_reference_and_key(change, index_map)
-            if not reference:
-                continue
-            normalized_change = {
-                "operation": change.get("operation"),
-                "key": key,
-                "value": change.get("value"),
-                "old_value": change.get("old_value"),
-            }
-            per_reference[reference].append(normalized_change)
-
-        for reference, changes in per_reference.items():
-            if not changes:
-                continue
-            grouped_history[str(reference)].append({
-                "timestamp": timestamp,
-                "changes": changes
-            })
-
-    return dict(grouped_history)
-
-
-def run() -> None:  # noqa: ARG001
+        per_reference[reference].append({
+            "operation": change.get("operation"),
+            "key": key,
+            "value": change.get("value"),
+            "old_value": change.get("old_value"),
+        })
+    return [
+        (str(reference), {"timestamp": entry.get("timestamp"), "changes": changes})
+        for reference, changes in per_reference.items()
+        if changes
+    ]
+
+
+def run(dry_run: bool = False) -> Dict[str, int]:
     if not HISTORY_FILE.exists():
-        return
-    try:
-        history = _load_json(HISTORY_FILE)
-    except Exception:
-        return
-
-    if isinstance(history, dict):
-        return
-    if not isinstance(history, list):
-        return
-
+        return {}
     index_map = _build_index_map()
-    migrated = _migrate_history(history, index_map)
-    if migrated:
-        _save_json(HISTORY_FILE, migrated)
+    try:
+        return regroup_history(
+            MIGRATION_NAME,
+            lambda entry: _split_entry(entry, index_map),
+            path=HISTORY_FILE,
+            dry_run=dry_run,
+        )
+    except ValueError:
+        return {}
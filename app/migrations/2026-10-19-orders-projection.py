@@ -0,0 +1,44 @@
+"""
+Migration: 2026-10-19-orders-projection
+- Wendet die Snapshot-Projektion (siehe `app.utils.orderdata.project_order`) auf
+  `tesla_orders.json` an: UI-Texte (`strings.`, `card.` ...) und andere ignorierte
+  Teilbäume werden durch einen Digest ersetzt bzw. mit `"snapshot_projection": "drop"`
+  entfernt.
+- Keine Aktion bei `"snapshot_projection": "off"` oder fehlender Datei; idempotent.
+"""
+from __future__ import annotations
+
+import json
+from typing import Dict
+
+from app.config import ORDERS_FILE, get_snapshot_projection
+from app.utils.orderdata import project_orders
+
+
+def run(dry_run: bool = False) -> Dict[str, int]:
+    mode, extra_paths = get_snapshot_projection()
+    if mode == "off" or not ORDERS_FILE.exists():
+        return {}
+    try:
+        with open(ORDERS_FILE, "r", encoding="utf-8") as f:
+            orders = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(orders, dict):
+        return {}
+
+    projected = project_orders(orders, mode, extra_paths)
+    text = json.dumps(projected)
+    stats = {
+        "orders": len(projected),
+        "changed": sum(1 for reference, order in projected.items() if order != orders.get(reference)),
+        "bytes_before": ORDERS_FILE.stat().st_size,
+        "bytes_after": len(text.encode("utf-8")),
+    }
+    if dry_run or not stats["changed"]:
+        return stats
+
+    tmp = ORDERS_FILE.with_suffix(ORDERS_FILE.suffix + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    tmp.replace(ORDERS_FILE)
+    return stats
@@ -0,0 +1,17 @@
+"""
+Migration: 2026-10-19-orders-shards
+- Verschiebt `tesla_orders.json` und `tesla_order_history.json` in die Ablage pro
+  Bestellung unter `data/private/orders` (siehe `app.utils.shards`): je Referenz
+  eine Snapshot- und eine Historien-Datei, dazu `index.json`.
+- Die alten Dateien werden erst gelöscht, wenn die neue Ablage dieselben Daten
+  zurückliefert. Keine Aktion, wenn beide Dateien fehlen; idempotent.
+"""
+from __future__ import annotations
+
+from typing import Dict
+
+from app.utils.shards import import_single_files
+
+
+def run(dry_run: bool = False) -> Dict[str, int]:
+    return import_single_files(dry_run=dry_run)
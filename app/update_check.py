@@ -1,13 +1,18 @@
 #!/usr/bin/env python3
 # coding: utf-8
 """
-check_files_fixed_list.py
+update_check.py
 
-The files to check are stored in FILES_TO_CHECK (array).
-Compares the newest mtime from this list with the last commit
-of the fixed Atom feed:
+Checks that the files in FILES_TO_CHECK exist and compares the upstream
+commit recorded in the install manifest (see app/utils/manifest.py) with
+the last commit of the fixed Atom feed:
   https://github.com/chrisi51/tesla-order-status/commits/main.atom
 
+The feed is fetched at most every ``update_check_interval`` seconds
+(settings.json) in a background thread; its result is persisted in
+UPDATE_STATE_FILE and acted upon on the next run, so the check never
+delays the order display.
+
 Exit codes:
   0 -> everything up to date
   1 -> Repo has newer commit (Update available)
@@ -17,18 +22,32 @@ from __future__ import annotations
 from pathlib import Path
 from datetime import datetime, timezone
 import xml.etree.ElementTree as ET
-from typing import List, Optional, Dict
+from typing import Any, Iterator, List, Optional, Dict, Tuple
+import atexit
+import hashlib
+import json
 import requests
 import os
 import sys
 import shutil
 import tempfile
+import threading
+import time
+import zipfile
 
-from app.config import APP_DIR, BASE_DIR, PUBLIC_DIR, TESLA_STORES_FILE, cfg as Config
+from app.config import APP_DIR, BASE_DIR, PRIVATE_DIR, PUBLIC_DIR, TESLA_STORES_FILE, cfg as Config
 from app.utils.colors import color_text
-from app.utils.helpers import exit_with_status
+from app.utils.helpers import exit_with_status, report_status
+from app.utils.json_output import emit_record
 from app.utils.locale import t
-from app.utils.params import STATUS_MODE
+from app.utils.manifest import (
+    build_manifest_files,
+    file_sha256,
+    is_installation_path,
+    load_manifest,
+    save_manifest,
+)
+from app.utils.params import JSON_OUTPUT, QUIET_MODE
 
 # ---------------------------
 # files to check
@@ -62,11 +81,17 @@ BRANCH = "main"
 FEED_URL = "https://github.com/chrisi51/tesla-order-status"
 ZIP_URL = f"{FEED_URL}/archive/refs/heads/{BRANCH}.zip"
 REQUEST_TIMEOUT = 10  # Sekunden
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+UPDATE_STATE_FILE = PRIVATE_DIR / "update_check.json"
+UPDATE_CHECK_INTERVAL = 6 * 3600  # Sekunden; override with "update_check_interval" in settings.json
+UPDATE_CHECK_JOIN_TIMEOUT = 2  # max. Wartezeit beim Beenden auf einen laufenden Check
+_CHECK_THREAD: Optional[threading.Thread] = None
 
 # ---------------------------
 # Helfer
 # ---------------------------
-def get_latest_updated_from_atom(url: str, timeout: int = REQUEST_TIMEOUT) -> datetime:
+def get_latest_commit_from_atom(url: str, timeout: int = REQUEST_TIMEOUT) -> Tuple[Optional[str], datetime]:
+    """Return ``(commit_id, updated)`` of the newest entry of the Atom feed."""
     resp = requests.get(url, timeout=timeout)
     resp.raise_for_status()
     root = ET.fromstring(resp.content)
@@ -86,7 +111,16 @@ def get_latest_updated_from_atom(url: str, timeout: int = REQUEST_TIMEOUT) -> da
         dt = dt.replace(tzinfo=timezone.utc)
     else:
         dt = dt.astimezone(timezone.utc)
-    return dt
+    # <id>tag:github.com,2008:Grit::Commit/<sha></id>
+    entry_id = entry.find('atom:id', ns)
+    commit = None
+    if entry_id is not None and entry_id.text:
+        commit = entry_id.text.strip().rsplit('/', 1)[-1] or None
+    return commit, dt
+
+
+def get_latest_updated_from_atom(url: str, timeout: int = REQUEST_TIMEOUT) -> datetime:
+    return get_latest_commit_from_atom(url, timeout)[1]
 
 def mtime_of_file(path: Path) -> Optional[datetime]:
     """Returns mtime as timezone-aware UTC datetime or None if non-existent / not a file."""
@@ -109,51 +143,100 @@ def human_delta(a: datetime, b: datetime) -> str:
     return f"{days}d {hrs}h {mins}m"
 
 
-def _copytree_compat(src: Path, dst: Path) -> None:
-    """Recursively copy files supporting Python versions without dirs_exist_ok."""
-    if sys.version_info >= (3, 8):
-        shutil.copytree(src, dst, dirs_exist_ok=True)
-        return
+def _download_to_file(url: str, target: Path, timeout: int = REQUEST_TIMEOUT) -> None:
+    """Stream *url* to *target* in chunks instead of holding it in memory."""
+    with requests.get(url, timeout=timeout, stream=True) as resp:
+        resp.raise_for_status()
+        with open(target, "wb") as f:
+            for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    f.write(chunk)
+
+
+def _iter_archive_members(zf: zipfile.ZipFile) -> Iterator[Tuple[zipfile.ZipInfo, str]]:
+    """Yield (member, path relative to the installation) for all installable files."""
+    for info in zf.infolist():
+        if info.is_dir():
+            continue
+        # GitHub archives wrap everything in "<repo>-<branch>/"
+        parts = info.filename.split("/", 1)
+        if len(parts) < 2 or not parts[1]:
+            continue
+        relative = parts[1]
+        if relative.startswith("/") or ".." in relative.split("/"):
+            continue
+        if is_installation_path(relative):
+            yield info, relative
+
+
+def _member_sha256(zf: zipfile.ZipFile, info: zipfile.ZipInfo) -> str:
+    digest = hashlib.sha256()
+    with zf.open(info) as fh:
+        for chunk in iter(lambda: fh.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _install_from_archive(zip_path: Path, installed: Optional[Dict[str, str]]) -> Tuple[Dict[str, str], int]:
+    """Replace changed files of the installation with the archive contents.
+
+    Files whose hash matches *installed* (the manifest) are skipped; without a
+    manifest every file is copied. Changed files are staged next to their
+    target, verified and only then swapped in with ``os.replace``.
+    Returns the new manifest file map and the number of replaced files.
+    """
+    files: Dict[str, str] = {}
+    staged: List[Tuple[Path, Path, str]] = []
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            for info, relative in _iter_archive_members(zf):
+                target = BASE_DIR / relative
+                digest = _member_sha256(zf, info)
+                files[relative] = digest
+                if installed is not None and installed.get(relative) == digest and target.is_file():
+                    continue
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(f".{target.name}.update")
+                with zf.open(info) as src, open(tmp, "wb") as dst:
+                    shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
+                staged.append((tmp, target, digest))
+
+        for tmp, target, digest in staged:
+            if file_sha256(tmp) != digest:
+                raise ValueError(f"Verification failed for {target}")
+        for tmp, target, _ in staged:
+            os.replace(tmp, target)
+    finally:
+        for tmp, _, _ in staged:
+            if tmp.exists():
+                tmp.unlink()
+    return files, len(staged)
 
-    if dst.exists() and not dst.is_dir():
-        raise ValueError(f"Target path {dst} exists and is not a directory")
-    dst.mkdir(parents=True, exist_ok=True)
-    for child in src.iterdir():
-        target = dst / child.name
-        if child.is_dir():
-            _copytree_compat(child, target)
-        else:
-            shutil.copy2(child, target)
 
 def perform_update(url: str = ZIP_URL, timeout: int = REQUEST_TIMEOUT) -> bool:
     """
-    Download and extract a zip archive to the current directory.
-    Existing files will be overwritten.
+    Download the zip archive and install it over the current installation.
+    Only files that differ from the install manifest are replaced.
     """
     try:
-        resp = requests.get(url, timeout=timeout)
-        resp.raise_for_status()
+        manifest = load_manifest()
         with tempfile.TemporaryDirectory() as tmpdir:
             zip_path = Path(tmpdir) / "repo.zip"
-            with open(zip_path, "wb") as f:
-                f.write(resp.content)
-            shutil.unpack_archive(str(zip_path), tmpdir)
-            extracted_dir = next(p for p in Path(tmpdir).iterdir() if p.is_dir())
-            for item in extracted_dir.iterdir():
-                target = Path(".") / item.name
-                if item.is_dir():
-                    _copytree_compat(item, target)
-                else:
-                    shutil.copy2(item, target)
+            _download_to_file(url, zip_path, timeout)
+            files, _ = _install_from_archive(zip_path, manifest["files"] if manifest else None)
+        _record_installed_version(files)
     except Exception as e:
         exit_with_status(t("[ERROR] Update failed: {error}").format(error=e))
         return False
 
-    if not STATUS_MODE:
-        print(t("[UPDATED] Files successfully downloaded and extracted."))
+    if not QUIET_MODE or JSON_OUTPUT:
+        # JSON consumers still expect the orders: restart into the new version
+        if not QUIET_MODE:
+            print(t("[UPDATED] Files successfully downloaded and extracted."))
+        sys.stdout.flush()
         os.execv(sys.executable, [sys.executable] + sys.argv)
     else:
-        print(0)
+        report_status(0)
         sys.exit()
 
 
@@ -161,14 +244,17 @@ def ask_for_update():
     if Config.get("update_method") == "automatically":
         return 0 if perform_update() else 2
     else:
-        if not STATUS_MODE:
+        if not QUIET_MODE:
             answer = input(t("Do you want to download and extract the update? (y/n): ")).strip().lower()
             if answer == "y":
                 return 0 if perform_update() else 2
             else:
                 return 1
+        elif JSON_OUTPUT:
+            # the update_available record is out, the orders follow
+            return 1
         else:
-            print(2)
+            report_status(2)
             sys.exit()
 
 
@@ -188,70 +274,172 @@ def ask_for_update_consent():
     else:
         Config.set("update_method", "manual")
 
+# ---------------------------
+# Persisted check state
+# ---------------------------
+def _load_state() -> Dict[str, Any]:
+    try:
+        with open(UPDATE_STATE_FILE, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if isinstance(state, dict):
+            return state
+    except (OSError, ValueError):
+        pass
+    return {}
+
+
+def _save_state(state: Dict[str, Any]) -> None:
+    UPDATE_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = UPDATE_STATE_FILE.with_suffix(UPDATE_STATE_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(UPDATE_STATE_FILE)
+
+
+def _get_check_interval() -> int:
+    value = Config.get("update_check_interval", UPDATE_CHECK_INTERVAL)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return UPDATE_CHECK_INTERVAL
+
+
+def _is_check_due(state: Dict[str, Any]) -> bool:
+    last_checked = state.get("last_checked")
+    if not isinstance(last_checked, (int, float)):
+        return True
+    return time.time() - last_checked >= _get_check_interval()
+
+
+def _check_feed() -> None:
+    """Fetch the Atom feed and persist the result for the next run."""
+    state = _load_state()
+    state["last_checked"] = time.time()
+    try:
+        commit, updated = get_latest_commit_from_atom(f"{FEED_URL}/commits/{BRANCH}.atom")
+        state["latest_commit"] = commit
+        state["latest_updated"] = updated.isoformat()
+        state.pop("error", None)
+    except Exception as e:
+        state["error"] = str(e)
+    try:
+        _save_state(state)
+    except OSError:
+        pass
+
+
+def _finish_background_check() -> None:
+    if _CHECK_THREAD is not None and _CHECK_THREAD.is_alive():
+        _CHECK_THREAD.join(UPDATE_CHECK_JOIN_TIMEOUT)
+
+
+def start_background_check() -> None:
+    global _CHECK_THREAD
+    if _CHECK_THREAD is not None:
+        return
+    _CHECK_THREAD = threading.Thread(target=_check_feed, name="update-check", daemon=True)
+    _CHECK_THREAD.start()
+    # give a running check a short grace period at exit so its result is stored
+    atexit.register(_finish_background_check)
+
+
+def _bootstrap_manifest() -> Dict[str, Any]:
+    """Create the install manifest for installations that predate it.
+
+    The installed version is unknown, so the newest mtime of FILES_TO_CHECK is
+    used once as its date (the former heuristic); afterwards only the manifest counts.
+    """
+    mtimes = [m for m in (mtime_of_file(Path(p)) for p in FILES_TO_CHECK) if m is not None]
+    installed = max(mtimes).isoformat() if mtimes else None
+    return save_manifest(build_manifest_files(), commit=None, updated=installed)
+
+
+def _record_installed_version(files: Dict[str, str]) -> None:
+    state = _load_state()
+    save_manifest(
+        files,
+        commit=state.get("latest_commit"),
+        updated=state.get("latest_updated") or datetime.now(timezone.utc).isoformat(),
+    )
+
+
+def _parse_state_datetime(value: Any) -> Optional[datetime]:
+    if not isinstance(value, str):
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
 # ---------------------------
 # Main-Logic
 # ---------------------------
 def main() -> int:
 
     if not Config.has("update_method") or Config.get("update_method") == "":
-        if STATUS_MODE:
+        if JSON_OUTPUT:
+            # no prompt in JSON output; the orders are still written
+            emit_record({
+                "type": "error",
+                "message": "No update method chosen yet. Run the script once without parameters.",
+            })
+            return 0
+        if QUIET_MODE:
             # Signal that manual intervention is required without prompting.
-            print(2)
+            report_status(2)
             sys.exit()
 
         ask_for_update_consent()
 
     if Config.get("update_method") == "block":
         return 0
-    # Lade Feed
-    try:
-        last_commit_dt = get_latest_updated_from_atom(f"{FEED_URL}/commits/{BRANCH}.atom")
-    except Exception as e:
-        if not STATUS_MODE:
-            print(t("[ERROR] Could not load Atom feed for update check: {error}").format(error=e), file=sys.stderr)
-        else:
-            print(-1)
-            sys.exit()
-        return 2
 
     errors = 0
     # Check the files
-    mtimes: Dict[str, datetime] = {}
     for p in FILES_TO_CHECK:
         path = Path(p)
-        m = mtime_of_file(path)
-        if m is None:
+        if path.is_file():
+            continue
+        errors += 1
+        if not QUIET_MODE:
             if not path.exists():
-                errors += 1
-                if not STATUS_MODE:
-                    print(t("[WARN] File missing: {path}").format(path=p))
+                print(t("[WARN] File missing: {path}").format(path=p))
             else:
-                errors += 1
-                if not STATUS_MODE:
-                    print(t("[WARN] Path is not a file and could not get read: {path}").format(path=p))
-            continue
-        mtimes[p] = m
+                print(t("[WARN] Path is not a file and could not get read: {path}").format(path=p))
 
-    if not mtimes:
-        errors += 1
-        if not STATUS_MODE:
-            print(t("[ERROR] No valid files found in FILES_TO_CHECK."), file=sys.stderr)
     if errors > 0:
-        if not STATUS_MODE:
+        if not QUIET_MODE:
             print(t("[PACKAGE CORRUPT]"))
             print(t("Your Project is missing some files. Please download the complete project."))
             return ask_for_update()
         else:
-            print(-1)
+            report_status(-1)
             sys.exit()
 
-    # Neuestes (jüngstes) mtime unter den angegebenen Dateien
-    newest_path, newest_dt = max(mtimes.items(), key=lambda kv: kv[1])
+    manifest = load_manifest() or _bootstrap_manifest()
+    state = _load_state()
+    if _is_check_due(state):
+        start_background_check()
+
+    latest_commit = state.get("latest_commit")
+    latest_dt = _parse_state_datetime(state.get("latest_updated"))
+    installed_dt = _parse_state_datetime(manifest.get("updated"))
+    if latest_dt is None:
+        return 0
+
+    if manifest.get("commit") and latest_commit:
+        update_available = latest_commit != manifest["commit"] and (installed_dt is None or latest_dt > installed_dt)
+    else:
+        update_available = installed_dt is None or latest_dt > installed_dt
 
-    if last_commit_dt > newest_dt:
-        if not STATUS_MODE:
+    if update_available:
+        if JSON_OUTPUT:
+            emit_record({"type": "update_available", "commit": latest_commit, "updated": latest_dt.isoformat()})
+        elif not QUIET_MODE:
             print(t("[UPDATE AVAILABLE]"))
-            print(t("Last Update: {delta} younger than your version =)").format(delta=human_delta(last_commit_dt, newest_dt)))
+            if installed_dt is not None:
+                print(t("Last Update: {delta} younger than your version =)").format(delta=human_delta(latest_dt, installed_dt)))
 
         return ask_for_update()
 
@@ -7,17 +7,25 @@ import urllib.parse
 import webbrowser
 import requests
 import sys
-from app.config import TOKEN_FILE
+from typing import Any, Dict, Optional
+from app.config import TOKEN_FILE, cfg as Config, get_base_url
 from app.utils.colors import color_text
 from app.utils.connection import request_with_retry
-from app.utils.helpers import exit_with_status
+from app.utils.helpers import exit_with_status, report_status
 from app.utils.locale import t
-from app.utils.params import STATUS_MODE
-
-CLIENT_ID = 'ownerapi'
-REDIRECT_URI = 'https://auth.tesla.com/void/callback'
-AUTH_URL = 'https://auth.tesla.com/oauth2/v3/authorize'
-TOKEN_URL = 'https://auth.tesla.com/oauth2/v3/token'
+from app.utils.params import QUIET_MODE
+from app.utils.tokens import (
+    CLIENT_ID,
+    TOKEN_REFRESH_SKEW,
+    TokenManager as BaseTokenManager,
+    decode_token_expiry,
+    save_tokens,
+)
+
+AUTH_BASE_URL = get_base_url('auth')
+REDIRECT_URI = f'{AUTH_BASE_URL}/void/callback'
+AUTH_URL = f'{AUTH_BASE_URL}/oauth2/v3/authorize'
+TOKEN_URL = f'{AUTH_BASE_URL}/oauth2/v3/token'
 SCOPE = 'openid email offline_access'
 CODE_CHALLENGE_METHOD = 'S256'
 STATE = os.urandom(16).hex()
@@ -81,21 +89,15 @@ def _exchange_code_for_tokens(auth_code,code_verifier):
     return response.json()
 
 
-def _save_tokens_to_file(tokens):
-    with open(TOKEN_FILE, 'w') as f:
-        json.dump(tokens, f)
-    if not STATUS_MODE:
+def _save_tokens_to_file(tokens, quiet=False):
+    save_tokens(tokens)
+    if not QUIET_MODE and not quiet:
         print(color_text(t("> Tokens saved to '{file}'").format(file=TOKEN_FILE), '94'))
 
 
-def _load_tokens_from_file():
-    with open(TOKEN_FILE, 'r') as f:
-        return json.load(f)
-
-
 def _is_token_valid(access_token):
-    jwt_decoded = json.loads(base64.b64decode(access_token.split('.')[1] + '==').decode('utf-8'))
-    return jwt_decoded['exp'] > time.time()
+    expires_at = decode_token_expiry(access_token)
+    return expires_at is not None and expires_at > time.time()
 
 
 def _refresh_tokens(refresh_token):
@@ -108,6 +110,31 @@ def _refresh_tokens(refresh_token):
     return response.json()
 
 
+def _get_refresh_skew() -> int:
+    value = Config.get("token_refresh_skew", TOKEN_REFRESH_SKEW)
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return TOKEN_REFRESH_SKEW
+
+
+class TokenManager(BaseTokenManager):
+    """The tool's :class:`app.utils.tokens.TokenManager`.
+
+    The skew comes from ``token_refresh_skew`` in settings.json, failed
+    refreshes end the run like other API errors and saved tokens are
+    announced outside the quiet modes.
+    """
+
+    def __init__(self, tokens: Optional[Dict[str, Any]] = None, skew: Optional[int] = None):
+        super().__init__(tokens, _get_refresh_skew() if skew is None else skew, auth_url=AUTH_BASE_URL)
+
+    def _request_refresh(self, refresh_token: str) -> Dict[str, Any]:
+        return _refresh_tokens(refresh_token)
+
+    def _save(self, tokens: Dict[str, Any], quiet: bool) -> None:
+        _save_tokens_to_file(tokens, quiet=quiet)
+
 
 # ---------------------------
 # Main-Logic
@@ -117,37 +144,33 @@ def main() -> str:
 
     if os.path.exists(TOKEN_FILE):
         try:
-            token_file = _load_tokens_from_file()
-            access_token = token_file['access_token']
-            refresh_token = token_file['refresh_token']
-
-            if not _is_token_valid(access_token):
-                if not STATUS_MODE:
+            manager = TokenManager()
+            if manager.needs_refresh():
+                if not QUIET_MODE and manager.is_expired():
                     print(color_text(t("> Access token is not valid anymore. Refreshing tokens..."), '94'))
-                token_response = _refresh_tokens(refresh_token)
-                access_token = token_response['access_token']
-                # refresh access token in file
-                token_file['access_token'] = access_token
-                _save_tokens_to_file(token_file)
+                manager.refresh()
+            access_token = manager.access_token
 
-        except (json.JSONDecodeError, KeyError) as e:
-            if not STATUS_MODE:
+        except (json.JSONDecodeError, KeyError):
+            if not QUIET_MODE:
                 print(color_text(t("> Error loading tokens from file. Re-authenticating..."), '94'))
                 token_response = _exchange_code_for_tokens(_get_auth_code(code_challenge), code_verifier)
                 access_token = token_response['access_token']
+                TokenManager.ensure_expiry(token_response)
                 _save_tokens_to_file(token_response)
             else:
-                print(-1)
+                report_status(-1)
                 sys.exit(0)
 
     else:
-        if not STATUS_MODE:
+        if not QUIET_MODE:
             token_response = _exchange_code_for_tokens(_get_auth_code(code_challenge), code_verifier)
             access_token = token_response['access_token']
             if input(color_text(t("Would you like to save the tokens to a file in the current directory for use in future requests? (y/n): "), '93')).lower() == 'y':
+                TokenManager.ensure_expiry(token_response)
                 _save_tokens_to_file(token_response)
         else:
-            print(-1)
+            report_status(-1)
             sys.exit(0)
 
-    return access_token
\ No newline at end of file
+    return access_token
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import atexit
 import json
 import textwrap
+import threading
+import time
 import webbrowser
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from app.config import PRIVATE_DIR
 from app.utils.connection import request_with_retry
@@ -12,7 +15,12 @@ from app.utils.colors import color_text
 BANNER_GET_URL = "https://www.tesla-order-status-tracker.de/get/banner.php"
 BANNER_PUSH_CLICK_URL = "https://www.tesla-order-status-tracker.de/push/banner_clicked.php"
 BANNER_FILE = PRIVATE_DIR / "banner_seen.json"
+# Banners are shown from this cache; the network only refreshes it for the next run.
+BANNER_CACHE_FILE = PRIVATE_DIR / "banner_cache.json"
+BANNER_CACHE_TTL = 6 * 3600  # Sekunden
+BANNER_PREFETCH_JOIN_TIMEOUT = 2  # max. Wartezeit beim Beenden auf einen laufenden Prefetch
 _DISPLAYED = False
+_PREFETCH_THREAD: Optional[threading.Thread] = None
 _PLATFORM = "script"
 
 
@@ -33,16 +41,70 @@ def _save_seen(seen: List[int]) -> None:
     BANNER_FILE.write_text(json.dumps(unique_seen), encoding="utf-8")
 
 
-def _fetch_banner(seen: List[int]) -> Dict[str, Any]:
+def _fetch_banner(seen: List[int]) -> Optional[Dict[str, Any]]:
+    """Return the current banner (``{}`` if there is none) or ``None`` on errors."""
     try:
         data = {
             "seen": seen,
             "platform": _PLATFORM,
         }
-        response = request_with_retry(BANNER_GET_URL, json=data, max_retries=3, exit_on_error=False)
-        return response.json()
+        response = request_with_retry(BANNER_GET_URL, json=data, max_retries=1, exit_on_error=False)
+        banner = response.json()
     except Exception:
+        return None
+    return banner if isinstance(banner, dict) else {}
+
+
+def _load_cache() -> Dict[str, Any]:
+    try:
+        data = json.loads(BANNER_CACHE_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
         return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save_cache(banner: Dict[str, Any]) -> None:
+    BANNER_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = BANNER_CACHE_FILE.with_suffix(BANNER_CACHE_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps({"fetched_at": time.time(), "banner": banner}), encoding="utf-8")
+    tmp.replace(BANNER_CACHE_FILE)
+
+
+def _is_cache_fresh(cache: Dict[str, Any]) -> bool:
+    fetched_at = cache.get("fetched_at")
+    if not isinstance(fetched_at, (int, float)):
+        return False
+    return 0 <= time.time() - fetched_at < BANNER_CACHE_TTL
+
+
+def _prefetch_banner(seen: List[int]) -> None:
+    banner = _fetch_banner(seen)
+    if banner is None:
+        # keep the old cache; the next run tries again
+        return
+    try:
+        _save_cache(banner)
+    except OSError:
+        pass
+
+
+def _finish_prefetch() -> None:
+    if _PREFETCH_THREAD is not None and _PREFETCH_THREAD.is_alive():
+        _PREFETCH_THREAD.join(BANNER_PREFETCH_JOIN_TIMEOUT)
+
+
+def start_banner_prefetch(seen: Optional[List[int]] = None) -> None:
+    """Refresh the banner cache in the background for the next run."""
+    global _PREFETCH_THREAD
+    if _PREFETCH_THREAD is not None:
+        return
+    if seen is None:
+        seen = _load_seen()
+    _PREFETCH_THREAD = threading.Thread(
+        target=_prefetch_banner, args=(list(seen),), name="banner-prefetch", daemon=True
+    )
+    _PREFETCH_THREAD.start()
+    atexit.register(_finish_prefetch)
 
 
 def _send_banner_clicked(uid) -> Any:
@@ -84,18 +146,19 @@ def _banner_targets_script(banner: Dict[str, Any]) -> bool:
 
 
 def display_banner() -> None:
-    """Fetch and display a banner if available."""
+    """Display the cached banner if available and refresh the cache when due."""
     global _DISPLAYED
     if _DISPLAYED:
         return
     _DISPLAYED = True
 
     seen = _load_seen()
-    banner = _fetch_banner(seen)
-    uid = banner.get("id") if banner else None
-    if not banner or uid is None:
-        return
-    if not _banner_targets_script(banner):
+    cache = _load_cache()
+    banner = cache.get("banner")
+    uid = banner.get("id") if isinstance(banner, dict) else None
+    if uid is None or uid in seen or not _banner_targets_script(banner):
+        if not _is_cache_fresh(cache):
+            start_banner_prefetch(seen)
         return
 
     title = banner.get("title", "")
@@ -128,7 +191,7 @@ def display_banner() -> None:
             except Exception:
                 pass
 
-
-    if uid not in seen:
-        seen.append(uid)
-        _save_seen(seen)
+    seen.append(uid)
+    _save_seen(seen)
+    # the server hands out the next unseen banner, so refresh right away
+    start_banner_prefetch(seen)
@@ -0,0 +1,217 @@
+"""Compaction of the stored order history.
+
+Fields like the delivery window text, the ETA or the odometer change back
+and forth, and every render processes all of their changes again. The
+compaction keeps the history of each order bounded:
+
+- ``coalesce_same_day``: the changes of one day are merged per key into the
+  net change, so ``A -> B -> A`` on the same day disappears completely.
+- ``max_changes_per_key``: only the newest changes of a key stay in the
+  history (plus its first one, see below).
+- ``archive_after_days``: older entries leave the history.
+
+Changes that leave the history are moved into the archive of the order (see
+``app.utils.shards``), nothing is deleted. The first change of every key
+always stays, the timeline derives milestones like the first delivery
+window or the car being built from it. The rules come from
+``get_history_compaction_policy``. The compaction runs with
+``--compact-history`` and automatically for orders whose history file grew
+beyond ``auto_compact_kb``.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from app.config import get_history_compaction_policy
+from app.utils import shards
+from app.utils.timestamps import parse_timestamp
+
+HistoryEntry = Dict[str, Any]
+CompactionStats = Dict[str, int]
+
+_MISSING = object()
+
+
+def _day(entry: HistoryEntry) -> str:
+    timestamp = entry.get("timestamp")
+    parsed = parse_timestamp(timestamp)
+    if parsed is not None:
+        return parsed.date().isoformat()
+    return str(timestamp or "")
+
+
+def _net_change(first: Dict[str, Any], last: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the change from the state before *first* to the state after *last*."""
+    old = first.get("old_value", _MISSING) if first.get("operation") != "added" else _MISSING
+    new = last.get("value", _MISSING) if last.get("operation") != "removed" else _MISSING
+    if old is _MISSING and new is _MISSING:
+        return None
+    change = {name: value for name, value in first.items() if name not in ("operation", "old_value", "value")}
+    if old is _MISSING:
+        change.update(operation="added", value=new)
+    elif new is _MISSING:
+        change.update(operation="removed", old_value=old)
+    elif old == new:
+        return None
+    else:
+        change.update(operation="changed", old_value=old, value=new)
+    return change
+
+
+def _coalesce_day(entries: List[HistoryEntry]) -> Optional[HistoryEntry]:
+    """Merge the entries of one day into one entry with the net change per key."""
+    runs: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+    for entry in entries:
+        for change in entry.get("changes") or []:
+            if isinstance(change, dict):
+                runs.setdefault(str(change.get("key")), []).append(change)
+    changes = [change for change in (_net_change(run[0], run[-1]) for run in runs.values()) if change is not None]
+    if not changes:
+        return None
+    return dict(entries[0], changes=changes)
+
+
+def _coalesce(entries: List[HistoryEntry]) -> List[HistoryEntry]:
+    result: List[HistoryEntry] = []
+    group: List[HistoryEntry] = []
+    for entry in entries:
+        if group and _day(entry) != _day(group[0]):
+            merged = _coalesce_day(group) if len(group) > 1 else group[0]
+            if merged is not None:
+                result.append(merged)
+            group = []
+        group.append(entry)
+    if group:
+        merged = _coalesce_day(group) if len(group) > 1 else group[0]
+        if merged is not None:
+            result.append(merged)
+    return result
+
+
+def _count_changes(entries: Iterable[HistoryEntry]) -> int:
+    return sum(len(entry.get("changes") or []) for entry in entries)
+
+
+def compact_entries(
+    entries: List[HistoryEntry],
+    policy: Dict[str, Any],
+    today: Optional[datetime] = None,
+) -> Tuple[List[HistoryEntry], List[HistoryEntry], CompactionStats]:
+    """Apply *policy* to the history entries of one order.
+
+    Returns the entries that stay, the entries for the archive and
+    statistics. Compacting the result again changes nothing.
+    """
+    stats = {"entries": len(entries), "changes": _count_changes(entries), "coalesced": 0, "archived": 0}
+    kept = _coalesce(entries) if policy.get("coalesce_same_day") else list(entries)
+    stats["coalesced"] = stats["changes"] - _count_changes(kept)
+
+    # (entry index, change index) of every change per key, oldest first
+    positions: Dict[str, List[Tuple[int, int]]] = {}
+    for entry_index, entry in enumerate(kept):
+        for change_index, change in enumerate(entry.get("changes") or []):
+            key = str(change.get("key")) if isinstance(change, dict) else ""
+            positions.setdefault(key, []).append((entry_index, change_index))
+
+    archive: Set[Tuple[int, int]] = set()
+    cap = policy.get("max_changes_per_key") or 0
+    if cap:
+        for key_positions in positions.values():
+            # the first change stays in addition to the newest ones
+            archive.update(key_positions[1:max(1, len(key_positions) - cap)])
+    max_days = policy.get("archive_after_days") or 0
+    if max_days:
+        cutoff = ((today or datetime.now()) - timedelta(days=max_days)).date().isoformat()
+        first_changes = {key_positions[0] for key_positions in positions.values()}
+        for entry_index, entry in enumerate(kept):
+            parsed = parse_timestamp(entry.get("timestamp"))
+            if parsed is None or parsed.date().isoformat() >= cutoff:
+                continue
+            for change_index in range(len(entry.get("changes") or [])):
+                if (entry_index, change_index) not in first_changes:
+                    archive.add((entry_index, change_index))
+
+    if not archive:
+        return kept, [], stats
+    remaining: List[HistoryEntry] = []
+    archived: List[HistoryEntry] = []
+    for entry_index, entry in enumerate(kept):
+        changes = entry.get("changes") or []
+        stay = [change for index, change in enumerate(changes) if (entry_index, index) not in archive]
+        leave = [change for index, change in enumerate(changes) if (entry_index, index) in archive]
+        if stay:
+            remaining.append(dict(entry, changes=stay) if leave else entry)
+        if leave:
+            archived.append(dict(entry, changes=leave))
+    stats["archived"] = len(archive)
+    return remaining, archived, stats
+
+
+def compact_history(
+    references: Optional[Iterable[str]] = None,
+    policy: Optional[Dict[str, Any]] = None,
+    dry_run: bool = False,
+) -> Dict[str, CompactionStats]:
+    """Compact the stored history of *references* (default: all orders).
+
+    Returns the statistics per order, including ``bytes_before`` and
+    ``bytes_after`` of its history file. Orders without a change are not
+    written.
+    """
+    policy = policy or get_history_compaction_policy()
+    if references is None:
+        references = [reference for reference, entry in shards.load_index()["orders"].items() if entry.get("history")]
+    results: Dict[str, CompactionStats] = {}
+    for reference in references:
+        entries = shards.load_order_history(reference)
+        if not entries:
+            continue
+        kept, archived, stats = compact_entries(entries, policy)
+        stats["bytes_before"] = shards.history_size(reference)
+        changed = stats["coalesced"] or archived or len(kept) != len(entries)
+        if changed and not dry_run:
+            shards.replace_order_history(reference, kept, archived)
+        stats["bytes_after"] = shards.history_size(reference) if changed and not dry_run else stats["bytes_before"]
+        results[reference] = stats
+    return results
+
+
+def compact_if_large(references: Iterable[str]) -> Dict[str, CompactionStats]:
+    """Compact the orders among *references* whose history file exceeds ``auto_compact_kb``."""
+    policy = get_history_compaction_policy()
+    limit = policy.get("auto_compact_kb") or 0
+    if not limit:
+        return {}
+    large = [reference for reference in references if shards.history_size(reference) > limit * 1024]
+    return compact_history(large, policy) if large else {}
+
+
+def main() -> None:
+    """CLI entry point for ``--compact-history``."""
+    from app.utils.colors import color_text
+    from app.utils.json_output import emit_record
+    from app.utils.locale import t
+    from app.utils.params import JSON_OUTPUT, ORDER_FILTER
+
+    results = compact_history([ORDER_FILTER] if ORDER_FILTER else None)
+    if JSON_OUTPUT:
+        for reference, stats in results.items():
+            emit_record({"type": "history_compaction", "reference": reference, **stats})
+        return
+    if not results:
+        print(t("No history to compact"))
+        return
+    print(color_text(f"{t('History compaction')}:", '94'))
+    for reference, stats in results.items():
+        print(
+            f"{color_text(f'- {reference}:', '94')} "
+            + t("{coalesced} changes merged, {archived} archived, {before} -> {after} KB").format(
+                coalesced=stats["coalesced"],
+                archived=stats["archived"],
+                before=round(stats["bytes_before"] / 1024, 1),
+                after=round(stats["bytes_after"] / 1024, 1),
+            )
+        )
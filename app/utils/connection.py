@@ -1,12 +1,182 @@
-"""Utility helpers for HTTP requests with retry logic."""
+"""Utility helpers for HTTP requests with retry logic.
 
+With ``--record CASSETTE`` every request/response pair is captured into a
+JSON cassette; tokens, order references and VINs are pseudonymized before
+they are written. ``--replay CASSETTE`` answers requests from such a file
+instead of the network, waiting the recorded time multiplied by
+``--replay-scale`` (``0`` replays without any delay). With ``--cached`` no
+request leaves the machine at all.
+"""
+
+import atexit
+import base64
 import json as jsonlib
+import threading
 import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple, Union
+
 import requests
-from typing import Dict, Union
 
-from app.utils.helpers import exit_with_status
+from app.utils.helpers import exit_with_status, pseudonymize_data
 from app.utils.locale import t
+from app.utils.params import CACHED_MODE, RECORD_FILE, REPLAY_FILE, REPLAY_SCALE
+
+CASSETTE_VERSION = 1
+# values of these JSON keys are replaced by pseudonyms wherever they appear
+_SENSITIVE_KEYS = {"access_token", "refresh_token", "id_token", "code", "code_verifier", "referenceNumber", "vin"}
+_RECORDED_HEADERS = ("Content-Type", "Retry-After")
+
+
+# -------------------------
+# Cassettes
+# -------------------------
+def _pseudonymize_value(value: str) -> str:
+    parts = value.split(".")
+    if len(parts) == 3 and all(parts):
+        # keep JWTs decodable, the tool reads their expiry
+        try:
+            payload = parts[1] + "=" * (-len(parts[1]) % 4)
+            claims = jsonlib.loads(base64.urlsafe_b64decode(payload))
+            kept = {"exp": claims["exp"]} if "exp" in claims else {}
+            encoded = base64.urlsafe_b64encode(jsonlib.dumps(kept).encode()).rstrip(b"=").decode()
+            return f"{parts[0]}.{encoded}.{pseudonymize_data(value, 43)}"
+        except (ValueError, TypeError, KeyError):
+            pass
+    if value[:2].isalpha() and value[2:].isdigit():
+        # order references like RN123456789 keep their shape
+        return value[:2] + pseudonymize_data(value, len(value) - 2)
+    return pseudonymize_data(value, max(len(value), 8))
+
+
+def _collect_sensitive(node: Any, found: Set[str]) -> None:
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key in _SENSITIVE_KEYS and isinstance(value, str) and value:
+                found.add(value)
+            else:
+                _collect_sensitive(value, found)
+    elif isinstance(node, list):
+        for item in node:
+            _collect_sensitive(item, found)
+
+
+class Cassette:
+    """Recorded interactions of one run, see the module docstring."""
+
+    def __init__(self, path, interactions: Optional[List[Dict[str, Any]]] = None):
+        self.path = path
+        self.interactions: List[Dict[str, Any]] = interactions or []
+        self._pseudonyms: Dict[str, str] = {}
+        self._queues: Dict[Tuple[str, str], Deque[Dict[str, Any]]] = {}
+        self._last: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+        for interaction in self.interactions:
+            key = (interaction["method"], interaction["url"])
+            self._queues.setdefault(key, deque()).append(interaction)
+
+    @classmethod
+    def load(cls, path) -> "Cassette":
+        with open(path, "r", encoding="utf-8") as f:
+            payload = jsonlib.load(f)
+        if not isinstance(payload, dict) or payload.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"{t('Unsupported cassette')}: {path}")
+        return cls(path, payload.get("interactions", []))
+
+    def save(self) -> None:
+        with self._lock:
+            payload = {
+                "version": CASSETTE_VERSION,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "interactions": list(self.interactions),
+            }
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            jsonlib.dump(payload, f, indent=1, ensure_ascii=False)
+        tmp.replace(self.path)
+
+    def _scrub(self, text: str, sensitive: Set[str]) -> str:
+        for value in sensitive:
+            if value not in self._pseudonyms:
+                self._pseudonyms[value] = _pseudonymize_value(value)
+        # longest first, so a value contained in another one is not replaced inside it
+        for value in sorted(self._pseudonyms, key=len, reverse=True):
+            if value in text:
+                text = text.replace(value, self._pseudonyms[value])
+        return text
+
+    def record(self, method: str, url: str, request_payload: Any, response: requests.Response, started: float, elapsed: float) -> None:
+        sensitive: Set[str] = set()
+        _collect_sensitive(request_payload, sensitive)
+        try:
+            _collect_sensitive(response.json(), sensitive)
+        except ValueError:
+            pass
+        with self._lock:
+            self.interactions.append({
+                "method": method,
+                "url": self._scrub(url, sensitive),
+                "status": response.status_code,
+                "headers": {name: response.headers[name] for name in _RECORDED_HEADERS if name in response.headers},
+                "body": self._scrub(response.text, sensitive),
+                "offset": round(started - self._started, 4),
+                "elapsed": round(elapsed, 4),
+            })
+
+    def replay(self, method: str, url: str) -> requests.Response:
+        key = (method, url)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                interaction = queue.popleft()
+                self._last[key] = interaction
+            else:
+                # repeated calls beyond the recording get the last answer again
+                interaction = self._last.get(key)
+        if interaction is None:
+            raise requests.exceptions.ConnectionError(f"{t('No recorded response for')} {method} {url}")
+        if REPLAY_SCALE > 0 and interaction.get("elapsed"):
+            time.sleep(interaction["elapsed"] * REPLAY_SCALE)
+        response = requests.Response()
+        response.status_code = interaction["status"]
+        response.headers.update(interaction.get("headers", {}))
+        response._content = interaction.get("body", "").encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = url
+        return response
+
+
+_CASSETTE: Optional[Cassette] = None
+if REPLAY_FILE is not None:
+    try:
+        _CASSETTE = Cassette.load(REPLAY_FILE)
+    except (OSError, ValueError) as e:
+        exit_with_status(f"{t('Cannot read cassette')}: {e}")
+elif RECORD_FILE is not None:
+    _CASSETTE = Cassette(RECORD_FILE)
+    # registered before the background senders, so it runs after they finished
+    atexit.register(_CASSETTE.save)
+
+
+def _sleep(seconds: float) -> None:
+    """Back off between retries; replays scale the waits like the responses."""
+    if REPLAY_FILE is not None:
+        seconds *= REPLAY_SCALE
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _send(method: str, url: str, payload: Any = None, **kwargs: Any) -> requests.Response:
+    if REPLAY_FILE is not None and _CASSETTE is not None:
+        return _CASSETTE.replay(method, url)
+    started = time.monotonic()
+    response = requests.request(method, url, **kwargs)
+    if _CASSETTE is not None:
+        _CASSETTE.record(method, url, payload, response, started, time.monotonic() - started)
+    return response
+
 
 def request_with_retry(url, headers=None, data=None, json=None, max_retries=3, exit_on_error=True):
     """Perform a GET or POST request with exponential backoff retries.
@@ -37,23 +207,30 @@ def request_with_retry(url, headers=None, data=None, json=None, max_retries=3, e
         429: t("429"),
         '5xx': t("5xx"),
     }
+    if CACHED_MODE:
+        # callers skip the network in cached mode; this only guards against slips
+        if exit_on_error:
+            exit_with_status(t("No network requests in cached mode"))
+        raise RuntimeError(t("No network requests in cached mode"))
     for attempt in range(max_retries):
         try:
             if data is None and json is None:
-                response = requests.get(url, headers=headers)
+                response = _send("GET", url, headers=headers)
             else:
                 if json is not None:
-                    response = requests.post(url, headers=headers, json=json)
+                    response = _send("POST", url, json, headers=headers, json=json)
                 else:
                     # Falls string/bytes: direkt senden; falls dict: sauber als JSON senden
                     if isinstance(data, (dict, list)):
-                        response = requests.post(
+                        response = _send(
+                            "POST",
                             url,
+                            data,
                             headers={"Content-Type": "application/json", **(headers or {})},
                             data=jsonlib.dumps(data, separators=(",", ":")),
                         )
                     else:
-                        response = requests.post(url, headers=headers, data=data)
+                        response = _send("POST", url, data, headers=headers, data=data)
 
             try:
                 response.raise_for_status()
@@ -65,7 +242,7 @@ def request_with_retry(url, headers=None, data=None, json=None, max_retries=3, e
                         else:
                             raise RuntimeError(_STATUS_TEXTS['5xx'])
 
-                    time.sleep(5 ** attempt)
+                    _sleep(5 ** attempt)
                     continue
                 else:
                     error_text = _STATUS_TEXTS.get(response.status_code, _STATUS_TEXTS['5xx'])
@@ -81,5 +258,5 @@ def request_with_retry(url, headers=None, data=None, json=None, max_retries=3, e
                     exit_with_status(_STATUS_TEXTS['5xx'])
                 else:
                     raise RuntimeError(_STATUS_TEXTS['5xx'])
-            time.sleep(2 ** attempt)
+            _sleep(2 ** attempt)
     return None
@@ -0,0 +1,52 @@
+"""Cross-process lock files.
+
+Uses an exclusively created lock file (works on every platform); locks older
+than *stale* seconds are considered abandoned.
+"""
+
+import os
+import time
+from pathlib import Path
+
+
+class FileLock:
+    """Hold *path* as lock file; waits up to *timeout* seconds to acquire it.
+
+    After the timeout the ``with`` block runs anyway (best effort instead of
+    blocking forever); ``acquired`` tells whether the lock is really held.
+    """
+
+    def __init__(self, path: Path, timeout: float, stale: float):
+        self._path = path
+        self._timeout = timeout
+        self._stale = stale
+        self.acquired = False
+
+    def __enter__(self):
+        deadline = time.monotonic() + self._timeout
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            try:
+                fd = os.open(str(self._path), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode('ascii'))
+                os.close(fd)
+                self.acquired = True
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - self._path.stat().st_mtime > self._stale:
+                        self._path.unlink()
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() >= deadline:
+                    return self
+                time.sleep(0.1)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.acquired:
+            try:
+                self._path.unlink()
+            except FileNotFoundError:
+                pass
+            self.acquired = False
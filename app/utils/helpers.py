@@ -1,22 +1,53 @@
-import base64
-import hmac
-import hashlib
 import json
-import os
 import sys
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, Optional
-from typing import Any, Dict, Optional
+from datetime import datetime
+from typing import Any, Optional
 from app.utils.colors import color_text
 from app.utils.locale import t, LANGUAGE
-from app.utils.params import STATUS_MODE
-from app.config import cfg as Config
+from app.utils.params import JSON_OUTPUT, QUIET_MODE, STATUS_MODE
+from app.utils.json_output import emit_record
+from app.utils.orderdata import (  # re-exported, they used to live here
+    clean_str,
+    compare_dicts,
+    format_timestamp_with_time,
+    get_date_from_timestamp,
+    get_delivery_appointment_display,
+    normalize_str,
+)
+from app.utils.pseudonyms import generate_token, pseudonymize_data  # re-exported, they used to live here
+from app.utils.timestamps import parse_timestamp
+
+__all__ = [
+    "DATETIME_FORMATS",
+    "DATE_FORMATS",
+    "clean_str",
+    "compare_dicts",
+    "decode_option_codes",
+    "exit_with_status",
+    "format_timestamp_with_time",
+    "generate_token",
+    "get_date_from_timestamp",
+    "get_delivery_appointment_display",
+    "locale_format_datetime",
+    "normalize_str",
+    "pretty_print",
+    "pseudonymize_data",
+    "report_status",
+]
+
+
+def report_status(code: int, message: Optional[str] = None) -> None:
+    """Print *code* in --status mode; --json/--jsonl only get an error record for failures."""
+    if STATUS_MODE:
+        print(code)
+    elif JSON_OUTPUT and code < 0:
+        emit_record({"type": "error", "message": message or "Could not determine the order status."})
 
 
 def exit_with_status(msg: str) -> None:
-    """In STATUS_MODE print '-1', otherwise print message and exit."""
-    if STATUS_MODE:
-        print("-1")
+    """In machine-readable modes report '-1', otherwise print message and exit."""
+    if QUIET_MODE:
+        report_status(-1, msg)
     else:
         print(f"\n{color_text(msg, '91')}")
     sys.exit(1)
@@ -53,49 +84,6 @@ def decode_option_codes(option_string: str, prefer_short: bool = False):
     return decoded
 
 
-def get_date_from_timestamp(timestamp):
-    """Truncates an ISO-8601 timestamp to its date component.
-
-    Older versions only handled timestamps without timezone information and
-    would return the original value for inputs such as
-    ``"2024-07-25T12:34:56Z"``. By leveraging ``datetime.fromisoformat`` the
-    function now supports fractional seconds and timezone offsets. If parsing
-    fails, the original value is returned unchanged.
-    """
-
-    if not isinstance(timestamp, str):
-        return timestamp
-
-    if not timestamp or timestamp.upper() == "N/A":
-        return timestamp
-
-    ts = timestamp.strip()
-    if ts.endswith("Z") or ts.endswith("z"):
-        ts = ts[:-1] + "+00:00"
-    try:
-        dt = datetime.fromisoformat(ts)
-    except ValueError:
-        return timestamp
-    return dt.date().isoformat()
-
-def normalize_str(key: str) -> str:
-    """
-    Normalizes keys for robust comparisons:
-    - trims spaces
-    - converts to lowercase
-    - collapses multiple spaces
-    """
-
-    if not isinstance(key, str):
-        return ""
-    collapsed = " ".join(key.strip().split())
-    return collapsed.lower()
-
-
-def clean_str(value):
-    return value.strip() if isinstance(value, str) else value
-
-
 def pretty_print(data: Any) -> str:
     """Return a pretty-printed string for lists or dictionaries.
 
@@ -109,125 +97,9 @@ def pretty_print(data: Any) -> str:
     return str(data)
 
 
-def compare_dicts(old_dict, new_dict, path=""):
-    differences = []
-    for key in old_dict:
-        if key not in new_dict:
-            differences.append(
-                {
-                    "operation": "removed",
-                    "key": path + key,
-                    "old_value": clean_str(old_dict[key])
-                }
-            )
-        elif isinstance(old_dict[key], dict) and isinstance(new_dict[key], dict):
-            differences.extend(
-                compare_dicts(old_dict[key], new_dict[key], path + key + ".")
-            )
-        else:
-            old_value = clean_str(old_dict[key])
-            new_value = clean_str(new_dict[key])
-            if old_value != new_value:
-                differences.append(
-                {
-                    "operation": "changed",
-                    "key": path + key,
-                    "old_value": old_value,
-                    "value": new_value,
-                }
-            )
-
-    for key in new_dict:
-        if key not in old_dict:
-            differences.append(
-                {
-                    "operation": "added",
-                    "key": path + key,
-                    "value": clean_str(new_dict[key]),
-                }
-            )
-
-    return differences
-
-
-def _b32(data: bytes, length: Optional[int] = None) -> str:
-    s = base64.b32encode(data).decode("ascii").rstrip("=")
-    return s if length is None else s[:length]
-
-def _b32decode_nopad(s: str) -> bytes:
-    pad = "=" * ((8 - (len(s) % 8)) % 8)
-    return base64.b32decode(s + pad)
-
-def generate_token(bytes_len: int, token_length: Optional[int] = None) -> str:
-    if token_length is not None:
-        min_bytes = (token_length * 5 + 7) // 8  # ceil division
-        bytes_len = max(bytes_len, min_bytes)
-    return _b32(os.urandom(bytes_len), token_length)
-
-def pseudonymize_data(data: str, length: int) -> str:
-    secret_b32 = Config.get("secret")
-    if not secret_b32:
-        secret_b32 = generate_token(32)
-        Config.set("secret", secret_b32)
-    secret = _b32decode_nopad(secret_b32)
-    digest = hmac.new(secret, data.encode("utf-8"), hashlib.sha256).digest()
-    return _b32(digest, length)
-
-
 def _parse_iso_timestamp(value: str) -> Optional[datetime]:
-    if value is None:
-        return None
-    normalized = value.strip()
-    if not normalized:
-        return None
-    if normalized.endswith(("Z", "z")):
-        normalized = normalized[:-1] + "+00:00"
-    if "T" not in normalized and len(normalized) >= 16 and normalized[10] == " ":
-        normalized = normalized[:10] + "T" + normalized[11:]
-    try:
-        dt = datetime.fromisoformat(normalized)
-    except ValueError:
-        return None
-    if dt.tzinfo is not None:
-        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
-    return dt
-
-
-def format_timestamp_with_time(value: Any) -> Optional[str]:
-    if not isinstance(value, str):
-        return None
-    dt = _parse_iso_timestamp(value)
-    if not dt:
-        return None
-    return dt.strftime("%Y-%m-%d %H:%M")
-
-
-def get_delivery_appointment_display(tasks: Dict[str, Any]) -> Optional[str]:
-    for source in _iter_delivery_appointment_sources(tasks):
-        for key in ("appointmentDate", "appointmentDateUtc"):
-            formatted = format_timestamp_with_time(source.get(key))
-            if formatted:
-                return formatted
-
-    scheduling = tasks.get('scheduling')
-    if isinstance(scheduling, dict):
-        raw = scheduling.get('deliveryAppointmentDate')
-        if isinstance(raw, str):
-            formatted = format_timestamp_with_time(raw)
-            if formatted:
-                return formatted
-            condensed = " ".join(raw.split())
-            return condensed or None
-
-        appt_text = scheduling.get('apptDateTimeAddressStr')
-        if isinstance(appt_text, str):
-            first_line = appt_text.splitlines()[0].strip()
-            formatted = format_timestamp_with_time(first_line)
-            if formatted:
-                return formatted
-            return first_line or None
-
-    return None
+    """Return *value* as naive UTC ``datetime`` (see :func:`parse_timestamp`)."""
+    return parse_timestamp(value)
 
 
 DATE_FORMATS = {
@@ -248,9 +120,7 @@ DATETIME_FORMATS = {
 
 
 def locale_format_datetime(value: Any) -> Optional[str]:
-    if not isinstance(value, str):
-        return None
-    dt = _parse_iso_timestamp(value)
+    dt = parse_timestamp(value)
     if not dt:
         return None
     lang = (LANGUAGE or "en").split("_")[0]
@@ -259,30 +129,3 @@ def locale_format_datetime(value: Any) -> Optional[str]:
     else:
         fmt = DATETIME_FORMATS.get(lang, "%Y-%m-%d %H:%M")
     return dt.strftime(fmt)
-
-
-def _iter_delivery_appointment_sources(tasks: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
-    delivery_details = tasks.get('deliveryDetails')
-    if isinstance(delivery_details, dict):
-        reg_data = delivery_details.get('regData')
-        if isinstance(reg_data, dict):
-            appointment = reg_data.get('deliveryAppointment')
-            if isinstance(appointment, dict):
-                yield appointment
-        appointment = delivery_details.get('deliveryAppointment')
-        if isinstance(appointment, dict):
-            yield appointment
-
-    final_payment = tasks.get('finalPayment')
-    if isinstance(final_payment, dict):
-        payment_data = final_payment.get('data')
-        if isinstance(payment_data, dict):
-            appointment = payment_data.get('deliveryAppointment')
-            if isinstance(appointment, dict):
-                yield appointment
-
-    scheduling = tasks.get('scheduling')
-    if isinstance(scheduling, dict):
-        appointment = scheduling.get('deliveryAppointment')
-        if isinstance(appointment, dict):
-            yield appointment
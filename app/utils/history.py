@@ -1,189 +1,88 @@
-import json
-import os
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
-from app.config import HISTORY_FILE, TODAY
+from app.config import TODAY
+from app.utils import shards
 from app.utils.colors import color_text
-from app.utils.helpers import get_date_from_timestamp, pretty_print
+from app.utils.compaction import compact_if_large
+from app.utils.helpers import pretty_print
 from app.utils.locale import t
 from app.utils.params import DETAILS_MODE, SHARE_MODE, ALL_KEYS_MODE
-
-
-# uninteresting history entries
-HISTORY_TRANSLATIONS_IGNORED = {
-    "order.vin", # we use details.tasks.deliveryDetails.regData.orderDetails.vin
-    "details.tasks.registration.orderDetails.vin",
-    "details.tasks.registration.regData.orderDetails.vin",
-    "details.tasks.finalPayment.data.vin",
-    "details.tasks.tradeIn.isMatched",
-    "details.tasks.registration.isMatched",
-    "details.tasks.registration.orderDetails.vehicleModelYear",
-    "details.state.",
-    "details.strings.",
-    "details.scheduling.card.",
-    "details.scheduling.strings.",
-    "details.tasks.carbonCredit.card.",
-    "details.tasks.carbonCredit.strings.",
-    "details.tasks.finalPayment.card.",
-    "details.tasks.finalPayment.strings.",
-    "details.tasks.scheduling.card.",
-    "details.tasks.scheduling.strings.",
-    "details.tasks.scheduling.isDeliveryEstimatesEnabled",
-    "details.tasks.registration.orderDetails.isAvailableForMatch",
-    "details.tasks.finalPayment.data.isAvailableForMatch",
-    "details.tasks.finalPayment.data.deliveryReadinessDetail.",
-    "details.tasks.finalPayment.data.deliveryReadiness.",
-    "details.tasks.finalPayment.data.agreementDetails",
-    "details.tasks.finalPayment.data.vehicleId",
-    "details.tasks.deliveryAcceptance.gates",
-    "details.tasks.deliveryAcceptance.card.",
-    "details.tasks.deliveryAcceptance.strings.",
-    "details.tasks.deliveryDetails.regData.reggieRegistrationStatus",
-    "details.tasks.deliveryDetails.strings.",
-    "details.tasks.deliveryDetails.card.",
-    "details.tasks.registration.card.",
-    "details.tasks.registration.regData.reggieRegistrationStatus",
-    "details.tasks.registration.strings.",
-    "details.tasks.finalPayment.complete",
-    "details.tasks.finalPayment.data.finalPaymentStatus",
-    "details.tasks.scheduling.apptDateTimeAddressStr",
-    "details.tasks.scheduling.isInventoryOrMatched",
-    "details.tasks.finalPayment.data.hasFinalInvoice",
-    "details.tasks.finalPayment.data.hasActiveInvoice",
-    "details.tasks.finalPayment.data.selfSchedulingDetails.deliveryLocationId",
-    "details.tasks.finalPayment.data.selfSchedulingDetails.",
-    "details.tasks.financing.card.",
-    "details.tasks.financing.strings.",
-    "details.tasks.tradeIn.card.",
-    "details.tasks.tradeIn.strings."
-}
-
-# Define translations for history keys
-HISTORY_TRANSLATIONS = {
-    'details.tasks.scheduling.deliveryWindowDisplay': 'Delivery Window',
-    'details.tasks.scheduling.deliveryAppointmentDate': 'Delivery Appointment Date',
-    'details.tasks.scheduling.deliveryAddressTitle': 'Delivery Center',
-    'details.tasks.finalPayment.data.etaToDeliveryCenter': 'ETA to Delivery Center',
-    'details.tasks.registration.orderDetails.vehicleRoutingLocation': 'Routing Location',
-    'details.tasks.registration.expectedRegDate': 'Expected Registration Date',
-    'details.orderStatus': 'Order Status',
-    'details.tasks.registration.orderDetails.reservationDate': 'Reservation Date',
-    'details.tasks.registration.orderDetails.orderBookedDate': 'Order Booked Date',
-    'details.tasks.registration.orderDetails.vehicleOdometer': 'Vehicle Odometer',
-    'order.modelCode': 'Model',
-    'order.mktOptions': 'Configuration'
-}
-
-HISTORY_TRANSLATIONS_ANONYMOUS = {
-    'details.tasks.deliveryDetails.regData.orderDetails.vin': 'VIN',
-}
-
-
-HISTORY_TRANSLATIONS_DETAILS = {
-    **HISTORY_TRANSLATIONS,
-    **HISTORY_TRANSLATIONS_ANONYMOUS,
-    'details.tasks.finalPayment.data.paymentDetails.amountPaid': 'Amount Paid',
-    'details.tasks.finalPayment.data.paymentDetails.paymentType': 'Payment Method',
-    'details.tasks.finalPayment.data.accountBalance': 'Account Balance',
-    'details.tasks.finalPayment.data.amountDue': 'Amount Due',
-    'details.tasks.finalPayment.data.financingDetails.financialProductType': 'Finance Product',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.financePartnerName': 'Finance Partner',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.monthlyPayment': 'Monthly Payment',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.termsInMonths': 'Term (months)',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.interestRate': 'Interest Rate',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.mileage': 'Range per Year',
-    'details.tasks.finalPayment.data.amountDueFinancier': 'Financed Amount',
-    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.approvedLoanAmount': 'Approved Amount',
-    'details.tasks.finalPayment.data.paymentDetails': 'Payment Details',
-    'details.tasks.finalPayment.amountDue': 'Amount Due',
-    'details.tasks.finalPayment.data.amountDueAfterRefund': 'Amount Due After Refund',
-    'details.tasks.finalPayment.status': 'Payment Status',
-    'details.tasks.registration.orderDetails.vehicleId': 'VehicleID',
-    'details.tasks.registration.orderDetails.registrationStatus': 'Registration Status',
-    'details.tasks.finalPayment.data.vehicleregistration': 'Vehicle Registration',
-    'details.tasks.finalPayment.data.vehicleParts': 'Vehicle Parts',
-    'details.tasks.scheduling.apptDateTimeAddressStr': 'Delivery Details'
-}
+from app.utils.orderdata import (  # the key tables are re-exported, they used to live here
+    HISTORY_TRANSLATIONS,
+    HISTORY_TRANSLATIONS_ANONYMOUS,
+    HISTORY_TRANSLATIONS_DETAILS,
+    HISTORY_TRANSLATIONS_IGNORED,
+    filter_history_changes,
+)
+
+
+__all__ = [
+    "HISTORY_TRANSLATIONS",
+    "HISTORY_TRANSLATIONS_ANONYMOUS",
+    "HISTORY_TRANSLATIONS_DETAILS",
+    "HISTORY_TRANSLATIONS_IGNORED",
+    "append_history",
+    "filter_history_entries",
+    "format_history_entry",
+    "get_history_of_order",
+    "get_history_rewrites",
+    "get_history_signature",
+    "load_history_from_file",
+    "load_history_of_order",
+    "print_history",
+    "save_history_to_file",
+]
 
 HistoryEntry = Dict[str, Any]
 HistoryStore = Dict[str, List[HistoryEntry]]
 
 def load_history_from_file() -> HistoryStore:
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
-            if isinstance(history, dict):
-                normalized: HistoryStore = {}
-                for reference, entries in history.items():
-                    if not isinstance(entries, list):
-                        continue
-                    normalized[str(reference)] = [
-                        entry for entry in entries
-                        if isinstance(entry, dict)
-                    ]
-                return normalized
-        except (OSError, json.JSONDecodeError):
-            pass
-    return {}
+    return shards.load_history()
+
+
+def load_history_of_order(order_reference) -> List[HistoryEntry]:
+    """Return the raw history entries of one order without reading the others."""
+    return shards.load_order_history(str(order_reference))
+
+
+def get_history_signature(order_reference=None) -> Optional[List[int]]:
+    """Return ``[mtime_ns, size]`` of the history of one order (or of all) or ``None`` if missing."""
+    return shards.history_signature(None if order_reference is None else str(order_reference))
+
+
+def get_history_rewrites(order_reference) -> int:
+    """Return how often the history of one order was rewritten, e.g. by the compaction."""
+    return shards.history_rewrites(str(order_reference))
 
 
 def save_history_to_file(history: HistoryStore) -> None:
-    HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(HISTORY_FILE, 'w', encoding='utf-8') as f:
-        json.dump(history, f)
+    shards.save_history(history)
+
+
+def append_history(entries_by_reference: Dict[str, HistoryEntry]) -> None:
+    """Append one entry per order reference to the stored history.
+
+    Orders whose history grew beyond the ``auto_compact_kb`` setting are
+    compacted right away, see app/utils/compaction.py.
+    """
+    shards.append_history(entries_by_reference)
+    compact_if_large(entries_by_reference)
 
 
 def get_history_of_order(order_reference) -> List[Dict[str, Any]]:
-    history = load_history_from_file()
-    entries = history.get(str(order_reference), [])
-    changes: List[Dict[str, Any]] = []
-    for entry in entries:
-        timestamp = entry.get('timestamp')
-        entry_changes = entry.get('changes', [])
-        if not isinstance(entry_changes, list):
-            continue
-        for change in entry_changes:
-            if not isinstance(change, dict):
-                continue
-
-            key = change.get('key')
-            key_str = key if isinstance(key, str) else ""
-            display_key = key_str
-
-            if not ALL_KEYS_MODE:
-                if any(key_str.startswith(pref) for pref in HISTORY_TRANSLATIONS_IGNORED):
-                    continue
-
-                if not DETAILS_MODE:
-                    if key_str not in HISTORY_TRANSLATIONS and key_str not in HISTORY_TRANSLATIONS_ANONYMOUS:
-                        continue
-
-                if key_str in HISTORY_TRANSLATIONS_DETAILS:
-                    display_key = HISTORY_TRANSLATIONS_DETAILS[key_str]
-                else:
-                    continue
-
-                if SHARE_MODE and key_str in HISTORY_TRANSLATIONS_ANONYMOUS:
-                    change = dict(change)
-                    for field in ['value', 'old_value']:
-                        if isinstance(change.get(field), str):
-                            change[field] = None
-
-            sanitized_change = {
-                'operation': change.get('operation'),
-                'key': display_key,
-                'value': change.get('value'),
-                'old_value': change.get('old_value'),
-                'timestamp': timestamp
-            }
-
-            for field in ['value', 'old_value']:
-                if isinstance(sanitized_change.get(field), str):
-                    sanitized_change[field] = get_date_from_timestamp(sanitized_change[field])
-
-            changes.append(sanitized_change)
-    return changes
+    return filter_history_entries(load_history_of_order(order_reference))
+
+
+def filter_history_entries(entries: List[HistoryEntry], anonymize: Optional[bool] = None) -> List[Dict[str, Any]]:
+    """Flatten raw history *entries* into display-ready change records.
+
+    *anonymize* defaults to the current ``SHARE_MODE``; callers that cache the
+    result pass ``False`` and blank anonymous keys themselves at render time.
+    """
+    if anonymize is None:
+        anonymize = SHARE_MODE
+    return filter_history_changes(entries, all_keys=ALL_KEYS_MODE, details=DETAILS_MODE, anonymize=anonymize)
+
 
 def _format_value(value):
     if isinstance(value, (list, dict)):
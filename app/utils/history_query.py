@@ -0,0 +1,433 @@
+"""Indexed queries over the change history of all orders.
+
+Every change in the stored order history becomes one row of a column
+store. A row only points into the history (reference, entry and change
+position) and keeps the epoch and key id needed for filtering; values are
+read from the history of the matching orders when the result is built.
+Secondary indexes map the normalized key and the operation to posting
+lists of row ids, and a list of row ids sorted by timestamp answers date
+ranges with a binary search. The index is persisted next to the history
+(``HISTORY_INDEX_FILE``) and, like the timeline index, only newly appended
+history entries are folded in; a rewritten history (see
+``app.utils.shards.history_rewrites``) triggers a rebuild.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from fnmatch import fnmatchcase
+from statistics import mean
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from app.config import HISTORY_INDEX_FILE
+from app.utils.history import (
+    HISTORY_TRANSLATIONS_ANONYMOUS,
+    HISTORY_TRANSLATIONS_DETAILS,
+    HISTORY_TRANSLATIONS_IGNORED,
+    format_history_entry,
+    get_history_rewrites,
+    get_history_signature,
+    load_history_from_file,
+    load_history_of_order,
+)
+from app.utils.locale import t
+from app.utils.orderdata import normalize_str
+from app.utils.timestamps import parse_timestamp_utc, timestamp_epoch
+
+HISTORY_INDEX_VERSION = 2
+# persisted per row; "key" is an id into the "keys" table
+_ROW_COLUMNS = ("reference", "entry", "change", "epoch", "key")
+_AGGREGATIONS = ("rows", "count", "intervals")
+_GROUPINGS = ("key", "order", "operation", "day")
+
+_INDEX: Optional[Dict[str, Any]] = None
+
+
+def _empty_index() -> Dict[str, Any]:
+    return {
+        "version": HISTORY_INDEX_VERSION,
+        "history_signature": None,
+        "orders": {},
+        "rows": {column: [] for column in _ROW_COLUMNS},
+        "keys": [],
+        "by_reference": {},
+        "by_key": {},
+        "by_operation": {},
+        "by_epoch": [],
+        "epochs": [],
+    }
+
+
+def _entry_digest(entry: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _add_entries(index: Dict[str, Any], reference: str, entries: List[Dict[str, Any]], first: int) -> None:
+    """Index *entries*, which start at position *first* of the history of *reference*."""
+    rows = index["rows"]
+    keys: List[str] = index["keys"]
+    key_ids = {key: key_id for key_id, key in enumerate(keys)}
+    for position, entry in enumerate(entries, first):
+        epoch = timestamp_epoch(entry.get("timestamp"))
+        changes = entry.get("changes", [])
+        if not isinstance(changes, list):
+            continue
+        for change_position, change in enumerate(changes):
+            if not isinstance(change, dict):
+                continue
+            key = change.get("key") if isinstance(change.get("key"), str) else ""
+            operation = change.get("operation") if isinstance(change.get("operation"), str) else ""
+            key_id = key_ids.get(key)
+            if key_id is None:
+                key_id = key_ids[key] = len(keys)
+                keys.append(key)
+            row = len(rows["reference"])
+            rows["reference"].append(reference)
+            rows["entry"].append(position)
+            rows["change"].append(change_position)
+            rows["epoch"].append(epoch)
+            rows["key"].append(key_id)
+            index["by_reference"].setdefault(reference, []).append(row)
+            index["by_key"].setdefault(normalize_str(key), []).append(row)
+            index["by_operation"].setdefault(operation, []).append(row)
+
+
+def _sort_by_epoch(index: Dict[str, Any]) -> None:
+    epochs = index["rows"]["epoch"]
+    index["by_epoch"] = sorted(
+        (row for row, epoch in enumerate(epochs) if epoch is not None),
+        key=lambda row: (epochs[row], row),
+    )
+    # sorted epochs alongside, so date ranges are a plain bisect
+    index["epochs"] = [epochs[row] for row in index["by_epoch"]]
+
+
+def _load_index() -> Dict[str, Any]:
+    try:
+        with open(HISTORY_INDEX_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return _empty_index()
+    if not isinstance(data, dict) or data.get("version") != HISTORY_INDEX_VERSION:
+        return _empty_index()
+    return data
+
+
+def _save_index(index: Dict[str, Any]) -> None:
+    try:
+        HISTORY_INDEX_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = HISTORY_INDEX_FILE.with_suffix(HISTORY_INDEX_FILE.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        tmp.replace(HISTORY_INDEX_FILE)
+    except OSError:
+        # The index is only a cache; queries work without persisting it
+        pass
+
+
+def get_history_index() -> Dict[str, Any]:
+    """Return the up-to-date index, folding in appended history entries."""
+    global _INDEX
+    signature = get_history_signature()
+    if _INDEX is None:
+        _INDEX = _load_index()
+    if _INDEX["history_signature"] == signature and signature is not None:
+        return _INDEX
+
+    history = load_history_from_file()
+    index = _INDEX
+    orders = index["orders"]
+    rebuild = bool(set(orders) - set(history))
+    if not rebuild:
+        for reference, entries in history.items():
+            state = orders.get(reference)
+            if state is None:
+                continue
+            folded = state.get("folded", 0)
+            if (
+                folded > len(entries)
+                or state.get("rewrites", 0) != get_history_rewrites(reference)
+                or (folded and state.get("digest") != _entry_digest(entries[folded - 1]))
+            ):
+                rebuild = True
+                break
+    if rebuild:
+        index = _empty_index()
+        orders = index["orders"]
+
+    changed = rebuild
+    for reference, entries in history.items():
+        folded = orders.get(reference, {}).get("folded", 0)
+        if folded < len(entries):
+            _add_entries(index, reference, entries[folded:], folded)
+            changed = True
+        orders[reference] = {
+            "folded": len(entries),
+            "digest": _entry_digest(entries[-1]) if entries else None,
+            "rewrites": get_history_rewrites(reference),
+        }
+    if changed:
+        _sort_by_epoch(index)
+    index["history_signature"] = signature
+    _INDEX = index
+    _save_index(index)
+    return index
+
+
+# -------------------------
+# Query
+# -------------------------
+def history_label(key: str) -> str:
+    return HISTORY_TRANSLATIONS_DETAILS.get(key, key)
+
+
+def _resolve_keys(index: Dict[str, Any], patterns: Sequence[str]) -> Set[str]:
+    """Map keys, glob patterns or (translated) labels to normalized indexed keys."""
+    resolved: Set[str] = set()
+    for pattern in patterns:
+        wanted = pattern.strip()
+        if not wanted:
+            continue
+        if normalize_str(wanted) in index["by_key"]:
+            resolved.add(normalize_str(wanted))
+            continue
+        folded = wanted.casefold()
+        for key in index["keys"]:
+            label = history_label(key)
+            if (
+                label.casefold() == folded
+                or t(label).casefold() == folded
+                or fnmatchcase(key, wanted)
+            ):
+                resolved.add(normalize_str(key))
+    return resolved
+
+
+def _parse_bound(value: Optional[str], end: bool = False) -> Optional[float]:
+    """``30d``/``12h`` relative to now, or an ISO date/timestamp."""
+    if value is None or not str(value).strip():
+        return None
+    text = str(value).strip()
+    unit = text[-1:].lower()
+    if unit in ("d", "h") and text[:-1].isdigit():
+        delta = timedelta(days=int(text[:-1])) if unit == "d" else timedelta(hours=int(text[:-1]))
+        return time.time() - delta.total_seconds()
+    dt = parse_timestamp_utc(text)
+    if dt is None:
+        raise ValueError(f"{t('Invalid date')}: {text}")
+    if end and len(text) == 10:
+        # a plain date as upper bound includes the whole day
+        dt += timedelta(days=1)
+        return dt.timestamp() - 1e-6
+    return dt.timestamp()
+
+
+def query_history(
+    keys: Optional[Sequence[str]] = None,
+    operations: Optional[Sequence[str]] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    references: Optional[Sequence[str]] = None,
+    include_ignored: bool = False,
+    anonymize: bool = False,
+) -> List[Dict[str, Any]]:
+    """Return matching change rows ordered by time (rows without timestamp last)."""
+    index = get_history_index()
+    rows = index["rows"]
+    candidates: List[Set[int]] = []
+
+    if references:
+        wanted = {ref.strip().upper() for ref in references}
+        candidates.append({
+            row
+            for reference, posting in index["by_reference"].items()
+            if reference.upper() in wanted
+            for row in posting
+        })
+    if keys:
+        resolved = _resolve_keys(index, keys)
+        candidates.append({row for key in resolved for row in index["by_key"][key]})
+    if operations:
+        candidates.append({row for op in operations for row in index["by_operation"].get(op.strip().lower(), [])})
+
+    start, end = _parse_bound(since), _parse_bound(until, end=True)
+    if start is not None or end is not None:
+        by_epoch: List[int] = index["by_epoch"]
+        epochs: List[float] = index["epochs"]
+        lo = bisect_left(epochs, start) if start is not None else 0
+        hi = bisect_right(epochs, end) if end is not None else len(epochs)
+        candidates.append(set(by_epoch[lo:hi]))
+
+    if candidates:
+        candidates.sort(key=len)
+        selected = set(candidates[0]).intersection(*candidates[1:])
+    else:
+        selected = set(range(len(rows["reference"])))
+
+    epoch_column = rows["epoch"]
+    keys: List[str] = index["keys"]
+    histories: Dict[str, List[Dict[str, Any]]] = {}
+    result: List[Dict[str, Any]] = []
+    for row in sorted(selected, key=lambda r: (epoch_column[r] is None, epoch_column[r] or 0, r)):
+        key = keys[rows["key"][row]]
+        if not include_ignored and any(key.startswith(prefix) for prefix in HISTORY_TRANSLATIONS_IGNORED):
+            continue
+        reference = rows["reference"][row]
+        if reference not in histories:
+            # only the orders with matching rows are read
+            histories[reference] = load_history_of_order(reference)
+        entry = histories[reference][rows["entry"][row]]
+        change = entry["changes"][rows["change"][row]]
+        record = {
+            "reference": reference,
+            "timestamp": entry.get("timestamp"),
+            "epoch": epoch_column[row],
+            "key": key,
+            "operation": change.get("operation") if isinstance(change.get("operation"), str) else "",
+            "value": change.get("value"),
+            "old_value": change.get("old_value"),
+        }
+        if anonymize and key in HISTORY_TRANSLATIONS_ANONYMOUS:
+            record["value"] = record["old_value"] = None
+        result.append(record)
+    return result
+
+
+def _group_value(row: Dict[str, Any], by: str) -> str:
+    if by == "order":
+        return row["reference"]
+    if by == "operation":
+        return row["operation"]
+    if by == "day":
+        epoch = row["epoch"]
+        if epoch is None:
+            return t("unknown")
+        return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y-%m-%d")
+    return row["key"]
+
+
+def count_by(rows: Iterable[Dict[str, Any]], by: str = "key") -> List[Tuple[str, int]]:
+    counts: Dict[str, int] = {}
+    for row in rows:
+        group = _group_value(row, by)
+        counts[group] = counts.get(group, 0) + 1
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def change_intervals(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Time between consecutive changes of the same key per order, in days."""
+    epochs: Dict[Tuple[str, str], List[float]] = {}
+    for row in rows:
+        if row["epoch"] is not None:
+            epochs.setdefault((row["reference"], row["key"]), []).append(row["epoch"])
+    result = []
+    for (reference, key), values in epochs.items():
+        values.sort()
+        gaps = [(b - a) / 86400 for a, b in zip(values, values[1:])]
+        result.append({
+            "reference": reference,
+            "key": key,
+            "changes": len(values),
+            "mean_days": round(mean(gaps), 2) if gaps else None,
+            "min_days": round(min(gaps), 2) if gaps else None,
+            "max_days": round(max(gaps), 2) if gaps else None,
+        })
+    result.sort(key=lambda item: (item["reference"], item["key"]))
+    return result
+
+
+# -------------------------
+# CLI
+# -------------------------
+def parse_query_terms(terms: Sequence[str]) -> Dict[str, Any]:
+    """Parse ``name=value`` terms of ``--history-query``."""
+    query: Dict[str, Any] = {"keys": [], "operations": [], "references": [], "since": None,
+                             "until": None, "agg": "rows", "by": "key"}
+    for term in terms:
+        name, sep, value = term.partition("=")
+        name = name.strip().lower()
+        if not sep:
+            raise ValueError(f"{t('Invalid history query term')}: {term}")
+        value = value.strip()
+        if name == "key":
+            query["keys"].append(value)
+        elif name in ("op", "operation"):
+            query["operations"].extend(v for v in value.split(",") if v.strip())
+        elif name == "order":
+            query["references"].extend(v for v in value.split(",") if v.strip())
+        elif name in ("since", "until"):
+            query[name] = value
+        elif name == "agg" and value in _AGGREGATIONS:
+            query["agg"] = value
+        elif name == "by" and value in _GROUPINGS:
+            query["by"] = value
+        else:
+            raise ValueError(f"{t('Invalid history query term')}: {term}")
+    return query
+
+
+def main(terms: Sequence[str]) -> None:
+    """CLI entry point for ``--history-query``."""
+    from app.utils.colors import color_text
+    from app.utils.helpers import exit_with_status
+    from app.utils.json_output import emit_record
+    from app.utils.params import ALL_KEYS_MODE, JSON_OUTPUT, ORDER_FILTER, SHARE_MODE
+
+    try:
+        query = parse_query_terms(terms)
+        references = query["references"] or ([ORDER_FILTER] if ORDER_FILTER else None)
+        rows = query_history(
+            keys=query["keys"] or None,
+            operations=query["operations"] or None,
+            since=query["since"],
+            until=query["until"],
+            references=references,
+            include_ignored=ALL_KEYS_MODE,
+            anonymize=SHARE_MODE,
+        )
+    except ValueError as e:
+        exit_with_status(str(e))
+        return
+
+    agg = query["agg"]
+    if agg == "count":
+        results: List[Dict[str, Any]] = [
+            {"type": "history_count", "by": query["by"], "group": group, "count": count}
+            for group, count in count_by(rows, query["by"])
+        ]
+    elif agg == "intervals":
+        results = [{"type": "history_interval", **item} for item in change_intervals(rows)]
+    else:
+        results = [{"type": "history_change", **row} for row in rows]
+
+    if JSON_OUTPUT:
+        for record in results:
+            emit_record(record)
+        return
+
+    if not results:
+        print(t("No matching history entries"))
+        return
+    if agg == "count":
+        print(color_text(f"{t('Changes')}:", '94'))
+        for record in results:
+            group = t(history_label(record["group"])) if query["by"] == "key" else record["group"]
+            print(f"{color_text(f'- {group}:', '94')} {record['count']}")
+    elif agg == "intervals":
+        print(color_text(f"{t('Time between changes')} ({t('days')}):", '94'))
+        for record in results:
+            label = t(history_label(record["key"]))
+            if record["mean_days"] is None:
+                stats = f"{record['changes']}x"
+            else:
+                stats = f"{record['changes']}x, Ø {record['mean_days']}, min {record['min_days']}, max {record['max_days']}"
+            reference = record["reference"]
+            print(f"{color_text(f'- {reference} {label}:', '94')} {stats}")
+    else:
+        for record in results:
+            change = dict(record, key=history_label(record["key"]))
+            print(f"{record['reference']} {format_history_entry(change, False)}")
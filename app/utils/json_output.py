@@ -0,0 +1,43 @@
+"""Machine-readable output for ``--json`` and ``--jsonl``.
+
+``--jsonl`` writes one compact JSON object per line. ``--json`` writes the
+same records as a single JSON array; elements are streamed as they are
+produced and the array is closed when the process exits.
+"""
+
+import atexit
+import json
+import sys
+from typing import Any, Dict
+
+from app.utils.params import JSON_MODE, JSONL_MODE
+
+_ARRAY_OPEN = False
+
+
+def _dumps(record: Dict[str, Any], compact: bool) -> str:
+    if compact:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def emit_record(record: Dict[str, Any]) -> None:
+    """Write *record* to stdout in the active machine-readable format."""
+    global _ARRAY_OPEN
+    if JSONL_MODE:
+        sys.stdout.write(_dumps(record, compact=True) + "\n")
+    elif JSON_MODE:
+        sys.stdout.write(("," if _ARRAY_OPEN else "[") + "\n" + _dumps(record, compact=False))
+        _ARRAY_OPEN = True
+    else:
+        return
+    sys.stdout.flush()
+
+
+def _close_array() -> None:
+    sys.stdout.write("\n]\n" if _ARRAY_OPEN else "[]\n")
+    sys.stdout.flush()
+
+
+if JSON_MODE:
+    atexit.register(_close_array)
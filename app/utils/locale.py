@@ -1,20 +1,26 @@
 import json
+import marshal
 import re
-from typing import Optional
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
 
 import locale
 import os
 import sys
-from app.config import PUBLIC_DIR, SETTINGS_FILE, cfg as Config
+from app.config import PRIVATE_DIR, PUBLIC_DIR, SETTINGS_FILE, cfg as Config
 from app.utils.colors import color_text
 
 LANG_DIR = PUBLIC_DIR / "lang"
+# merged catalogues (English + language) keyed by the language files' mtimes
+TRANSLATIONS_CACHE_FILE = PRIVATE_DIR / "translations.cache"
+TRANSLATIONS_CACHE_VERSION = 1
 LOCALE = "en_US"
 LANGUAGE = "en"
 COUNTRY = "US"
 
-# Determine if we're running in status mode early to avoid banner prints (can't just import params.py cause of looping)
-STATUS_MODE = "--status" in sys.argv
+# Determine if we're running in a machine-readable mode early to avoid banner prints (can't just import params.py cause of looping)
+QUIET_MODE = any(flag in sys.argv for flag in ("--status", "--json", "--jsonl"))
 
 _SOURCE_PRIORITY = {
     "static": 0,
@@ -44,8 +50,53 @@ def _get_configured_locale() -> Optional[str]:
     return normalize_locale(configured)
 
 
-def _load_translations(lang: str) -> dict:
-    """Load translation mappings for *lang* with English fallback."""
+# language code -> merged catalogue, parsed at most once per process
+_CATALOGUES: Dict[str, dict] = {}
+_COMPILED: Optional[dict] = None
+
+
+def _file_signature(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _catalogue_signature(lang_code: str) -> list:
+    # the Python version is part of the key because marshal's format may change
+    signature = [sys.version_info[0], sys.version_info[1], _file_signature(LANG_DIR / "en.json")]
+    if lang_code != "en":
+        signature.append(_file_signature(LANG_DIR / f"{lang_code}.json"))
+    return signature
+
+
+def _read_compiled() -> dict:
+    global _COMPILED
+    if _COMPILED is None:
+        _COMPILED = {}
+        try:
+            payload = marshal.loads(TRANSLATIONS_CACHE_FILE.read_bytes())
+            if isinstance(payload, tuple) and len(payload) == 2 and payload[0] == TRANSLATIONS_CACHE_VERSION:
+                _COMPILED = payload[1]
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+    return _COMPILED
+
+
+def _write_compiled(lang_code: str, signature: list, translations: dict) -> None:
+    compiled = _read_compiled()
+    compiled[lang_code] = (signature, translations)
+    try:
+        TRANSLATIONS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TRANSLATIONS_CACHE_FILE.with_suffix(TRANSLATIONS_CACHE_FILE.suffix + ".tmp")
+        tmp.write_bytes(marshal.dumps((TRANSLATIONS_CACHE_VERSION, compiled)))
+        tmp.replace(TRANSLATIONS_CACHE_FILE)
+    except (OSError, ValueError):
+        pass
+
+
+def _parse_translations(lang_code: str) -> dict:
     translations = {}
     default_path = LANG_DIR / "en.json"
     if default_path.exists():
@@ -53,7 +104,6 @@ def _load_translations(lang: str) -> dict:
             translations.update(json.loads(default_path.read_text(encoding="utf-8")))
         except Exception:
             pass
-    lang_code = (lang or "").split("_")[0].lower()
     if lang_code and lang_code != "en":
         lang_path = LANG_DIR / f"{lang_code}.json"
         if lang_path.exists():
@@ -64,6 +114,28 @@ def _load_translations(lang: str) -> dict:
     return translations
 
 
+def _load_translations(lang: str) -> dict:
+    """Return the merged translation mapping for *lang* with English fallback.
+
+    Catalogues are cached per language, so switching back and forth only
+    swaps the active dict. Across runs the merged catalogue is read from
+    ``TRANSLATIONS_CACHE_FILE`` unless a language file changed.
+    """
+    lang_code = (lang or "").split("_")[0].lower() or "en"
+    catalogue = _CATALOGUES.get(lang_code)
+    if catalogue is not None:
+        return catalogue
+    signature = _catalogue_signature(lang_code)
+    cached = _read_compiled().get(lang_code)
+    if cached is not None and list(cached[0]) == signature:
+        catalogue = cached[1]
+    else:
+        catalogue = _parse_translations(lang_code)
+        _write_compiled(lang_code, signature, catalogue)
+    _CATALOGUES[lang_code] = catalogue
+    return catalogue
+
+
 def t(text: str) -> str:
     """Translate *text* using loaded translations."""
     return TRANSLATIONS.get(text, text)
@@ -201,6 +273,7 @@ def _try_windows_mapping(tag: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=64)
 def normalize_locale(code: str) -> Optional[str]:
     """Best-effort conversion to 'll' or 'll_RR'.
 
@@ -237,8 +310,12 @@ def _is_valid_locale(value: Optional[str]) -> bool:
     return bool(_LOCALE_STRICT_RE.match(value))
 
 
+@lru_cache(maxsize=1)
 def get_os_locale() -> Optional[str]:
-    """Return the system locale as 'll' or 'll_RR' where possible."""
+    """Return the system locale as 'll' or 'll_RR' where possible.
+
+    The system locale does not change while we run, so it is probed once.
+    """
     # 1) locale.getlocale()
     try:
         lang, _ = locale.getlocale()
@@ -294,7 +371,7 @@ def init_locale() -> None:
             LOCALE = normalized
             LANGUAGE = normalized.split("_", 1)[0].lower()
             COUNTRY = normalized.split("_", 1)[1].upper()
-            if not STATUS_MODE and LANGUAGE != previous_language:
+            if not QUIET_MODE and LANGUAGE != previous_language:
                 message = (
                     f'System language detected. Using "{LANGUAGE}" '
                     f'instead of "{previous_language}"'
@@ -303,26 +380,33 @@ def init_locale() -> None:
                 print(f"{color_text(f'You can change it in your {SETTINGS_FILE}', '93')}")
                 print()
             if _can_override_language("system"):
-                Config.set("language", normalized)
-                Config.set("language_source", "system")
+                Config.update({"language": normalized, "language_source": "system"})
         return
 
 init_locale()
 TRANSLATIONS = _load_translations(LANGUAGE)
 
+# Tesla locales already handled in this run; every order carries one
+_SEEN_TESLA_LOCALES = set()
+
+
 def store_tesla_locale(locale_value: Optional[str]) -> None:
     """Persist a Tesla-provided locale as the primary language setting."""
     if not isinstance(locale_value, str) or not locale_value.strip():
         return
+    if locale_value in _SEEN_TESLA_LOCALES:
+        return
+    _SEEN_TESLA_LOCALES.add(locale_value)
     previous_language = LANGUAGE
     normalized = normalize_locale(locale_value)
     if not normalized:
         return
     if _can_override_language("tesla"):
-        Config.set("language", normalized)
-        Config.set("language_source", "tesla")
+        Config.update({"language": normalized, "language_source": "tesla"})
+        if normalized == LOCALE:
+            return
         init_locale()
-        if not STATUS_MODE and LANGUAGE != previous_language:
+        if not QUIET_MODE and LANGUAGE != previous_language:
             message = (
                 f'Tesla order language detected. Using "{LANGUAGE}" '
                 f'instead of "{previous_language}"'
@@ -333,7 +417,7 @@ def store_tesla_locale(locale_value: Optional[str]) -> None:
 
 
 def set_language(lang: str) -> None:
-    """Set active *lang* and reload translations."""
+    """Set active *lang* and switch to its (cached) translations."""
     global LANGUAGE, TRANSLATIONS
     LANGUAGE = lang
     TRANSLATIONS = _load_translations(lang)
@@ -0,0 +1,241 @@
+"""Spatial queries over the Tesla locations in ``tesla_locations.json``.
+
+Stores are projected onto the unit sphere and kept in a static k-d tree
+(``array``-backed, built once per process). Euclidean chord length is
+monotonic in great-circle distance, so nearest-N and radius queries are
+exact, including near the poles and across the antimeridian.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.stores import StoreTable, get_store, get_store_table
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_NEAREST_LIMIT = 5
+_COORDINATE_QUERY = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+_INDEX: Optional["LocationIndex"] = None
+_NAME_INDEX: Optional[Dict[str, str]] = None
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two coordinates in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _to_unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    phi, lam = math.radians(lat), math.radians(lon)
+    cos_phi = math.cos(phi)
+    return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+
+def _km_to_chord(km: float) -> float:
+    angle = min(math.pi, max(0.0, km) / EARTH_RADIUS_KM)
+    return 2 * math.sin(angle / 2)
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+class LocationIndex:
+    """Static k-d tree over store coordinates.
+
+    The tree is implicit: ``_order`` holds point positions such that the
+    median of every ``[lo, hi)`` range is the splitting node of that range,
+    on axis ``depth % 3``.
+    """
+
+    __slots__ = ("ids", "lats", "lons", "_xyz", "_order", "_by_id")
+
+    def __init__(self, table: StoreTable):
+        self.ids: List[str] = []
+        self.lats = array("d")
+        self.lons = array("d")
+        self._xyz = array("d")
+        for pos, store_id in enumerate(table.ids):
+            coordinates = table.coordinates_at(pos)
+            if coordinates is None or not (-90 <= coordinates[0] <= 90 and -180 <= coordinates[1] <= 180):
+                continue
+            self.ids.append(store_id)
+            self.lats.append(coordinates[0])
+            self.lons.append(coordinates[1])
+            self._xyz.extend(_to_unit_vector(*coordinates))
+        self._by_id = {store_id: pos for pos, store_id in enumerate(self.ids)}
+        order = list(range(len(self.ids)))
+        self._build(order, 0, len(order), 0)
+        self._order = array("I", order)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _build(self, order: List[int], lo: int, hi: int, depth: int) -> None:
+        # iterative to stay clear of the recursion limit for large tables
+        stack = [(lo, hi, depth)]
+        xyz = self._xyz
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= 1:
+                continue
+            axis = depth % 3
+            order[lo:hi] = sorted(order[lo:hi], key=lambda pos: xyz[3 * pos + axis])
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+    def coordinates(self, store_id: Any) -> Optional[Tuple[float, float]]:
+        pos = self._by_id.get(str(store_id))
+        if pos is None:
+            return None
+        return self.lats[pos], self.lons[pos]
+
+    def _search(self, lat: float, lon: float, limit: Optional[int], max_chord: float, exclude: frozenset) -> List[Tuple[float, int]]:
+        target = _to_unit_vector(lat, lon)
+        xyz, order = self._xyz, self._order
+        # max-heap of (-chord², pos) holding the best candidates so far
+        best: List[Tuple[float, int]] = []
+        bound = max_chord * max_chord
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            pos = order[mid]
+            base = 3 * pos
+            dx = xyz[base] - target[0]
+            dy = xyz[base + 1] - target[1]
+            dz = xyz[base + 2] - target[2]
+            dist2 = dx * dx + dy * dy + dz * dz
+            if dist2 <= bound and self.ids[pos] not in exclude:
+                heapq.heappush(best, (-dist2, pos))
+                if limit is not None and len(best) > limit:
+                    heapq.heappop(best)
+                if limit is not None and len(best) == limit:
+                    bound = -best[0][0]
+            axis = depth % 3
+            diff = target[axis] - xyz[base + axis]
+            near, far = ((mid + 1, hi), (lo, mid)) if diff > 0 else ((lo, mid), (mid + 1, hi))
+            # push the far side first so the near side is searched first
+            if diff * diff <= bound:
+                stack.append((far[0], far[1], depth + 1))
+            stack.append((near[0], near[1], depth + 1))
+        return sorted((-neg, pos) for neg, pos in best)
+
+    def nearest(self, lat: float, lon: float, limit: int = DEFAULT_NEAREST_LIMIT, exclude: Tuple[str, ...] = ()) -> List[Tuple[str, float]]:
+        """Return up to *limit* ``(store_id, km)`` pairs closest to the coordinate."""
+        if limit <= 0:
+            return []
+        found = self._search(lat, lon, limit, 2.0, frozenset(str(e) for e in exclude))
+        return [(self.ids[pos], _chord_to_km(math.sqrt(dist2))) for dist2, pos in found]
+
+    def within_radius(self, lat: float, lon: float, radius_km: float, exclude: Tuple[str, ...] = ()) -> List[Tuple[str, float]]:
+        """Return all ``(store_id, km)`` pairs within *radius_km*, nearest first."""
+        found = self._search(lat, lon, None, _km_to_chord(radius_km), frozenset(str(e) for e in exclude))
+        return [(self.ids[pos], _chord_to_km(math.sqrt(dist2))) for dist2, pos in found]
+
+
+def get_location_index() -> LocationIndex:
+    global _INDEX
+    if _INDEX is None:
+        _INDEX = LocationIndex(get_store_table())
+    return _INDEX
+
+
+def find_store_id_by_name(name: Any) -> Optional[str]:
+    """Return the id of the store whose display name matches *name* (case-insensitive)."""
+    global _NAME_INDEX
+    if not isinstance(name, str) or not name.strip():
+        return None
+    if _NAME_INDEX is None:
+        _NAME_INDEX = {}
+        table = get_store_table()
+        for store_id, display_name in zip(table.ids, table.columns["display_name"]):
+            if display_name and display_name.strip():
+                _NAME_INDEX.setdefault(display_name.strip().casefold(), store_id)
+    return _NAME_INDEX.get(name.strip().casefold())
+
+
+def store_distance_km(store_id_a: Any, store_id_b: Any) -> Optional[float]:
+    index = get_location_index()
+    a, b = index.coordinates(store_id_a), index.coordinates(store_id_b)
+    if a is None or b is None:
+        return None
+    return haversine_km(a[0], a[1], b[0], b[1])
+
+
+def resolve_location_query(query: str) -> Optional[Tuple[float, float, Optional[str]]]:
+    """Resolve ``"lat,lon"``, a store id or a store name to ``(lat, lon, store_id)``."""
+    match = _COORDINATE_QUERY.match(query or "")
+    if match:
+        lat, lon = float(match.group(1)), float(match.group(2))
+        if -90 <= lat <= 90 and -180 <= lon <= 180:
+            return lat, lon, None
+        return None
+    index = get_location_index()
+    store_id = query.strip() if index.coordinates(query.strip()) is not None else find_store_id_by_name(query)
+    if store_id is None:
+        return None
+    lat, lon = index.coordinates(store_id)  # type: ignore[misc]
+    return lat, lon, store_id
+
+
+def location_record(store_id: str, distance_km: float) -> Dict[str, Any]:
+    store = get_store(store_id)
+    address = store.get("address", {}) if isinstance(store.get("address"), dict) else {}
+    return {
+        "type": "location",
+        "id": store_id,
+        "name": store.get("display_name"),
+        "city": address.get("city"),
+        "country": address.get("country"),
+        "latitude": address.get("latitude"),
+        "longitude": address.get("longitude"),
+        "distance_km": round(distance_km, 1),
+    }
+
+
+def main(query: str, radius_km: Optional[float] = None, limit: int = DEFAULT_NEAREST_LIMIT) -> None:
+    """CLI entry point for ``--nearest``."""
+    from app.utils.colors import color_text
+    from app.utils.helpers import exit_with_status
+    from app.utils.json_output import emit_record
+    from app.utils.locale import t
+    from app.utils.params import JSON_OUTPUT
+
+    resolved = resolve_location_query(query)
+    if resolved is None:
+        exit_with_status(f"{t('Unknown location')}: {query}")
+        return
+    lat, lon, origin_id = resolved
+    exclude = (origin_id,) if origin_id else ()
+    index = get_location_index()
+    if radius_km is not None:
+        results = index.within_radius(lat, lon, radius_km, exclude=exclude)[:max(0, limit)]
+    else:
+        results = index.nearest(lat, lon, limit, exclude=exclude)
+
+    if JSON_OUTPUT:
+        for store_id, distance in results:
+            emit_record(location_record(store_id, distance))
+        return
+
+    origin = get_store(origin_id).get("display_name") if origin_id else f"{lat:.5f}, {lon:.5f}"
+    print(color_text(f"{t('Nearby Tesla Locations')} ({origin}):", '94'))
+    if not results:
+        print(f"- {t('No locations found')}")
+        return
+    for store_id, distance in results:
+        record = location_record(store_id, distance)
+        place = ", ".join(part for part in (record["city"], record["country"]) if part)
+        print(f"{color_text(f'- {distance:.1f} km:', '94')} {record['name']} ({store_id}){' - ' + place if place else ''}")
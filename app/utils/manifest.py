@@ -0,0 +1,97 @@
+"""Content manifest of the installed project files.
+
+The manifest records a SHA-256 hash per file together with the upstream
+commit the installation corresponds to. It replaces mtime comparisons for
+the update check (copying files changes mtimes, not contents) and lets the
+updater replace only files whose contents actually changed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
+
+from app.config import BASE_DIR, PRIVATE_DIR
+
+MANIFEST_FILE = PRIVATE_DIR / "install_manifest.json"
+MANIFEST_VERSION = 1
+HASH_CHUNK_SIZE = 64 * 1024
+
+# relative directories that never belong to the installation itself
+_EXCLUDED_DIRS = {".git", ".venv", "venv", "__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache"}
+_EXCLUDED_PREFIXES = ("data/private/",)
+_EXCLUDED_SUFFIXES = (".pyc", ".pyo", ".tmp")
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def is_installation_path(relative: str) -> bool:
+    """Return True if the POSIX *relative* path is part of the installation."""
+    parts = relative.split("/")
+    if any(part in _EXCLUDED_DIRS for part in parts[:-1]):
+        return False
+    if relative.startswith(_EXCLUDED_PREFIXES):
+        return False
+    return not relative.endswith(_EXCLUDED_SUFFIXES)
+
+
+def iter_installation_files(base: Path = BASE_DIR) -> Iterator[str]:
+    """Yield POSIX paths (relative to *base*) of all installation files."""
+    for root, dirs, files in os.walk(base):
+        root_path = Path(root)
+        rel_root = root_path.relative_to(base).as_posix()
+        dirs[:] = sorted(
+            d for d in dirs
+            if d not in _EXCLUDED_DIRS
+            and not (("" if rel_root == "." else rel_root + "/") + d + "/").startswith(_EXCLUDED_PREFIXES)
+        )
+        for name in sorted(files):
+            relative = name if rel_root == "." else f"{rel_root}/{name}"
+            if is_installation_path(relative):
+                yield relative
+
+
+def build_manifest_files(base: Path = BASE_DIR) -> Dict[str, str]:
+    return {relative: file_sha256(base / relative) for relative in iter_installation_files(base)}
+
+
+def load_manifest() -> Optional[Dict[str, Any]]:
+    if not MANIFEST_FILE.exists():
+        return None
+    try:
+        with MANIFEST_FILE.open("r", encoding="utf-8") as fh:
+            manifest = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    if not isinstance(manifest.get("files"), dict):
+        return None
+    return manifest
+
+
+def save_manifest(
+    files: Dict[str, str],
+    commit: Optional[str] = None,
+    updated: Optional[str] = None,
+) -> Dict[str, Any]:
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "commit": commit,
+        "updated": updated,
+        "files": files,
+    }
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_FILE.with_suffix(MANIFEST_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    tmp.replace(MANIFEST_FILE)
+    return manifest
@@ -1,15 +1,37 @@
-import json
+import argparse
 import importlib.util
+import inspect
+import json
+import os
+import shutil
 import sys
-from typing import List
-from app.config import APP_DIR, PRIVATE_DIR
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, IO, Iterator, List, Optional, Tuple
+from app.config import APP_DIR, HISTORY_FILE, HISTORY_INDEX_FILE, PRIVATE_DIR, TIMELINE_FILE
 
 # -------------------------
 # Migration runner
 # -------------------------
 MIGRATIONS_DIR = APP_DIR / "migrations"
 MIGRATIONS_APPLIED_FILE = PRIVATE_DIR / "migrations_applied.json"
-PRIVATE_DIR.mkdir(parents=True, exist_ok=True)
+MIGRATION_CHECKPOINT_FILE = PRIVATE_DIR / "migration_checkpoint.json"
+
+# Compiled manifest of all migrations in app/migrations, in execution order.
+# New migrations have to be registered here; startup never scans the folder.
+MIGRATIONS: Tuple[str, ...] = (
+    "2025-08-23-history",
+    "2025-08-30-datafolders",
+    "2025-09-15-history-trimvalues",
+    "2025-11-12-history-reference",
+    "2025-11-12-orders-map",
+    "2026-10-19-orders-projection",
+    "2026-10-19-orders-shards",
+)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+CHECKPOINT_EVERY = 500  # history entries between two resume checkpoints
+MAX_OPEN_PARTS = 64  # part files regroup_history keeps open at once
 
 def _load_applied_migrations() -> List[str]:
     if MIGRATIONS_APPLIED_FILE.exists():
@@ -26,24 +48,459 @@ def _save_applied_migrations(names: List[str]) -> None:
     with open(MIGRATIONS_APPLIED_FILE, "w", encoding="utf-8") as f:
         json.dump(sorted(names), f)
 
+
+def invalidate_derived_caches() -> None:
+    """Drop the caches derived from history/orders (timeline and query index) so they get rebuilt."""
+    for path in (TIMELINE_FILE, HISTORY_INDEX_FILE):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _load_migration(name: str):
+    path = MIGRATIONS_DIR / f"{name}.py"
+    spec = importlib.util.spec_from_file_location(f"migrations.{name}", path)
+    module = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
+    assert spec and spec.loader
+    spec.loader.exec_module(module)  # type: ignore[union-attr]
+    return module
+
+
+def _supports_dry_run(run: Callable[..., Any]) -> bool:
+    try:
+        return "dry_run" in inspect.signature(run).parameters
+    except (TypeError, ValueError):
+        return False
+
+
 def main() -> None:
+    # fast no-op path: one small read, no directory scan and no write
+    applied = set(_load_applied_migrations())
+    if applied.issuperset(MIGRATIONS):
+        return
     if not MIGRATIONS_DIR.exists():
         return
-    applied = set(_load_applied_migrations())
-    files = sorted(MIGRATIONS_DIR.glob("*.py"))
-    for path in files:
-        name = path.stem
+    PRIVATE_DIR.mkdir(parents=True, exist_ok=True)
+    ran_any = False
+    for name in MIGRATIONS:
         if name in applied:
             continue
         try:
-            spec = importlib.util.spec_from_file_location(f"migrations.{name}", path)
-            module = importlib.util.module_from_spec(spec)  # type: ignore[arg-type]
-            assert spec and spec.loader
-            spec.loader.exec_module(module)  # type: ignore[union-attr]
+            module = _load_migration(name)
             if hasattr(module, "run"):
                 module.run()
             applied.add(name)
+            ran_any = True
         except Exception as e:
             # Don't hard-fail, just report
             print(f"> Migration '{name}' failed: {e}", file=sys.stderr)
-    _save_applied_migrations(list(applied))
\ No newline at end of file
+    if ran_any:
+        invalidate_derived_caches()
+        _save_applied_migrations(list(applied))
+
+
+# -------------------------
+# Streaming history migrations
+# -------------------------
+class _JsonStream:
+    """Minimal incremental reader for the top-level structure of a JSON file.
+
+    Only one chunk plus the value currently being decoded is held in memory.
+    """
+
+    _DECODER = json.JSONDecoder()
+
+    def __init__(self, fh: IO[str]):
+        self._fh = fh
+        self._buf = ""
+        self._pos = 0
+
+    def _fill(self) -> bool:
+        chunk = self._fh.read(STREAM_CHUNK_SIZE)
+        if not chunk:
+            return False
+        self._buf = self._buf[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in " \t\r\n":
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Unexpected JSON structure, expected '{char}'")
+        self._pos += 1
+
+    def value(self) -> Any:
+        # only strings and objects are decoded here, so a successful decode is never truncated
+        self.peek()
+        while True:
+            try:
+                value, end = self._DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            self._pos = end
+            return value
+
+    def separator(self, closing: str) -> bool:
+        """Consume ',' (returns True) or *closing* (returns False)."""
+        char = self.peek()
+        if char == ",":
+            self._pos += 1
+            return True
+        self.expect(closing)
+        return False
+
+
+def iter_history_entries(path: Path) -> Iterator[Tuple[Optional[str], Any]]:
+    """Yield ``(reference, entry)`` pairs of a history file one by one.
+
+    Supports the current ``{reference: [entries]}`` layout and the legacy
+    list layout (reference ``None``). References without entries are skipped.
+    """
+    with open(path, "r", encoding="utf-8") as fh:
+        stream = _JsonStream(fh)
+        first = stream.peek()
+        if first == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                return
+            while True:
+                yield None, stream.value()
+                if not stream.separator("]"):
+                    return
+        elif first == "{":
+            stream.expect("{")
+            if stream.peek() == "}":
+                return
+            while True:
+                reference = stream.value()
+                stream.expect(":")
+                if stream.peek() == "[":
+                    stream.expect("[")
+                    if stream.peek() == "]":
+                        stream.expect("]")
+                    else:
+                        while True:
+                            yield str(reference), stream.value()
+                            if not stream.separator("]"):
+                                break
+                else:
+                    stream.value()  # not a list of entries, dropped like load_history_from_file does
+                if not stream.separator("}"):
+                    return
+        elif first:
+            raise ValueError("History file is neither a list nor an object")
+
+
+def _file_signature(path: Path) -> List[int]:
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_checkpoint(name: str, path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(MIGRATION_CHECKPOINT_FILE, "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(checkpoint, dict)
+        or checkpoint.get("migration") != name
+        or checkpoint.get("source") != _file_signature(path)
+    ):
+        return None
+    return checkpoint
+
+
+def _save_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    tmp = MIGRATION_CHECKPOINT_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(checkpoint), encoding="utf-8")
+    tmp.replace(MIGRATION_CHECKPOINT_FILE)
+
+
+def _clear_checkpoint() -> None:
+    try:
+        MIGRATION_CHECKPOINT_FILE.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def rewrite_history(
+    name: str,
+    transform: Callable[[Any], Tuple[Any, bool]],
+    path: Path = HISTORY_FILE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Apply *transform* to every history entry without loading the whole file.
+
+    *transform* returns ``(entry, changed)``. Output is streamed into a
+    temporary file that replaces *path* only if at least one entry changed.
+    Progress is checkpointed every ``CHECKPOINT_EVERY`` entries so an
+    interrupted run resumes where it stopped. With *dry_run* nothing is
+    written and only the statistics are returned.
+    """
+    stats = {"entries": 0, "changed": 0}
+    if not path.exists():
+        return stats
+
+    if dry_run:
+        for _, entry in iter_history_entries(path):
+            stats["entries"] += 1
+            if transform(entry)[1]:
+                stats["changed"] += 1
+        return stats
+
+    tmp_path = path.with_suffix(path.suffix + ".migrating")
+    checkpoint = _load_checkpoint(name, path) if tmp_path.exists() else None
+    state: Dict[str, Any] = {
+        "migration": name,
+        "source": _file_signature(path),
+        "processed": 0,
+        "changed": 0,
+        "offset": 0,
+        "layout": None,
+        "open_reference": None,
+        "reference_has_entries": False,
+        "any_reference": False,
+    }
+    if checkpoint:
+        state.update(checkpoint)
+
+    with open(tmp_path, "r+b" if checkpoint else "wb") as out:
+        out.truncate(state["offset"])
+        out.seek(state["offset"])
+
+        def write(text: str) -> None:
+            out.write(text.encode("utf-8"))
+
+        skip = state["processed"]
+        for reference, entry in iter_history_entries(path):
+            if skip:
+                skip -= 1
+                continue
+            if state["layout"] is None:
+                state["layout"] = "list" if reference is None else "dict"
+                write("[" if reference is None else "{")
+
+            new_entry, changed = transform(entry)
+            if changed:
+                state["changed"] += 1
+            if state["layout"] == "list":
+                write(("," if state["processed"] else "") + json.dumps(new_entry))
+            else:
+                if reference != state["open_reference"]:
+                    if state["open_reference"] is not None:
+                        write("]")
+                    write(("," if state["any_reference"] else "") + json.dumps(reference) + ":[")
+                    state["open_reference"] = reference
+                    state["reference_has_entries"] = False
+                    state["any_reference"] = True
+                write(("," if state["reference_has_entries"] else "") + json.dumps(new_entry))
+                state["reference_has_entries"] = True
+            state["processed"] += 1
+
+            if state["processed"] % CHECKPOINT_EVERY == 0:
+                out.flush()
+                state["offset"] = out.tell()
+                _save_checkpoint(state)
+
+        if state["layout"] == "list":
+            write("]")
+        elif state["layout"] == "dict":
+            write(("]" if state["open_reference"] is not None else "") + "}")
+        out.flush()
+        os.fsync(out.fileno())
+
+    stats["entries"] = state["processed"]
+    stats["changed"] = state["changed"]
+    if state["changed"] and state["layout"] is not None:
+        tmp_path.replace(path)
+    else:
+        tmp_path.unlink()
+    _clear_checkpoint()
+    return stats
+
+
+def _split_into_parts(
+    path: Path,
+    split: Callable[[Any], List[Tuple[str, Any]]],
+    parts_dir: Path,
+    state: Dict[str, Any],
+) -> None:
+    """Append every ``(reference, entry)`` pair of *path* to the part file of its reference."""
+    references: List[str] = state["references"]
+    index = {reference: position for position, reference in enumerate(references)}
+    parts_dir.mkdir(exist_ok=True)
+    # drop what was appended after the last checkpoint
+    for position, size in enumerate(state["sizes"]):
+        with open(parts_dir / f"{position}.part", "r+b") as part:
+            part.truncate(size)
+    handles: Dict[int, IO[bytes]] = {}
+
+    def save_checkpoint() -> None:
+        for part in handles.values():
+            part.flush()
+        state["sizes"] = [(parts_dir / f"{position}.part").stat().st_size for position in range(len(references))]
+        _save_checkpoint(state)
+
+    try:
+        skip = state["processed"]
+        for _, entry in iter_history_entries(path):
+            if skip:
+                skip -= 1
+                continue
+            for reference, item in split(entry):
+                position = index.get(reference)
+                new = position is None
+                if new:
+                    position = index[reference] = len(references)
+                    references.append(reference)
+                    state["written"].append(0)
+                part = handles.get(position)
+                if part is None:
+                    if len(handles) >= MAX_OPEN_PARTS:
+                        for handle in handles.values():
+                            handle.close()
+                        handles.clear()
+                    part = handles[position] = open(parts_dir / f"{position}.part", "wb" if new else "ab")
+                part.write((("," if state["written"][position] else "") + json.dumps(item)).encode("utf-8"))
+                state["written"][position] += 1
+            state["processed"] += 1
+            if state["processed"] % CHECKPOINT_EVERY == 0:
+                save_checkpoint()
+        state["phase"] = "join"
+        save_checkpoint()
+    finally:
+        for handle in handles.values():
+            handle.close()
+
+
+def _join_parts(parts_dir: Path, tmp_path: Path, state: Dict[str, Any]) -> None:
+    """Concatenate the part files into ``{reference: [entries]}``, one reference per checkpoint."""
+    references = state["references"]
+    if not tmp_path.exists():
+        state["reference_index"] = state["offset"] = 0
+    with open(tmp_path, "r+b" if state["reference_index"] else "wb") as out:
+        out.truncate(state["offset"])
+        out.seek(state["offset"])
+        while state["reference_index"] < len(references):
+            position = state["reference_index"]
+            out.write((("{" if position == 0 else "],") + json.dumps(references[position]) + ":[").encode("utf-8"))
+            with open(parts_dir / f"{position}.part", "rb") as part:
+                shutil.copyfileobj(part, out)
+            state["reference_index"] += 1
+            out.flush()
+            state["offset"] = out.tell()
+            _save_checkpoint(state)
+        out.write(b"]}")
+        out.flush()
+        os.fsync(out.fileno())
+
+
+def regroup_history(
+    name: str,
+    split: Callable[[Any], List[Tuple[str, Any]]],
+    path: Path = HISTORY_FILE,
+    dry_run: bool = False,
+) -> Dict[str, int]:
+    """Turn a legacy list history into the ``{reference: [entries]}`` layout without loading it.
+
+    *split* maps one legacy entry to ``(reference, entry)`` pairs. A single
+    pass over the file appends every pair to a temporary part file of its
+    reference; the part files are then concatenated in order of first
+    appearance, so only one entry is held in memory at a time. Progress is
+    checkpointed every ``CHECKPOINT_EVERY`` entries and after every
+    concatenated reference; an interrupted run resumes where it stopped.
+    Files already in the new layout are left alone. With *dry_run* nothing
+    is written.
+    """
+    stats = {"entries": 0, "references": 0, "changed": 0}
+    if not path.exists():
+        return stats
+    with open(path, "r", encoding="utf-8") as fh:
+        if _JsonStream(fh).peek() != "[":
+            return stats
+
+    if dry_run:
+        seen: Dict[str, None] = {}
+        for _, entry in iter_history_entries(path):
+            stats["entries"] += 1
+            for reference, _ in split(entry):
+                seen.setdefault(reference, None)
+        stats["references"], stats["changed"] = len(seen), stats["entries"]
+        return stats
+
+    parts_dir = path.with_suffix(path.suffix + ".parts")
+    tmp_path = path.with_suffix(path.suffix + ".migrating")
+    state = _load_checkpoint(name, path) if parts_dir.is_dir() else None
+    if not state or state.get("phase") not in ("split", "join"):
+        state = {
+            "migration": name,
+            "source": _file_signature(path),
+            "phase": "split",
+            "references": [],
+            "written": [],
+            "sizes": [],
+            "processed": 0,
+            "reference_index": 0,
+            "offset": 0,
+        }
+    if state["phase"] == "split":
+        _split_into_parts(path, split, parts_dir, state)
+    stats["entries"] = stats["changed"] = state["processed"]
+    stats["references"] = len(state["references"])
+    if state["references"]:
+        _join_parts(parts_dir, tmp_path, state)
+        tmp_path.replace(path)
+    shutil.rmtree(parts_dir, ignore_errors=True)
+    _clear_checkpoint()
+    return stats
+
+
+# -------------------------
+# Dry-run / benchmark
+# -------------------------
+def _run_cli(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or benchmark data migrations.")
+    parser.add_argument("--dry-run", action="store_true", help="report what pending migrations would change without writing")
+    parser.add_argument("--benchmark", action="store_true", help="time each migration in dry-run mode")
+    parser.add_argument("--all", action="store_true", help="include migrations that are already applied")
+    args = parser.parse_args(argv)
+
+    applied = set(_load_applied_migrations())
+    selected = [name for name in MIGRATIONS if args.all or name not in applied]
+    if not args.dry_run and not args.benchmark:
+        print("Pending migrations: " + (", ".join(selected) if selected else "none"))
+        return 0
+
+    for name in selected:
+        module = _load_migration(name)
+        run = getattr(module, "run", None)
+        if run is None or not _supports_dry_run(run):
+            print(f"{name}: no dry-run support, skipped")
+            continue
+        started = time.perf_counter()
+        stats = run(dry_run=True) or {}
+        elapsed = time.perf_counter() - started
+        details = ", ".join(f"{key}={value}" for key, value in sorted(stats.items()))
+        line = f"{name}: {details or 'nothing to do'}"
+        if args.benchmark:
+            entries = stats.get("entries", 0)
+            rate = f", {entries / elapsed:.0f} entries/s" if entries and elapsed > 0 else ""
+            line += f" ({elapsed * 1000:.1f} ms{rate})"
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(_run_cli())
@@ -1,4 +1,11 @@
-"""Utilities for retrieving Tesla option codes from the remote API."""
+"""Utilities for retrieving Tesla option codes from the remote API.
+
+The catalogue is synced incrementally: with a valid cache the request
+carries its ``fetched_at`` as ``since`` together with ``SCHEMA_VERSION``,
+and the server may answer with only the entries added, changed or removed
+since then (``"delta": true``). Servers without delta support, or a delta
+that does not fit the cache, lead to the full catalogue as before.
+"""
 
 from __future__ import annotations
 
@@ -6,14 +13,18 @@ import json
 from datetime import datetime, timedelta, timezone
 from glob import glob
 from pathlib import Path
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+from urllib.parse import urlencode
 
-from app.config import PRIVATE_DIR, PUBLIC_DIR
+from app.config import PRIVATE_DIR, PUBLIC_DIR, get_base_url
 from app.utils.connection import request_with_retry
+from app.utils.params import CACHED_MODE
+from app.utils.timestamps import parse_timestamp_utc
 
-FETCH_URL = "https://www.tesla-order-status-tracker.de/get/option_codes.php"
+FETCH_PATH = "/get/option_codes.php"
 CACHE_FILE = PRIVATE_DIR / "option_codes_cache.json"
-CACHE_TTL = timedelta(hours=24)
+# a refresh usually only transfers the changes, so new codes may show up sooner
+CACHE_TTL = timedelta(hours=6)
 SCHEMA_VERSION = 3
 _OPTION_CODES: Optional[Dict[str, Dict[str, Any]]] = None
 
@@ -67,30 +78,10 @@ def _normalize_entry(value: Any) -> Optional[Dict[str, Any]]:
 
 
 def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
-    if not value:
-        return None
-    text = value.strip()
-    if not text:
-        return None
-    try:
-        if text.endswith("Z"):
-            text = text[:-1] + "+00:00"
-        dt = datetime.fromisoformat(text)
-    except ValueError:
-        for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
-            try:
-                dt = datetime.strptime(text, fmt)
-                break
-            except ValueError:
-                continue
-        else:
-            return None
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+    return parse_timestamp_utc(value)
 
 
-def _load_cache(allow_expired: bool = False) -> Optional[Dict[str, Dict[str, Any]]]:
+def _read_cache_payload() -> Optional[Dict[str, Any]]:
     if not CACHE_FILE.exists():
         return None
     try:
@@ -98,6 +89,17 @@ def _load_cache(allow_expired: bool = False) -> Optional[Dict[str, Dict[str, Any
             payload = json.load(fh)
     except (OSError, ValueError):
         return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _load_cache(
+    allow_expired: bool = False,
+    payload: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    if payload is None:
+        payload = _read_cache_payload()
+    if payload is None:
+        return None
 
     option_codes = payload.get("option_codes")
     if not isinstance(option_codes, dict):
@@ -137,26 +139,36 @@ def _write_cache(option_codes: Dict[str, Dict[str, Any]], fetched_at: Optional[s
         "option_codes": option_codes,
         "schema_version": SCHEMA_VERSION,
     }
-    CACHE_FILE.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    # readers never see a half-written catalogue
+    tmp = CACHE_FILE.with_suffix(CACHE_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(CACHE_FILE)
 
 
-def _fetch_remote() -> Tuple[Optional[Dict[str, Dict[str, Any]]], Optional[str]]:
+def _request_catalogue(since: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    url = f"{get_base_url('option_codes')}{FETCH_PATH}"
+    if since:
+        url += "?" + urlencode({"since": since, "schema": SCHEMA_VERSION})
     try:
-        response = request_with_retry(FETCH_URL, exit_on_error=False)
+        response = request_with_retry(url, exit_on_error=False)
     except RuntimeError:
-        return None, None
+        return None
     if response is None:
-        return None, None
+        return None
     try:
         payload = response.json()
     except ValueError:
-        return None, None
-
+        return None
     if not isinstance(payload, dict) or not payload.get("ok"):
-        return None, None
+        return None
+    return payload
 
+
+def _parse_entries(entries: Any) -> Dict[str, Dict[str, Any]]:
     option_codes: Dict[str, Dict[str, Any]] = {}
-    for entry in payload.get("option_codes", []):
+    if not isinstance(entries, list):
+        return option_codes
+    for entry in entries:
         if not isinstance(entry, dict):
             continue
         code = entry.get("code")
@@ -173,9 +185,48 @@ def _fetch_remote() -> Tuple[Optional[Dict[str, Dict[str, Any]]], Optional[str]]
         if isinstance(label_short, str) and label_short.strip():
             normalized_entry["label_short"] = label_short.strip()
         option_codes[str(code).strip().upper()] = normalized_entry
+    return option_codes
+
 
+def _apply_delta(
+    base: Dict[str, Dict[str, Any]],
+    changed: Dict[str, Dict[str, Any]],
+    removed: Iterable[Any],
+) -> Dict[str, Dict[str, Any]]:
+    merged = dict(base)
+    for code in removed:
+        if isinstance(code, str):
+            merged.pop(code.strip().upper(), None)
+    merged.update(changed)
+    return merged
+
+
+def _fetch_remote(
+    base: Optional[Dict[str, Dict[str, Any]]] = None,
+    since: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Dict[str, Any]]], Optional[str]]:
+    """Return the current catalogue and its ``fetched_at``.
+
+    With *base* and its *since* only the changes are requested and merged
+    into a copy of *base*. A full answer replaces the catalogue; a delta
+    that refers to another state than *since* is discarded and the full
+    catalogue is fetched instead.
+    """
+    if base is None:
+        since = None
+    payload = _request_catalogue(since)
+    if payload is None:
+        return None, None
     fetched_at = payload.get("fetched_at")
-    return option_codes, fetched_at
+    if not payload.get("delta"):
+        return _parse_entries(payload.get("option_codes")), fetched_at
+    removed = payload.get("removed")
+    # the next delta starts at fetched_at, so a delta without it cannot be chained
+    if since is None or payload.get("since") != since or not fetched_at or not isinstance(removed, list):
+        return _fetch_remote() if since is not None else (None, None)
+    changed = _parse_entries(payload.get("added"))
+    changed.update(_parse_entries(payload.get("changed")))
+    return _apply_delta(base, changed, removed), fetched_at
 
 
 def _load_local_overrides() -> Dict[str, Dict[str, Any]]:
@@ -215,21 +266,28 @@ def get_option_codes(force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
     if not force_refresh and _OPTION_CODES is not None:
         return _OPTION_CODES
 
+    payload = _read_cache_payload()
     if not force_refresh:
-        cached = _load_cache(allow_expired=False)
+        cached = _load_cache(allow_expired=False, payload=payload)
         if cached is not None:
             final_codes = _apply_local_overrides(cached)
             _OPTION_CODES = final_codes
             return final_codes
 
-    option_codes, fetched_at = _fetch_remote()
+    # a cache of the current schema is the base of a delta sync
+    base, since = None, None
+    if payload is not None and payload.get("schema_version") == SCHEMA_VERSION and payload.get("fetched_at"):
+        base, since = _load_cache(allow_expired=True, payload=payload), str(payload["fetched_at"])
+
+    # cached mode stays offline, an expired catalogue is refreshed by the next online run
+    option_codes, fetched_at = _fetch_remote(base, since) if not CACHED_MODE else (None, None)
     if option_codes is not None:
         _write_cache(option_codes, fetched_at)
         final_codes = _apply_local_overrides(option_codes)
         _OPTION_CODES = final_codes
         return final_codes
 
-    cached = _load_cache(allow_expired=True)
+    cached = _load_cache(allow_expired=True, payload=payload)
     if cached is not None:
         final_codes = _apply_local_overrides(cached)
         _OPTION_CODES = final_codes
@@ -240,6 +298,14 @@ def get_option_codes(force_refresh: bool = False) -> Dict[str, Dict[str, Any]]:
     return fallback
 
 
+def get_known_option_codes() -> Set[str]:
+    """Return the codes of the local catalogue without any network request."""
+    if _OPTION_CODES is not None:
+        return set(_OPTION_CODES)
+    cached = _load_cache(allow_expired=True) or {}
+    return set(cached).union(_load_local_overrides())
+
+
 def get_option_label(code: str) -> Optional[str]:
     """Return the label for *code* if it exists."""
     if not isinstance(code, str):
@@ -0,0 +1,682 @@
+"""Pure functions over order payloads and their history.
+
+Nothing in here parses the command line, reads settings or prints, so the
+CLI modules and the library API in :mod:`app.client` share the same rules
+for diffing orders, filtering history and building timelines.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Container, Dict, Iterable, List, MutableMapping, Optional, OrderedDict as TypingOrderedDict, Sequence, Tuple
+
+from app.utils.timestamps import parse_timestamp, parse_timestamp_raw, timestamp_epoch
+
+DetailedOrder = Dict[str, Any]
+OrderMap = TypingOrderedDict[str, DetailedOrder]
+
+# -------------------------
+# History keys
+# -------------------------
+# uninteresting history entries
+HISTORY_TRANSLATIONS_IGNORED = {
+    "order.vin", # we use details.tasks.deliveryDetails.regData.orderDetails.vin
+    "details.tasks.registration.orderDetails.vin",
+    "details.tasks.registration.regData.orderDetails.vin",
+    "details.tasks.finalPayment.data.vin",
+    "details.tasks.tradeIn.isMatched",
+    "details.tasks.registration.isMatched",
+    "details.tasks.registration.orderDetails.vehicleModelYear",
+    "details.state.",
+    "details.strings.",
+    "details.scheduling.card.",
+    "details.scheduling.strings.",
+    "details.tasks.carbonCredit.card.",
+    "details.tasks.carbonCredit.strings.",
+    "details.tasks.finalPayment.card.",
+    "details.tasks.finalPayment.strings.",
+    "details.tasks.scheduling.card.",
+    "details.tasks.scheduling.strings.",
+    "details.tasks.scheduling.isDeliveryEstimatesEnabled",
+    "details.tasks.registration.orderDetails.isAvailableForMatch",
+    "details.tasks.finalPayment.data.isAvailableForMatch",
+    "details.tasks.finalPayment.data.deliveryReadinessDetail.",
+    "details.tasks.finalPayment.data.deliveryReadiness.",
+    "details.tasks.finalPayment.data.agreementDetails",
+    "details.tasks.finalPayment.data.vehicleId",
+    "details.tasks.deliveryAcceptance.gates",
+    "details.tasks.deliveryAcceptance.card.",
+    "details.tasks.deliveryAcceptance.strings.",
+    "details.tasks.deliveryDetails.regData.reggieRegistrationStatus",
+    "details.tasks.deliveryDetails.strings.",
+    "details.tasks.deliveryDetails.card.",
+    "details.tasks.registration.card.",
+    "details.tasks.registration.regData.reggieRegistrationStatus",
+    "details.tasks.registration.strings.",
+    "details.tasks.finalPayment.complete",
+    "details.tasks.finalPayment.data.finalPaymentStatus",
+    "details.tasks.scheduling.apptDateTimeAddressStr",
+    "details.tasks.scheduling.isInventoryOrMatched",
+    "details.tasks.finalPayment.data.hasFinalInvoice",
+    "details.tasks.finalPayment.data.hasActiveInvoice",
+    "details.tasks.finalPayment.data.selfSchedulingDetails.deliveryLocationId",
+    "details.tasks.finalPayment.data.selfSchedulingDetails.",
+    "details.tasks.financing.card.",
+    "details.tasks.financing.strings.",
+    "details.tasks.tradeIn.card.",
+    "details.tasks.tradeIn.strings."
+}
+
+# Define translations for history keys
+HISTORY_TRANSLATIONS = {
+    'details.tasks.scheduling.deliveryWindowDisplay': 'Delivery Window',
+    'details.tasks.scheduling.deliveryAppointmentDate': 'Delivery Appointment Date',
+    'details.tasks.scheduling.deliveryAddressTitle': 'Delivery Center',
+    'details.tasks.finalPayment.data.etaToDeliveryCenter': 'ETA to Delivery Center',
+    'details.tasks.registration.orderDetails.vehicleRoutingLocation': 'Routing Location',
+    'details.tasks.registration.expectedRegDate': 'Expected Registration Date',
+    'details.orderStatus': 'Order Status',
+    'details.tasks.registration.orderDetails.reservationDate': 'Reservation Date',
+    'details.tasks.registration.orderDetails.orderBookedDate': 'Order Booked Date',
+    'details.tasks.registration.orderDetails.vehicleOdometer': 'Vehicle Odometer',
+    'order.modelCode': 'Model',
+    'order.mktOptions': 'Configuration'
+}
+
+HISTORY_TRANSLATIONS_ANONYMOUS = {
+    'details.tasks.deliveryDetails.regData.orderDetails.vin': 'VIN',
+}
+
+
+HISTORY_TRANSLATIONS_DETAILS = {
+    **HISTORY_TRANSLATIONS,
+    **HISTORY_TRANSLATIONS_ANONYMOUS,
+    'details.tasks.finalPayment.data.paymentDetails.amountPaid': 'Amount Paid',
+    'details.tasks.finalPayment.data.paymentDetails.paymentType': 'Payment Method',
+    'details.tasks.finalPayment.data.accountBalance': 'Account Balance',
+    'details.tasks.finalPayment.data.amountDue': 'Amount Due',
+    'details.tasks.finalPayment.data.financingDetails.financialProductType': 'Finance Product',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.financePartnerName': 'Finance Partner',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.monthlyPayment': 'Monthly Payment',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.termsInMonths': 'Term (months)',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.interestRate': 'Interest Rate',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.mileage': 'Range per Year',
+    'details.tasks.finalPayment.data.amountDueFinancier': 'Financed Amount',
+    'details.tasks.finalPayment.data.financingDetails.teslaFinanceDetails.approvedLoanAmount': 'Approved Amount',
+    'details.tasks.finalPayment.data.paymentDetails': 'Payment Details',
+    'details.tasks.finalPayment.amountDue': 'Amount Due',
+    'details.tasks.finalPayment.data.amountDueAfterRefund': 'Amount Due After Refund',
+    'details.tasks.finalPayment.status': 'Payment Status',
+    'details.tasks.registration.orderDetails.vehicleId': 'VehicleID',
+    'details.tasks.registration.orderDetails.registrationStatus': 'Registration Status',
+    'details.tasks.finalPayment.data.vehicleregistration': 'Vehicle Registration',
+    'details.tasks.finalPayment.data.vehicleParts': 'Vehicle Parts',
+    'details.tasks.scheduling.apptDateTimeAddressStr': 'Delivery Details'
+}
+
+
+# -------------------------
+# Values
+# -------------------------
+def get_date_from_timestamp(timestamp):
+    """Truncates an ISO-8601 timestamp to its date component.
+
+    Older versions only handled timestamps without timezone information and
+    would return the original value for inputs such as
+    ``"2024-07-25T12:34:56Z"``. Parsing goes through the shared
+    :mod:`app.utils.timestamps` cache and supports fractional seconds and
+    timezone offsets. If parsing fails, the original value is returned
+    unchanged.
+    """
+
+    if not isinstance(timestamp, str):
+        return timestamp
+
+    dt = parse_timestamp_raw(timestamp)
+    if dt is None:
+        return timestamp
+    return dt.date().isoformat()
+
+def normalize_str(key: str) -> str:
+    """
+    Normalizes keys for robust comparisons:
+    - trims spaces
+    - converts to lowercase
+    - collapses multiple spaces
+    """
+
+    if not isinstance(key, str):
+        return ""
+    collapsed = " ".join(key.strip().split())
+    return collapsed.lower()
+
+
+def clean_str(value):
+    return value.strip() if isinstance(value, str) else value
+
+
+def compare_dicts(old_dict, new_dict, path=""):
+    differences = []
+    for key in old_dict:
+        if key not in new_dict:
+            differences.append(
+                {
+                    "operation": "removed",
+                    "key": path + key,
+                    "old_value": clean_str(old_dict[key])
+                }
+            )
+        elif isinstance(old_dict[key], dict) and isinstance(new_dict[key], dict):
+            differences.extend(
+                compare_dicts(old_dict[key], new_dict[key], path + key + ".")
+            )
+        else:
+            old_value = clean_str(old_dict[key])
+            new_value = clean_str(new_dict[key])
+            if old_value != new_value:
+                differences.append(
+                {
+                    "operation": "changed",
+                    "key": path + key,
+                    "old_value": old_value,
+                    "value": new_value,
+                }
+            )
+
+    for key in new_dict:
+        if key not in old_dict:
+            differences.append(
+                {
+                    "operation": "added",
+                    "key": path + key,
+                    "value": clean_str(new_dict[key]),
+                }
+            )
+
+    return differences
+
+
+def format_timestamp_with_time(value: Any) -> Optional[str]:
+    dt = parse_timestamp(value)
+    if not dt:
+        return None
+    return dt.strftime("%Y-%m-%d %H:%M")
+
+
+def get_delivery_appointment_display(tasks: Dict[str, Any]) -> Optional[str]:
+    for source in _iter_delivery_appointment_sources(tasks):
+        for key in ("appointmentDate", "appointmentDateUtc"):
+            formatted = format_timestamp_with_time(source.get(key))
+            if formatted:
+                return formatted
+
+    scheduling = tasks.get('scheduling')
+    if isinstance(scheduling, dict):
+        raw = scheduling.get('deliveryAppointmentDate')
+        if isinstance(raw, str):
+            formatted = format_timestamp_with_time(raw)
+            if formatted:
+                return formatted
+            condensed = " ".join(raw.split())
+            return condensed or None
+
+        appt_text = scheduling.get('apptDateTimeAddressStr')
+        if isinstance(appt_text, str):
+            first_line = appt_text.splitlines()[0].strip()
+            formatted = format_timestamp_with_time(first_line)
+            if formatted:
+                return formatted
+            return first_line or None
+
+    return None
+
+
+def _iter_delivery_appointment_sources(tasks: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    delivery_details = tasks.get('deliveryDetails')
+    if isinstance(delivery_details, dict):
+        reg_data = delivery_details.get('regData')
+        if isinstance(reg_data, dict):
+            appointment = reg_data.get('deliveryAppointment')
+            if isinstance(appointment, dict):
+                yield appointment
+        appointment = delivery_details.get('deliveryAppointment')
+        if isinstance(appointment, dict):
+            yield appointment
+
+    final_payment = tasks.get('finalPayment')
+    if isinstance(final_payment, dict):
+        payment_data = final_payment.get('data')
+        if isinstance(payment_data, dict):
+            appointment = payment_data.get('deliveryAppointment')
+            if isinstance(appointment, dict):
+                yield appointment
+
+    scheduling = tasks.get('scheduling')
+    if isinstance(scheduling, dict):
+        appointment = scheduling.get('deliveryAppointment')
+        if isinstance(appointment, dict):
+            yield appointment
+
+
+# -------------------------
+# Orders
+# -------------------------
+def extract_reference_number(entry: Any) -> Optional[str]:
+    if not isinstance(entry, MutableMapping):
+        return None
+    order_payload = entry.get('order')
+    if isinstance(order_payload, MutableMapping):
+        reference = order_payload.get('referenceNumber')
+    else:
+        reference = entry.get('referenceNumber')
+    return str(reference) if reference else None
+
+
+def ensure_order_map(raw_orders: Any) -> OrderMap:
+    """Normalize orders (list/dict/None) into an OrderedDict keyed by referenceNumber."""
+    order_map: OrderMap = OrderedDict()
+    if not raw_orders:
+        return order_map
+
+    if isinstance(raw_orders, MutableMapping):
+        for key, entry in raw_orders.items():
+            reference = extract_reference_number(entry) or str(key)
+            order_map[str(reference)] = entry
+        return order_map
+
+    if isinstance(raw_orders, list):
+        for entry in raw_orders:
+            reference = extract_reference_number(entry)
+            if not reference:
+                continue
+            order_map[reference] = entry
+    return order_map
+
+
+def tag_changes(reference: str, changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    tagged: List[Dict[str, Any]] = []
+    for change in changes:
+        if not isinstance(change, dict):
+            continue
+        change.setdefault('key', '')
+        change['order_reference'] = reference
+        tagged.append(change)
+    return tagged
+
+
+def compare_orders(old_orders: Any, new_orders: Any) -> List[Dict[str, Any]]:
+    """Return the changes between two order snapshots, tagged with ``order_reference``."""
+    old_map = ensure_order_map(old_orders)
+    new_map = ensure_order_map(new_orders)
+    differences = []
+    for reference, old_order in old_map.items():
+        if reference in new_map:
+            changes = compare_dicts(old_order, new_map[reference], path="")
+            differences.extend(tag_changes(reference, changes))
+        else:
+            differences.append({'operation': 'removed', 'order_reference': reference, 'key': ''})
+
+    for reference in new_map:
+        if reference not in old_map:
+            differences.append({'operation': 'added', 'order_reference': reference, 'key': ''})
+    return differences
+
+
+def group_changes_by_reference(changes: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for change in changes:
+        reference = change.get('order_reference')
+        if not reference:
+            continue
+        reference_str = str(reference)
+        clean_change = {k: v for k, v in change.items() if k != 'order_reference'}
+        grouped.setdefault(reference_str, []).append(clean_change)
+    return grouped
+
+
+def has_relevant_changes(changes: List[Dict[str, Any]]) -> bool:
+    """Return True unless all *changes* are in ignored keys (the ``--status`` exit code)."""
+    for change in changes:
+        key = change.get('key')
+        if not isinstance(key, str):
+            return True
+        if not any(key.startswith(prefix) for prefix in HISTORY_TRANSLATIONS_IGNORED):
+            return True
+    return False
+
+
+# -------------------------
+# Snapshot projection
+# -------------------------
+# UI copy and other ignored subtrees are replaced by {"_digest": ...} before
+# orders are diffed or saved. The digest still changes with the content, and
+# the resulting change key ("...strings._digest") stays below the ignored
+# prefix, so it is neither shown nor relevant for --status.
+SNAPSHOT_DIGEST_KEY = "_digest"
+SNAPSHOT_PROJECTION_PATHS = tuple(sorted(
+    prefix for prefix in HISTORY_TRANSLATIONS_IGNORED if prefix.endswith(".")
+))
+
+
+def _subtree_digest(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()[:16]
+
+
+@lru_cache(maxsize=8)
+def _projection_trie(paths: Tuple[str, ...]) -> Dict[str, Any]:
+    trie: Dict[str, Any] = {}
+    for path in paths:
+        node = trie
+        segments = path.rstrip(".").split(".")
+        for segment in segments[:-1]:
+            child = node.setdefault(segment, {})
+            if child is True:
+                break
+            node = child
+        else:
+            node[segments[-1]] = True
+    return trie
+
+
+def _project(node: Dict[str, Any], trie: Dict[str, Any], drop: bool) -> Dict[str, Any]:
+    projected = {}
+    for key, value in node.items():
+        rule = trie.get(key)
+        if rule is None or not isinstance(value, dict):
+            projected[key] = value
+        elif rule is not True:
+            projected[key] = _project(value, rule, drop)
+        elif drop:
+            continue
+        elif len(value) == 1 and SNAPSHOT_DIGEST_KEY in value:
+            projected[key] = value  # already projected
+        else:
+            projected[key] = {SNAPSHOT_DIGEST_KEY: _subtree_digest(value)}
+    return projected
+
+
+def project_order(detailed_order: Any, mode: str = "hash", extra_paths: Sequence[str] = ()) -> Any:
+    """Return *detailed_order* with the projection subtrees hashed or dropped.
+
+    Untouched parts are shared with the input, and projecting twice gives
+    the same result.
+    """
+    if mode == "off" or not isinstance(detailed_order, dict):
+        return detailed_order
+    trie = _projection_trie(tuple(sorted({*SNAPSHOT_PROJECTION_PATHS, *extra_paths})))
+    return _project(detailed_order, trie, mode == "drop")
+
+
+def project_orders(orders: Any, mode: str = "hash", extra_paths: Sequence[str] = ()) -> OrderMap:
+    """Apply :func:`project_order` to every order of *orders*."""
+    return OrderedDict(
+        (reference, project_order(order, mode, extra_paths))
+        for reference, order in ensure_order_map(orders).items()
+    )
+
+
+# -------------------------
+# History
+# -------------------------
+def filter_history_changes(
+    entries: List[Dict[str, Any]],
+    *,
+    all_keys: bool = False,
+    details: bool = False,
+    anonymize: bool = False,
+) -> List[Dict[str, Any]]:
+    """Flatten raw history *entries* into change records with readable keys.
+
+    *all_keys* keeps every raw key, *details* adds the keys of
+    ``HISTORY_TRANSLATIONS_DETAILS`` and *anonymize* blanks the values of
+    ``HISTORY_TRANSLATIONS_ANONYMOUS`` keys.
+    """
+    changes: List[Dict[str, Any]] = []
+    for entry in entries:
+        timestamp = entry.get('timestamp')
+        epoch = None
+        entry_changes = entry.get('changes', [])
+        if not isinstance(entry_changes, list):
+            continue
+        for change in entry_changes:
+            if not isinstance(change, dict):
+                continue
+
+            key = change.get('key')
+            key_str = key if isinstance(key, str) else ""
+            display_key = key_str
+
+            if not all_keys:
+                if any(key_str.startswith(pref) for pref in HISTORY_TRANSLATIONS_IGNORED):
+                    continue
+
+                if not details:
+                    if key_str not in HISTORY_TRANSLATIONS and key_str not in HISTORY_TRANSLATIONS_ANONYMOUS:
+                        continue
+
+                if key_str in HISTORY_TRANSLATIONS_DETAILS:
+                    display_key = HISTORY_TRANSLATIONS_DETAILS[key_str]
+                else:
+                    continue
+
+                if anonymize and key_str in HISTORY_TRANSLATIONS_ANONYMOUS:
+                    change = dict(change)
+                    for field in ['value', 'old_value']:
+                        if isinstance(change.get(field), str):
+                            change[field] = None
+
+            if epoch is None:
+                epoch = timestamp_epoch(timestamp)
+            sanitized_change = {
+                'operation': change.get('operation'),
+                'key': display_key,
+                'value': change.get('value'),
+                'old_value': change.get('old_value'),
+                'timestamp': timestamp,
+                'epoch': epoch,
+            }
+
+            for field in ['value', 'old_value']:
+                if isinstance(sanitized_change.get(field), str):
+                    sanitized_change[field] = get_date_from_timestamp(sanitized_change[field])
+
+            changes.append(sanitized_change)
+    return changes
+
+
+# -------------------------
+# Timeline
+# -------------------------
+TIMELINE_WHITELIST = {
+    'Reservation',
+    'Order Booked',
+    'Delivery Window',
+    'Expected Registration Date',
+    'ETA to Delivery Center',
+    'Delivery Appointment Date',
+    'VIN',
+    'Order Status',
+    'CAR BUILT',
+    'Vehicle Odometer'
+}
+TIMELINE_WHITELIST_NORMALIZED = {normalize_str(key) for key in TIMELINE_WHITELIST}
+_ODOMETER_KEY = normalize_str("Vehicle Odometer")
+_DELIVERY_WINDOW_KEY = normalize_str("Delivery Window")
+_ANONYMOUS_KEYS = set(HISTORY_TRANSLATIONS_ANONYMOUS.values())
+
+
+def _entry_epoch(entry: Dict[str, Any]) -> float:
+    """Return the pre-parsed epoch of *entry*, parsing its timestamp only if missing."""
+    if "epoch" in entry:
+        epoch = entry["epoch"]
+    else:
+        epoch = timestamp_epoch(entry.get("timestamp"))
+    return epoch if epoch is not None else math.inf
+
+
+def sort_timeline_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    enumerated = list(enumerate(entries))
+    enumerated.sort(key=lambda item: (_entry_epoch(item[1]), item[0]))
+    return [entry for _, entry in enumerated]
+
+
+def timeline_entry(timestamp: Any, key: str, value: Any = "") -> Dict[str, Any]:
+    return {
+        "timestamp": timestamp,
+        "key": key,
+        "value": value,
+        "epoch": timestamp_epoch(timestamp),
+    }
+
+
+def new_timeline_record() -> Dict[str, Any]:
+    return {
+        "folded": 0,
+        "digest": None,
+        "history_signature": None,
+        "state": {"new_car": False, "first_delivery_window": True},
+        "keys": {},
+        "entries": [],
+    }
+
+
+def _append_timeline_entry(record: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    if "epoch" not in entry:
+        entry["epoch"] = timestamp_epoch(entry.get("timestamp"))
+    record["entries"].append(entry)
+    record["keys"][normalize_str(entry.get("key"))] = True
+
+
+def fold_history_changes(record: Dict[str, Any], changes: List[Dict[str, Any]]) -> None:
+    """Append the timeline entries derived from filtered history *changes* to *record*."""
+    state = record["state"]
+    for change in changes:
+        key = change["key"]
+        key_normalized = normalize_str(key)
+        value = change.get("value")
+        old_value = change.get("old_value")
+
+        if key_normalized == _ODOMETER_KEY:
+            if state["new_car"] or value in [None, "", "N/A"]:
+                continue
+            _append_timeline_entry(record, {
+                "timestamp": change["timestamp"],
+                "key": "CAR BUILT",
+                "value": "",
+                "epoch": change.get("epoch"),
+            })
+            state["new_car"] = True
+            continue
+
+        if key_normalized == _DELIVERY_WINDOW_KEY and state["first_delivery_window"]:
+            if old_value not in ['None', 'N/A', '']:
+                # timestamp is the reservation date of the live order, filled in on render
+                _append_timeline_entry(record, {
+                    "timestamp": None,
+                    "startdate": True,
+                    "key": "Delivery Window",
+                    "value": old_value,
+                    "epoch": None,
+                })
+                state["first_delivery_window"] = False
+
+        if key_normalized not in TIMELINE_WHITELIST_NORMALIZED:
+            continue
+
+        entry = dict(change)
+        if old_value != "" and value == "":
+            entry["removed"] = True
+        _append_timeline_entry(record, entry)
+
+
+def materialize_timeline_record(record: Dict[str, Any], startdate: Any, anonymize: bool = False) -> List[Dict[str, Any]]:
+    """Return copies of the entries of *record*; emptied values are flagged ``removed``."""
+    startdate_epoch = timestamp_epoch(startdate)
+    timeline: List[Dict[str, Any]] = []
+    for cached in record["entries"]:
+        entry = {k: v for k, v in cached.items() if k not in ("startdate", "removed")}
+        if cached.get("startdate"):
+            entry["timestamp"] = startdate
+            entry["epoch"] = startdate_epoch
+        if anonymize and entry.get("key") in _ANONYMOUS_KEYS:
+            for field in ("value", "old_value"):
+                if isinstance(entry.get(field), str):
+                    entry[field] = None
+        elif cached.get("removed"):
+            entry["removed"] = True
+        timeline.append(entry)
+    return timeline
+
+
+def get_order_startdate(detailed_order: Dict[str, Any]) -> Any:
+    order_info = detailed_order.get("details", {}).get("tasks", {}).get("registration", {}).get("orderDetails", {})
+    return get_date_from_timestamp(order_info.get("reservationDate"))
+
+
+def order_timeline_entries(detailed_order: Dict[str, Any], history_keys: Container[str]) -> List[Dict[str, Any]]:
+    """Return the timeline entries taken from the order itself.
+
+    Dates that also appear in the history (*history_keys*, normalized) are
+    left to the history entries.
+    """
+    timeline: List[Dict[str, Any]] = []
+
+    order_details = detailed_order.get("details", {})
+    tasks = order_details.get("tasks", {})
+    scheduling = tasks.get('scheduling', {})
+    registration_data = tasks.get("registration", {})
+    order_info = registration_data.get("orderDetails", {})
+    final_payment_data = tasks.get("finalPayment", {}).get("data", {})
+
+    if order_info.get("reservationDate"):
+        timeline.append(timeline_entry(get_date_from_timestamp(order_info.get("reservationDate")), "Reservation"))
+
+    if order_info.get("orderBookedDate"):
+        timeline.append(timeline_entry(get_date_from_timestamp(order_info.get("orderBookedDate")), "Order Booked"))
+
+    if scheduling.get('deliveryWindowDisplay'):
+        if normalize_str('Delivery Window') not in history_keys:
+            timeline.append(timeline_entry(
+                get_date_from_timestamp(order_info.get("orderBookedDate")),
+                "Delivery Window",
+                scheduling.get('deliveryWindowDisplay'),
+            ))
+
+    if registration_data.get('expectedRegDate'):
+        if normalize_str('Expected Registration Date') not in history_keys:
+            timeline.append(timeline_entry(
+                get_date_from_timestamp(registration_data.get("expectedRegDate")),
+                "Expected Registration Date",
+            ))
+
+    if final_payment_data.get('etaToDeliveryCenter'):
+        if normalize_str('ETA To Delivery Center') not in history_keys:
+            timeline.append(timeline_entry(
+                get_date_from_timestamp(final_payment_data.get("etaToDeliveryCenter")),
+                "ETA To Delivery Center",
+            ))
+
+    appointment_display = get_delivery_appointment_display(tasks)
+    if appointment_display:
+        if normalize_str('Delivery Appointment Date') not in history_keys:
+            timeline.append(timeline_entry(appointment_display, "Delivery Appointment Date"))
+    return timeline
+
+
+def build_timeline(
+    detailed_order: Dict[str, Any],
+    history_entries: List[Dict[str, Any]],
+    anonymize: bool = False,
+) -> List[Dict[str, Any]]:
+    """Return the sorted timeline of one order from its raw *history_entries*."""
+    record = new_timeline_record()
+    fold_history_changes(record, filter_history_changes(history_entries))
+    timeline = order_timeline_entries(detailed_order, record["keys"])
+    # order-derived entries precede history entries on equal timestamps
+    timeline.extend(materialize_timeline_record(record, get_order_startdate(detailed_order), anonymize))
+    return sort_timeline_entries(timeline)
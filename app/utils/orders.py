@@ -1,12 +1,10 @@
 import io
-import json
-import os
 import re
 import sys
 import uuid
 from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Tuple, OrderedDict as TypingOrderedDict
+from typing import Any, Dict, Iterator, List, MutableMapping, Optional, Tuple
 try:
     import pyperclip
     HAS_PYPERCLIP = True
@@ -14,27 +12,29 @@ except ImportError:
     HAS_PYPERCLIP = False
 
 from app.config import (
-    ORDERS_FILE,
-    TESLA_STORES,
+    ORDERS_DIR,
     TODAY,
     TESLA_APP_VERSION,
     TESLA_USER_AGENT,
     TESLA_X_USER_AGENT,
+    get_base_url,
+    get_snapshot_projection,
 )
 from app.utils.colors import color_text, strip_color
 from app.utils.connection import request_with_retry
 from app.utils.helpers import (
     decode_option_codes,
     get_date_from_timestamp,
-    compare_dicts,
     exit_with_status,
     get_delivery_appointment_display,
-    locale_format_datetime
+    locale_format_datetime,
+    report_status,
 )
 from app.utils.history import (
+    HISTORY_TRANSLATIONS_DETAILS,
     HISTORY_TRANSLATIONS_IGNORED,
-    load_history_from_file,
-    save_history_to_file,
+    append_history,
+    load_history_of_order,
     print_history
 )
 from app.utils.locale import (
@@ -45,47 +45,35 @@ from app.utils.locale import (
     COUNTRY,
 )
 import app.utils.history as history_module
-from app.utils.params import DETAILS_MODE, SHARE_MODE, STATUS_MODE, CACHED_MODE, ORDER_FILTER
+from app.utils.orderdata import (
+    DetailedOrder,
+    OrderMap,
+    compare_orders as _compare_orders,
+    ensure_order_map as _ensure_order_map,
+    group_changes_by_reference as _group_changes_by_reference,
+    has_relevant_changes as _has_status_relevant_changes,
+    project_orders,
+)
+from app.utils.json_output import emit_record
+from app.utils.locations import find_store_id_by_name, get_location_index, store_distance_km
+from app.utils.params import (
+    DETAILS_MODE,
+    SHARE_MODE,
+    STATUS_MODE,
+    CACHED_MODE,
+    ORDER_FILTER,
+    JSON_OUTPUT,
+    QUIET_MODE,
+    REPLAY_FILE,
+)
 from app.utils.telemetry import track_usage
-from app.utils.timeline import print_timeline
+from app.utils.timeline import get_timeline_from_order, print_timeline
 from app.utils.option_codes import get_option_entry
+from app.utils.response_cache import account_scope, get_json, served_age
+from app.utils.shards import load_snapshots, save_snapshots
+from app.utils.stores import get_store
 
-DetailedOrder = Dict[str, Any]
-OrderMap = TypingOrderedDict[str, DetailedOrder]
-
-
-def _tag_changes(reference: str, changes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    tagged: List[Dict[str, Any]] = []
-    for change in changes:
-        if not isinstance(change, dict):
-            continue
-        change.setdefault('key', '')
-        change['order_reference'] = reference
-        tagged.append(change)
-    return tagged
-
-
-def _group_changes_by_reference(changes: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-    grouped: Dict[str, List[Dict[str, Any]]] = {}
-    for change in changes:
-        reference = change.get('order_reference')
-        if not reference:
-            continue
-        reference_str = str(reference)
-        clean_change = {k: v for k, v in change.items() if k != 'order_reference'}
-        grouped.setdefault(reference_str, []).append(clean_change)
-    return grouped
-
-
-def _has_status_relevant_changes(changes: List[Dict[str, Any]]) -> bool:
-    """Return True when a change should flip the --status exit code."""
-    for change in changes:
-        key = change.get('key')
-        if not isinstance(key, str):
-            return True
-        if not any(key.startswith(prefix) for prefix in HISTORY_TRANSLATIONS_IGNORED):
-            return True
-    return False
+NEARBY_LOCATIONS_LIMIT = 3
 
 
 def _filter_orders_for_display(orders: Any) -> OrderMap:
@@ -103,6 +91,13 @@ def _filter_orders_for_display(orders: Any) -> OrderMap:
 def _notify_missing_reference() -> None:
     if STATUS_MODE or not ORDER_FILTER:
         return
+    if JSON_OUTPUT:
+        emit_record({
+            "type": "error",
+            "reference": ORDER_FILTER,
+            "message": f"No order with reference '{ORDER_FILTER}' found.",
+        })
+        return
     print(color_text(
         t("Error: No order with reference '{reference}' found.").format(reference=ORDER_FILTER),
         '91'
@@ -118,6 +113,9 @@ def _display_selected_orders(orders: Any) -> None:
         return
     if not selected_orders:
         return
+    if JSON_OUTPUT:
+        emit_orders_json(selected_orders)
+        return
     if SHARE_MODE:
         display_orders_SHARE_MODE(selected_orders)
     else:
@@ -125,27 +123,6 @@ def _display_selected_orders(orders: Any) -> None:
     print_bottom_line()
 
 
-def _ensure_order_map(raw_orders: Any) -> OrderMap:
-    """Normalize orders (list/dict/None) into an OrderedDict keyed by referenceNumber."""
-    order_map: OrderMap = OrderedDict()
-    if not raw_orders:
-        return order_map
-
-    if isinstance(raw_orders, MutableMapping):
-        for key, entry in raw_orders.items():
-            reference = _extract_reference_number(entry) or str(key)
-            order_map[str(reference)] = entry
-        return order_map
-
-    if isinstance(raw_orders, list):
-        for entry in raw_orders:
-            reference = _extract_reference_number(entry)
-            if not reference:
-                continue
-            order_map[reference] = entry
-    return order_map
-
-
 def _orders_map_to_list(orders: Any) -> List[DetailedOrder]:
     """Convert an order collection back to a list (for legacy persistence/telemetry)."""
     if isinstance(orders, list):
@@ -155,17 +132,6 @@ def _orders_map_to_list(orders: Any) -> List[DetailedOrder]:
     return []
 
 
-def _extract_reference_number(entry: Any) -> Optional[str]:
-    if not isinstance(entry, MutableMapping):
-        return None
-    order_payload = entry.get('order')
-    if isinstance(order_payload, MutableMapping):
-        reference = order_payload.get('referenceNumber')
-    else:
-        reference = entry.get('referenceNumber')
-    return str(reference) if reference else None
-
-
 def _order_sort_key(item: Tuple[str, DetailedOrder]) -> Tuple[str, str]:
     """Return a tuple for ordering items newest-first based on booking date."""
     reference, detailed_order = item
@@ -209,7 +175,7 @@ def _get_all_orders(access_token):
         }
         new_orders[order_id] = detailed_order
 
-    return new_orders
+    return project_orders(new_orders, *get_snapshot_projection())
 
 def _retrieve_orders(access_token):
     headers = {
@@ -218,9 +184,14 @@ def _retrieve_orders(access_token):
         'X-Tesla-User-Agent': TESLA_X_USER_AGENT,
         'X-Request-Id': str(uuid.uuid4()),
     }
-    api_url = 'https://owner-api.teslamotors.com/api/1/users/orders'
-    response = request_with_retry(api_url, headers)
-    orders = response.json()['response']
+    api_url = f"{get_base_url('owner_api')}/api/1/users/orders"
+    payload = get_json(
+        'orders',
+        api_url,
+        lambda exit_on_error: request_with_retry(api_url, headers, exit_on_error=exit_on_error),
+        account_scope(access_token),
+    )
+    orders = payload['response']
     _store_tesla_locale_from_orders(orders)
     return orders
 
@@ -233,14 +204,18 @@ def _retrieve_order_details(order_id, access_token):
         'X-Request-Id': str(uuid.uuid4()),
     }
     api_url = (
-        'https://akamai-apigateway-vfx.tesla.com/tasks'
+        f"{get_base_url('tasks_api')}/tasks"
         f'?deviceLanguage={LANGUAGE}'
         f'&deviceCountry={COUNTRY}'
         f'&referenceNumber={order_id}'
         f'&appVersion={TESLA_APP_VERSION}'
     )
-    response = request_with_retry(api_url, headers)
-    return response.json()
+    return get_json(
+        'tasks',
+        api_url,
+        lambda exit_on_error: request_with_retry(api_url, headers, exit_on_error=exit_on_error),
+        account_scope(access_token),
+    )
 
 
 def _store_tesla_locale_from_orders(orders: List[Dict[str, Any]]) -> None:
@@ -252,41 +227,20 @@ def _store_tesla_locale_from_orders(orders: List[Dict[str, Any]]) -> None:
 
 
 def _save_orders_to_file(orders):
-    serializable_orders = _ensure_order_map(orders)
-    with open(ORDERS_FILE, 'w') as f:
-        json.dump(serializable_orders, f)
-    if not STATUS_MODE:
-        print(color_text(t("> Orders saved to '{file}'").format(file=ORDERS_FILE), '94'))
-
-def _load_orders_from_file():
-    if os.path.exists(ORDERS_FILE):
-        with open(ORDERS_FILE, 'r') as f:
-            orders = _ensure_order_map(json.load(f))
-        _store_tesla_locale_from_orders(list(orders.values()))
-        return orders
-    return OrderedDict()
-
-
-def _compare_orders(old_orders, new_orders):
-    old_map = _ensure_order_map(old_orders)
-    new_map = _ensure_order_map(new_orders)
-    differences = []
-    for reference, old_order in old_map.items():
-        if reference in new_map:
-            changes = compare_dicts(old_order, new_map[reference], path="")
-            differences.extend(_tag_changes(reference, changes))
-        else:
-            differences.append({'operation': 'removed', 'order_reference': reference, 'key': ''})
-
-    for reference in new_map:
-        if reference not in old_map:
-            differences.append({'operation': 'added', 'order_reference': reference, 'key': ''})
-    return differences
+    save_snapshots(_ensure_order_map(orders))
+    if not QUIET_MODE:
+        print(color_text(t("> Orders saved to '{file}'").format(file=ORDERS_DIR), '94'))
+
+def _load_orders_from_file(references=None):
+    """Load the stored orders; with *references* only the files of these orders are read."""
+    # projected again in case the projection settings changed since the last save
+    orders = project_orders(load_snapshots(references), *get_snapshot_projection())
+    _store_tesla_locale_from_orders(list(orders.values()))
+    return orders
 
 
 def get_order(order_id):
-    orders = _load_orders_from_file()
-    return _ensure_order_map(orders).get(order_id, {})
+    return _load_orders_from_file([order_id]).get(order_id, {})
 
 def get_model_from_order(detailed_order) -> str:
     order = detailed_order.get('order', {})
@@ -444,7 +398,7 @@ def display_orders(detailed_orders):
 
         print(f"\n{color_text(t('Delivery Information') + ':', '94')}")
         location_id = order_info.get('vehicleRoutingLocation')
-        store = TESLA_STORES.get(str(location_id) if location_id is not None else '', {})
+        store = get_store(location_id)
         if store:
             print(f"{color_text('- ' + t('Routing Location') + ':', '94')} {store['display_name']} ({location_id or t('unknown')})")
             if DETAILS_MODE:
@@ -460,6 +414,7 @@ def display_orders(detailed_orders):
                 print(f"    {color_text(t('More Information in --details mode'), '94')}")
         else:
             print(f"{color_text('- ' + t('Delivery Center') + ':', '94')} {scheduling.get('deliveryAddressTitle', 'N/A')}")
+        _print_location_context(location_id, scheduling.get('deliveryAddressTitle'))
 
         eta_value = final_payment_data.get('etaToDeliveryCenter')
         if eta_value:
@@ -530,6 +485,114 @@ def display_orders(detailed_orders):
         print_history(order_reference)
 
 
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 1) if value is not None else None
+
+
+def _delivery_distance_km(location_id: Any, delivery_center: Any) -> Optional[float]:
+    """Distance between routing location and delivery center, if both are known stores."""
+    delivery_id = find_store_id_by_name(delivery_center)
+    if location_id is None or delivery_id is None or str(location_id) == delivery_id:
+        return None
+    return store_distance_km(location_id, delivery_id)
+
+
+def _print_location_context(location_id: Any, delivery_center: Any) -> None:
+    distance = _delivery_distance_km(location_id, delivery_center)
+    if distance is not None:
+        print(f"{color_text('- ' + t('Distance to Delivery Center') + ':', '94')} {distance:.0f} km")
+    if not DETAILS_MODE:
+        return
+    # alternatives around the delivery center, or the routing location if the center is unknown
+    origin_id = find_store_id_by_name(delivery_center) or (str(location_id) if location_id is not None else None)
+    index = get_location_index()
+    coordinates = index.coordinates(origin_id) if origin_id else None
+    if coordinates is None:
+        return
+    exclude = tuple(str(x) for x in (origin_id, location_id) if x is not None)
+    nearby = index.nearest(coordinates[0], coordinates[1], NEARBY_LOCATIONS_LIMIT, exclude=exclude)
+    if not nearby:
+        return
+    print(f"    {color_text(t('Nearby Tesla Locations') + ':', '94')}")
+    for store_id, km in nearby:
+        print(f"    - {get_store(store_id).get('display_name', store_id)} ({km:.0f} km)")
+
+
+def _order_record(reference: str, detailed_order: DetailedOrder) -> Dict[str, Any]:
+    order = detailed_order.get('order', {})
+    tasks = detailed_order.get('details', {}).get('tasks', {})
+    scheduling = tasks.get('scheduling', {})
+    registration_data = tasks.get('registration', {})
+    order_info = registration_data.get('orderDetails', {})
+    final_payment_data = tasks.get('finalPayment', {}).get('data', {})
+    raw_options = order.get('mktOptions')
+    location_id = order_info.get('vehicleRoutingLocation')
+    routing_location = None
+    if location_id is not None:
+        store = get_store(location_id)
+        routing_location = {'id': location_id, 'name': store.get('display_name')}
+
+    return {
+        'type': 'order',
+        'reference': reference,
+        'status': order.get('orderStatus'),
+        'model_code': order.get('modelCode'),
+        'vin': order.get('vin'),
+        'option_codes': [
+            code.strip().upper() for code in raw_options.split(',') if code.strip()
+        ] if isinstance(raw_options, str) else [],
+        'reservation_date': order_info.get('reservationDate'),
+        'order_booked_date': order_info.get('orderBookedDate'),
+        'routing_location': routing_location,
+        'delivery_center': scheduling.get('deliveryAddressTitle'),
+        'distance_to_delivery_center_km': _rounded(_delivery_distance_km(location_id, scheduling.get('deliveryAddressTitle'))),
+        'delivery_window': scheduling.get('deliveryWindowDisplay'),
+        'eta_to_delivery_center': final_payment_data.get('etaToDeliveryCenter'),
+        'delivery_appointment': get_delivery_appointment_display(tasks),
+        'expected_registration_date': registration_data.get('expectedRegDate'),
+        'odometer': order_info.get('vehicleOdometer'),
+        'odometer_type': order_info.get('vehicleOdometerType'),
+    }
+
+
+def _iter_change_records(reference: str, entries: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for entry in entries:
+        timestamp = entry.get('timestamp')
+        entry_changes = entry.get('changes', [])
+        if not isinstance(entry_changes, list):
+            continue
+        for change in entry_changes:
+            if not isinstance(change, dict):
+                continue
+            key = change.get('key') if isinstance(change.get('key'), str) else ''
+            if any(key.startswith(prefix) for prefix in HISTORY_TRANSLATIONS_IGNORED):
+                continue
+            yield {
+                'type': 'change',
+                'reference': reference,
+                'timestamp': timestamp,
+                'operation': change.get('operation'),
+                'key': key,
+                'label': HISTORY_TRANSLATIONS_DETAILS.get(key),
+                'value': change.get('value'),
+                'old_value': change.get('old_value'),
+            }
+
+
+def emit_orders_json(detailed_orders) -> None:
+    """Stream order, timeline and change records for --json/--jsonl.
+
+    Records are built straight from the order payloads and the raw history;
+    no colors, translations or clipboard rendering are involved.
+    """
+    for _, order_reference, detailed_order in enumerate_orders(detailed_orders):
+        emit_record(_order_record(order_reference, detailed_order))
+        for entry in get_timeline_from_order(order_reference, detailed_order, translate=False):
+            emit_record({'type': 'timeline', 'reference': order_reference, **entry})
+        for record in _iter_change_records(order_reference, load_history_of_order(order_reference)):
+            emit_record(record)
+
+
 def print_bottom_line() -> None:
     print(f"\n{color_text(t('BOTTOM LINE HELP'), '94')}")
     # Inform user about clipboard status
@@ -544,76 +607,69 @@ def print_bottom_line() -> None:
 # Main-Logic
 # ---------------------------
 def main(access_token) -> None:
-    old_orders = _load_orders_from_file()
+    # cached runs for one order only need that order's files
+    old_orders = _load_orders_from_file([ORDER_FILTER] if CACHED_MODE and ORDER_FILTER else None)
     track_usage(_orders_map_to_list(old_orders))
 
     if CACHED_MODE:
-        if not STATUS_MODE:
+        if not QUIET_MODE:
             print(color_text(t("Running in CACHED MODE... no API calls are made"), '93'))
 
         if old_orders:
-            if STATUS_MODE:
-                print("0")
-            else:
-                _display_selected_orders(old_orders)
+            report_status(0)
+            _display_selected_orders(old_orders)
         else:
-            if STATUS_MODE:
-                print("-1")
+            if QUIET_MODE:
+                report_status(-1)
             else:
-                print(color_text(t("No cached orders found in '{file}'").format(file=ORDERS_FILE), '91'))
+                print(color_text(t("No cached orders found in '{file}'").format(file=ORDERS_DIR), '91'))
         sys.exit(0)
 
-    if not STATUS_MODE:
+    if not QUIET_MODE:
         print(color_text(f"\n> {t('Start retrieving the information. Please be patient...')}\n", '94'))
 
 
     new_orders = _get_all_orders(access_token)
-
+    cache_age = served_age()
+    if cache_age is not None and not QUIET_MODE:
+        print(color_text(t("Using cached Tesla data ({age} s old)").format(age=round(cache_age)), '93'))
 
     if not new_orders:
         if old_orders:
-            if STATUS_MODE:
-                print("0")
-            else:
+            report_status(0)
+            if not QUIET_MODE:
                 print(color_text(t("Tesla returned no active orders. Keeping previously cached data."), '93'))
-                _display_selected_orders(old_orders)
+            _display_selected_orders(old_orders)
             return
-        if STATUS_MODE:
-            print("-1")
+        if QUIET_MODE:
+            report_status(-1)
         else:
             print(color_text(t("Tesla returned no active orders. Nothing to display yet."), '93'))
         return
 
 
+    # replayed (pseudonymized) orders must never end up in the local files
+    persist = REPLAY_FILE is None
     if old_orders:
         differences = _compare_orders(old_orders, new_orders)
         status_relevant_changes = _has_status_relevant_changes(differences)
         if differences:
-            if STATUS_MODE:
-                print("1" if status_relevant_changes else "0")
+            report_status(1 if status_relevant_changes else 0)
+        if differences and persist:
             _save_orders_to_file(new_orders)
-            history = load_history_from_file()
-            grouped_changes = _group_changes_by_reference(differences)
-            if grouped_changes:
-                for reference, ref_changes in grouped_changes.items():
-                    if not ref_changes:
-                        continue
-                    history.setdefault(reference, []).append({
-                        'timestamp': TODAY,
-                        'changes': ref_changes
-                    })
-                save_history_to_file(history)
-        else:
-            if STATUS_MODE:
-                print("0")
-            os.utime(ORDERS_FILE, None)
+            append_history({
+                reference: {'timestamp': TODAY, 'changes': ref_changes}
+                for reference, ref_changes in _group_changes_by_reference(differences).items()
+                if ref_changes
+            })
+        elif not differences:
+            report_status(0)
     else:
-        if STATUS_MODE:
-            print("-1")
+        if QUIET_MODE or not persist:
+            report_status(-1)
         else:
             # ask user if they want to save the new orders to a file for comparison next time
             if input(color_text(t("Would you like to save the order information in a file for change tracking? (y/n): "), '93')).lower() == 'y':
                 _save_orders_to_file(new_orders)
 
-    if not STATUS_MODE:
-        _display_selected_orders(new_orders)
+    _display_selected_orders(new_orders)
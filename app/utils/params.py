@@ -1,8 +1,6 @@
 import argparse
-import os
-import time
+from pathlib import Path
 
-from app.config import ORDERS_FILE
 from app.utils.locale import t
 
 parser = argparse.ArgumentParser(description="Retrieve Tesla order status.")
@@ -11,19 +9,47 @@ group.add_argument("--status", action="store_true", help=t("HELP PARAM STATUS"))
 group.add_argument("--share", action="store_true", help=t("HELP PARAM SHARE"))
 group.add_argument("--details", action="store_true", help=t("HELP PARAM DETAILS"))
 group.add_argument("--all", action="store_true", help=t("HELP PARAM ALL"))
+group.add_argument("--json", action="store_true", help=t("HELP PARAM JSON"))
+group.add_argument("--jsonl", action="store_true", help=t("HELP PARAM JSONL"))
 parser.add_argument("--cached", action="store_true", help=t("HELP PARAM CACHED"))
+parser.add_argument("--max-age", metavar="SECONDS", type=float, help=t("HELP PARAM MAX AGE"))
+parser.add_argument("--no-cache", action="store_true", help=t("HELP PARAM NO CACHE"))
 parser.add_argument("--order", metavar="REFERENCE", help=t("HELP PARAM ORDER"))
+parser.add_argument("--nearest", metavar="LOCATION", help=t("HELP PARAM NEAREST"))
+parser.add_argument("--radius", metavar="KM", type=float, help=t("HELP PARAM RADIUS"))
+parser.add_argument("--limit", metavar="N", type=int, default=5, help=t("HELP PARAM LIMIT"))
+parser.add_argument("--record", metavar="CASSETTE", help=t("HELP PARAM RECORD"))
+parser.add_argument("--replay", metavar="CASSETTE", help=t("HELP PARAM REPLAY"))
+parser.add_argument("--replay-scale", metavar="FACTOR", type=float, default=1.0, help=t("HELP PARAM REPLAY SCALE"))
+parser.add_argument("--history-query", metavar="FILTER", nargs="*", help=t("HELP PARAM HISTORY QUERY"))
+parser.add_argument("--compact-history", action="store_true", help=t("HELP PARAM COMPACT HISTORY"))
 
 _args, _ = parser.parse_known_args()
 
-if not _args.cached and os.path.exists(ORDERS_FILE):
-    last_api_call = os.path.getmtime(ORDERS_FILE)
-    if time.time() - last_api_call < 60:
-        _args.cached = True
+if _args.replay:
+    # a replay is not recorded again
+    _args.record = None
 
 DETAILS_MODE = _args.details
 SHARE_MODE = _args.share
 STATUS_MODE = _args.status
 CACHED_MODE = _args.cached
+# freshness of API responses, see app/utils/response_cache.py
+MAX_AGE = max(0.0, _args.max_age) if _args.max_age is not None else None
+NO_CACHE = _args.no_cache
 ALL_KEYS_MODE = _args.all
+JSON_MODE = _args.json
+JSONL_MODE = _args.jsonl
+JSON_OUTPUT = JSON_MODE or JSONL_MODE
+# machine-readable modes never prompt and keep stdout free of human-readable text
+QUIET_MODE = STATUS_MODE or JSON_OUTPUT
 ORDER_FILTER = _args.order.strip().upper() if isinstance(_args.order, str) and _args.order.strip() else None
+NEAREST_QUERY = _args.nearest.strip() if isinstance(_args.nearest, str) and _args.nearest.strip() else None
+NEAREST_RADIUS = _args.radius
+NEAREST_LIMIT = _args.limit
+RECORD_FILE = Path(_args.record) if _args.record else None
+REPLAY_FILE = Path(_args.replay) if _args.replay else None
+REPLAY_SCALE = max(0.0, _args.replay_scale)
+# None unless --history-query was given; an empty list queries everything
+HISTORY_QUERY = _args.history_query
+COMPACT_HISTORY = _args.compact_history
@@ -0,0 +1,33 @@
+"""Random tokens and keyed pseudonyms; only needs the settings, so it is free of side effects on import."""
+
+import base64
+import hashlib
+import hmac
+import os
+from typing import Optional
+
+from app.config import cfg as Config
+
+
+def _b32(data: bytes, length: Optional[int] = None) -> str:
+    s = base64.b32encode(data).decode("ascii").rstrip("=")
+    return s if length is None else s[:length]
+
+def _b32decode_nopad(s: str) -> bytes:
+    pad = "=" * ((8 - (len(s) % 8)) % 8)
+    return base64.b32decode(s + pad)
+
+def generate_token(bytes_len: int, token_length: Optional[int] = None) -> str:
+    if token_length is not None:
+        min_bytes = (token_length * 5 + 7) // 8  # ceil division
+        bytes_len = max(bytes_len, min_bytes)
+    return _b32(os.urandom(bytes_len), token_length)
+
+def pseudonymize_data(data: str, length: int) -> str:
+    secret_b32 = Config.get("secret")
+    if not secret_b32:
+        secret_b32 = generate_token(32)
+        Config.set("secret", secret_b32)
+    secret = _b32decode_nopad(secret_b32)
+    digest = hmac.new(secret, data.encode("utf-8"), hashlib.sha256).digest()
+    return _b32(digest, length)
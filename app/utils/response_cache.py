@@ -0,0 +1,215 @@
+"""Shared cache for the responses of the Tesla order endpoints.
+
+A response younger than ``max_age`` seconds is served from
+``data/private/response_cache`` without any request. For another
+``stale_while_revalidate`` seconds it is still served, while a background
+thread fetches a fresh one for the next caller. Entries are scoped to the
+account (the ``sub`` claim of the access token), so a login with another
+account never sees the orders of the previous one. A lock file per entry makes
+concurrent processes wait for a single upstream request instead of all
+sending their own (single flight). ``--max-age`` overrides the freshness of
+this run, ``--no-cache`` always asks the API (the answer is still stored).
+"""
+
+import atexit
+import base64
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+from app.config import RESPONSE_CACHE_DIR, RESPONSE_CACHE_POLICY, cfg as Config
+from app.utils.filelock import FileLock
+from app.utils.params import MAX_AGE, NO_CACHE, RECORD_FILE, REPLAY_FILE
+
+RESPONSE_CACHE_VERSION = 1
+RESPONSE_CACHE_RETENTION = 7 * 24 * 3600  # entries not refreshed for this long are deleted
+LOCK_TIMEOUT = 30  # seconds a process waits for the request of another one
+LOCK_STALE = 120
+REVALIDATE_EXIT_DEADLINE = 5  # seconds background refreshes may delay the exit
+
+# fetch(exit_on_error) performs the upstream request, see request_with_retry
+Fetch = Callable[[bool], Optional[requests.Response]]
+
+_REVALIDATING: Dict[str, threading.Thread] = {}
+_REVALIDATE_LOCK = threading.Lock()
+_PRUNED = False
+# age of the oldest response served from the cache during this run
+_SERVED_AGE: Optional[float] = None
+
+
+def _enabled() -> bool:
+    # recordings and replays have to see every request
+    return RECORD_FILE is None and REPLAY_FILE is None
+
+
+def get_policy(endpoint: str) -> Dict[str, float]:
+    """Return ``max_age`` and ``stale_while_revalidate`` of *endpoint* in seconds."""
+    policy: Dict[str, float] = dict(RESPONSE_CACHE_POLICY.get(endpoint, {"max_age": 0, "stale_while_revalidate": 0}))
+    overrides = Config.get("response_cache", {})
+    endpoint_overrides = overrides.get(endpoint) if isinstance(overrides, dict) else None
+    if isinstance(endpoint_overrides, dict):
+        for name in policy:
+            value = endpoint_overrides.get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0:
+                policy[name] = value
+    if MAX_AGE is not None:
+        # an explicit limit also rules out serving anything older
+        policy["max_age"] = MAX_AGE
+        policy["stale_while_revalidate"] = 0
+    return policy
+
+
+def served_age() -> Optional[float]:
+    """Age in seconds of the oldest cached response used so far, ``None`` if none was."""
+    return _SERVED_AGE
+
+
+def _note_served(age: float) -> None:
+    global _SERVED_AGE
+    _SERVED_AGE = age if _SERVED_AGE is None else max(_SERVED_AGE, age)
+
+
+def account_scope(access_token: str) -> str:
+    """Return a pseudonym of the account *access_token* belongs to.
+
+    Uses the ``sub`` claim of the JWT; tokens without one are scoped to the
+    token itself.
+    """
+    subject = None
+    try:
+        payload = access_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        subject = json.loads(base64.urlsafe_b64decode(payload).decode("utf-8")).get("sub")
+    except (AttributeError, IndexError, TypeError, ValueError):
+        pass
+    scope = subject if isinstance(subject, str) and subject else f"token:{access_token}"
+    return hashlib.sha256(scope.encode("utf-8")).hexdigest()[:16]
+
+
+def _key(url: str, account: str) -> str:
+    return hashlib.sha1(f"{account}\n{url}".encode("utf-8")).hexdigest()
+
+
+def _entry_path(key: str) -> Path:
+    return RESPONSE_CACHE_DIR / f"{key}.json"
+
+
+def _lock_path(key: str) -> Path:
+    return RESPONSE_CACHE_DIR / f"{key}.lock"
+
+
+def _read(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_entry_path(key), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(entry, dict)
+        or entry.get("version") != RESPONSE_CACHE_VERSION
+        or not isinstance(entry.get("stored_at"), (int, float))
+    ):
+        return None
+    return entry
+
+
+def _prune() -> None:
+    global _PRUNED
+    if _PRUNED:
+        return
+    _PRUNED = True
+    cutoff = time.time() - RESPONSE_CACHE_RETENTION
+    for path in RESPONSE_CACHE_DIR.glob("*.json"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _write(key: str, url: str, payload: Any) -> None:
+    try:
+        RESPONSE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        path = _entry_path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": RESPONSE_CACHE_VERSION,
+                "url": url,
+                "stored_at": time.time(),
+                "payload": payload,
+            }, f)
+        tmp.replace(path)
+        _prune()
+    except OSError:
+        # the cache only saves requests, the response is used either way
+        pass
+
+
+def _revalidate(key: str, url: str, fetch: Fetch) -> None:
+    with FileLock(_lock_path(key), 0, LOCK_STALE) as lock:
+        if not lock.acquired:
+            return  # another process is already refreshing it
+        try:
+            response = fetch(False)
+            payload = response.json() if response is not None else None
+        except (RuntimeError, ValueError):
+            return
+        if payload is not None:
+            _write(key, url, payload)
+
+
+def _finish_revalidation() -> None:
+    """Let running background refreshes finish, but not longer than the deadline."""
+    deadline = time.monotonic() + REVALIDATE_EXIT_DEADLINE
+    for thread in list(_REVALIDATING.values()):
+        thread.join(max(0.0, deadline - time.monotonic()))
+
+
+def _revalidate_in_background(key: str, url: str, fetch: Fetch) -> None:
+    with _REVALIDATE_LOCK:
+        if key in _REVALIDATING:
+            return
+        if not _REVALIDATING:
+            atexit.register(_finish_revalidation)
+        thread = threading.Thread(target=_revalidate, args=(key, url, fetch), name="cache-revalidate", daemon=True)
+        _REVALIDATING[key] = thread
+    thread.start()
+
+
+def get_json(endpoint: str, url: str, fetch: Fetch, account: str) -> Any:
+    """Return the JSON payload of *url* for *account* (see :func:`account_scope`), cached when the policy allows it."""
+    if not _enabled():
+        return fetch(True).json()
+
+    policy = get_policy(endpoint)
+    key = _key(url, account)
+    started = time.time()
+    if not NO_CACHE:
+        entry = _read(key)
+        if entry is not None:
+            age = max(0.0, started - entry["stored_at"])
+            if age <= policy["max_age"]:
+                _note_served(age)
+                return entry["payload"]
+            if age <= policy["max_age"] + policy["stale_while_revalidate"]:
+                _revalidate_in_background(key, url, fetch)
+                _note_served(age)
+                return entry["payload"]
+
+    with FileLock(_lock_path(key), LOCK_TIMEOUT, LOCK_STALE):
+        # another process may have fetched it while we were waiting
+        entry = _read(key)
+        if entry is not None:
+            age = max(0.0, time.time() - entry["stored_at"])
+            if entry["stored_at"] >= started or (not NO_CACHE and age <= policy["max_age"]):
+                _note_served(age)
+                return entry["payload"]
+        payload = fetch(True).json()
+        _write(key, url, payload)
+    return payload
@@ -0,0 +1,367 @@
+"""Per-order storage of snapshots and history below ``data/private/orders``.
+
+Every order reference gets a snapshot file and a history file of its own,
+named by a pseudonym of the reference, so reading or writing one order never
+parses the others. ``index.json`` lists the references in display order with
+their shard name, the hash of the stored snapshot, the number of history
+entries and how often the history was rewritten instead of appended to
+(``rewrites``, e.g. by the compaction). It is rewritten on every change and
+so doubles as the signature of the whole store. History moved out by the compaction (``app.utils.compaction``)
+goes to a third, archive file per order that is never read for rendering.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.config import HISTORY_FILE, ORDERS_DIR, ORDERS_FILE, ORDERS_INDEX_FILE
+from app.utils.pseudonyms import pseudonymize_data
+
+ORDERS_INDEX_VERSION = 1
+SHARD_NAME_LENGTH = 16
+
+# (signature of index.json, parsed index)
+_INDEX_CACHE: Optional[Tuple[Optional[List[int]], Dict[str, Any]]] = None
+
+HistoryEntry = Dict[str, Any]
+HistoryStore = Dict[str, List[HistoryEntry]]
+
+
+# -------------------------
+# Files
+# -------------------------
+def _read_json(path: Path) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_text(path: Path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    tmp.replace(path)
+
+
+def _unlink(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _snapshot_path(shard: str) -> Path:
+    return ORDERS_DIR / f"{shard}.order.json"
+
+
+def _history_path(shard: str) -> Path:
+    return ORDERS_DIR / f"{shard}.history.json"
+
+
+def _archive_path(shard: str) -> Path:
+    return ORDERS_DIR / f"{shard}.archive.json"
+
+
+def _snapshot_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+# -------------------------
+# Index
+# -------------------------
+def _empty_index() -> Dict[str, Any]:
+    return {"version": ORDERS_INDEX_VERSION, "orders": {}}
+
+
+def _index_signature() -> Optional[List[int]]:
+    try:
+        stat = os.stat(ORDERS_INDEX_FILE)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_index() -> Dict[str, Any]:
+    """Return the index; ``{"orders": {}}`` if the store does not exist yet.
+
+    The result is shared between calls as long as the file is unchanged,
+    so callers must not modify it.
+    """
+    global _INDEX_CACHE
+    signature = _index_signature()
+    if _INDEX_CACHE is not None and signature is not None and _INDEX_CACHE[0] == signature:
+        return _INDEX_CACHE[1]
+    data = _read_json(ORDERS_INDEX_FILE)
+    if (
+        not isinstance(data, dict)
+        or data.get("version") != ORDERS_INDEX_VERSION
+        or not isinstance(data.get("orders"), dict)
+    ):
+        data = _empty_index()
+    _INDEX_CACHE = (signature, data)
+    return data
+
+
+def _load_index_for_update() -> Dict[str, Any]:
+    return copy.deepcopy(load_index())
+
+
+def _save_index(index: Dict[str, Any]) -> None:
+    global _INDEX_CACHE
+    _write_text(ORDERS_INDEX_FILE, json.dumps(index))
+    _INDEX_CACHE = (_index_signature(), index)
+
+
+def _index_entry(index: Dict[str, Any], reference: str) -> Dict[str, Any]:
+    entry = index["orders"].get(reference)
+    if not isinstance(entry, dict) or not entry.get("shard"):
+        entry = {"shard": pseudonymize_data(f"shard:{reference}", SHARD_NAME_LENGTH), "snapshot": None, "history": 0}
+        index["orders"][reference] = entry
+    return entry
+
+
+def _drop_empty(index: Dict[str, Any], reference: str) -> None:
+    entry = index["orders"].get(reference)
+    if entry is not None and entry.get("snapshot") is None and not entry.get("history") and not entry.get("archive"):
+        del index["orders"][reference]
+
+
+def history_rewrites(reference: str) -> int:
+    """Return how often the history of *reference* was rewritten rather than appended to.
+
+    Caches that fold in appended entries only must rebuild when it changes.
+    """
+    entry = load_index()["orders"].get(str(reference))
+    return int(entry.get("rewrites") or 0) if isinstance(entry, dict) else 0
+
+
+def history_signature(reference: Optional[str] = None) -> Optional[List[int]]:
+    """Return ``[mtime_ns, size]`` of the history of *reference* (or of the whole store)."""
+    if reference is None:
+        path = ORDERS_INDEX_FILE
+    else:
+        entry = load_index()["orders"].get(str(reference))
+        if not isinstance(entry, dict) or not entry.get("history"):
+            return None
+        path = _history_path(entry["shard"])
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# -------------------------
+# Snapshots
+# -------------------------
+def load_snapshots(references: Optional[Iterable[str]] = None) -> "OrderedDict[str, Any]":
+    """Return the stored orders, all of them or only *references*, in index order."""
+    index = load_index()
+    wanted = None if references is None else {str(reference) for reference in references}
+    orders: "OrderedDict[str, Any]" = OrderedDict()
+    for reference, entry in index["orders"].items():
+        if wanted is not None and reference not in wanted:
+            continue
+        if not isinstance(entry, dict) or entry.get("snapshot") is None:
+            continue
+        order = _read_json(_snapshot_path(entry["shard"]))
+        if isinstance(order, dict):
+            orders[reference] = order
+    return orders
+
+
+def save_snapshots(orders: Dict[str, Any]) -> int:
+    """Store *orders* as the current snapshot and return the number of files written.
+
+    Orders whose stored snapshot has the same hash are not written again;
+    orders missing from *orders* lose their snapshot but keep their history.
+    """
+    index = _load_index_for_update()
+    written = 0
+    for reference, order in orders.items():
+        entry = _index_entry(index, str(reference))
+        text = json.dumps(order)
+        digest = _snapshot_hash(text)
+        path = _snapshot_path(entry["shard"])
+        if entry.get("snapshot") != digest or not path.exists():
+            _write_text(path, text)
+            entry["snapshot"] = digest
+            written += 1
+    current = {str(reference) for reference in orders}
+    for reference in list(index["orders"]):
+        if reference in current or index["orders"][reference].get("snapshot") is None:
+            continue
+        _unlink(_snapshot_path(index["orders"][reference]["shard"]))
+        index["orders"][reference]["snapshot"] = None
+        _drop_empty(index, reference)
+        written += 1
+    if written:
+        # current orders first and in their order, like the single-file layout
+        ordered = OrderedDict((str(reference), index["orders"][str(reference)]) for reference in orders)
+        ordered.update((reference, entry) for reference, entry in index["orders"].items() if reference not in ordered)
+        index["orders"] = ordered
+        _save_index(index)
+    return written
+
+
+# -------------------------
+# History
+# -------------------------
+def _normalize_entries(entries: Any) -> List[HistoryEntry]:
+    if not isinstance(entries, list):
+        return []
+    return [entry for entry in entries if isinstance(entry, dict)]
+
+
+def load_order_history(reference: str) -> List[HistoryEntry]:
+    """Return the raw history entries of one order."""
+    entry = load_index()["orders"].get(str(reference))
+    if not isinstance(entry, dict) or not entry.get("history"):
+        return []
+    return _normalize_entries(_read_json(_history_path(entry["shard"])))
+
+
+def history_size(reference: str) -> int:
+    """Return the size in bytes of the history file of one order."""
+    entry = load_index()["orders"].get(str(reference))
+    if not isinstance(entry, dict) or not entry.get("history"):
+        return 0
+    try:
+        return os.stat(_history_path(entry["shard"])).st_size
+    except OSError:
+        return 0
+
+
+def load_order_archive(reference: str) -> List[HistoryEntry]:
+    """Return the archived history entries of one order, oldest first."""
+    entry = load_index()["orders"].get(str(reference))
+    if not isinstance(entry, dict) or not entry.get("archive"):
+        return []
+    return _normalize_entries(_read_json(_archive_path(entry["shard"])))
+
+
+def replace_order_history(reference: str, entries: List[HistoryEntry], archived: List[HistoryEntry]) -> None:
+    """Store *entries* as the history of one order and add *archived* to its archive."""
+    index = _load_index_for_update()
+    entry = _index_entry(index, str(reference))
+    if archived:
+        path = _archive_path(entry["shard"])
+        archive = _normalize_entries(_read_json(path)) if entry.get("archive") else []
+        archive.extend(archived)
+        # stable sort keeps the order of entries from the same day
+        archive.sort(key=lambda item: str(item.get("timestamp", "")))
+        _write_text(path, json.dumps(archive))
+        entry["archive"] = len(archive)
+    if entries:
+        _write_text(_history_path(entry["shard"]), json.dumps(entries))
+    else:
+        _unlink(_history_path(entry["shard"]))
+    entry["history"] = len(entries)
+    entry["rewrites"] = entry.get("rewrites", 0) + 1
+    _drop_empty(index, str(reference))
+    _save_index(index)
+
+
+def load_history() -> HistoryStore:
+    """Return the raw history of all orders as ``{reference: [entries]}``."""
+    history: HistoryStore = {}
+    for reference, entry in load_index()["orders"].items():
+        if isinstance(entry, dict) and entry.get("history"):
+            history[reference] = _normalize_entries(_read_json(_history_path(entry["shard"])))
+    return history
+
+
+def append_history(entries_by_reference: Dict[str, HistoryEntry]) -> None:
+    """Append one history entry per order; only the affected orders are read and written."""
+    if not entries_by_reference:
+        return
+    index = _load_index_for_update()
+    for reference, history_entry in entries_by_reference.items():
+        entry = _index_entry(index, str(reference))
+        path = _history_path(entry["shard"])
+        entries = _normalize_entries(_read_json(path)) if entry.get("history") else []
+        entries.append(history_entry)
+        _write_text(path, json.dumps(entries))
+        entry["history"] = len(entries)
+    _save_index(index)
+
+
+def save_history(history: HistoryStore) -> None:
+    """Replace the stored history with *history*; orders missing from it lose theirs."""
+    index = _load_index_for_update()
+    for reference, entries in history.items():
+        entry = _index_entry(index, str(reference))
+        if entries:
+            _write_text(_history_path(entry["shard"]), json.dumps(entries))
+        else:
+            _unlink(_history_path(entry["shard"]))
+        entry["history"] = len(entries)
+        entry["rewrites"] = entry.get("rewrites", 0) + 1
+        _drop_empty(index, str(reference))
+    current = {str(reference) for reference in history}
+    for reference in list(index["orders"]):
+        if reference in current or not index["orders"][reference].get("history"):
+            continue
+        _unlink(_history_path(index["orders"][reference]["shard"]))
+        index["orders"][reference]["history"] = 0
+        index["orders"][reference]["rewrites"] = index["orders"][reference].get("rewrites", 0) + 1
+        _drop_empty(index, reference)
+    _save_index(index)
+
+
+# -------------------------
+# Single-file layout
+# -------------------------
+def _read_single_file(path: Path) -> Dict[str, Any]:
+    """Return the object in *path*, ``{}`` if it is missing; anything else is kept and raises."""
+    if not path.exists():
+        return {}
+    data = _read_json(path)
+    if not isinstance(data, dict):
+        raise RuntimeError(f"{path.name} cannot be read as an object, it was kept")
+    return data
+
+
+def import_single_files(dry_run: bool = False) -> Dict[str, int]:
+    """Move ``tesla_orders.json`` and ``tesla_order_history.json`` into the store.
+
+    The old files are deleted once the store reads back the same data. A file
+    that cannot be read or has an unexpected shape raises before anything is
+    changed, so the migration is retried on the next run.
+    Orders and history already in the store are kept unless the old files
+    contain the same reference.
+    """
+    orders = _read_single_file(ORDERS_FILE)
+    history = _read_single_file(HISTORY_FILE)
+    if any(not isinstance(entries, list) for entries in history.values()):
+        raise RuntimeError(f"{HISTORY_FILE.name} is not grouped by order reference, it was kept")
+    history = {str(reference): _normalize_entries(entries) for reference, entries in history.items()}
+    stats = {
+        "orders": len(orders),
+        "history_orders": len(history),
+        "entries": sum(len(entries) for entries in history.values()),
+    }
+    if dry_run or not (ORDERS_FILE.exists() or HISTORY_FILE.exists()):
+        return stats
+
+    merged_orders = OrderedDict(orders)
+    merged_orders.update((reference, order) for reference, order in load_snapshots().items() if reference not in orders)
+    save_snapshots(merged_orders)
+    merged_history = load_history()
+    merged_history.update(history)
+    save_history(merged_history)
+
+    if load_snapshots(orders) != orders or any(load_order_history(reference) != entries for reference, entries in history.items()):
+        raise RuntimeError("per-order storage does not match the old files, they were kept")
+    _unlink(ORDERS_FILE)
+    _unlink(HISTORY_FILE)
+    return stats
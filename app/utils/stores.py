@@ -0,0 +1,395 @@
+"""Compact, array-backed table of the Tesla stores in ``tesla_locations.json``.
+
+The JSON holds ~1,250 stores as nested dicts. Kept as-is that costs well
+over a megabyte per process, mostly per-object overhead of small dicts and
+strings. The table stores the data column-wise instead:
+
+* ids are interned strings with an id -> row dict for O(1) lookups,
+* coordinates live in two ``array('d')`` columns,
+* repetitive text columns (e.g. country) are dictionary-encoded: one
+  interned string per distinct value plus an ``array`` of codes,
+* all other text columns are packed into a single UTF-8 ``bytes`` blob
+  with an ``array('I')`` of offsets and decoded on access.
+
+Records are only materialized on demand as :class:`StoreView` objects that
+behave like the old read-only dicts. The table is cached in
+``PRIVATE_DIR`` as a ``marshal`` file keyed by the source file's size and
+mtime, so later runs skip JSON parsing entirely.
+"""
+
+from __future__ import annotations
+
+import json
+import marshal
+import math
+import sys
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.config import PRIVATE_DIR, TESLA_STORES_FILE
+
+STORES_CACHE_FILE = PRIVATE_DIR / "tesla_stores.cache"
+STORES_CACHE_VERSION = 2
+
+# column name -> (path inside a store record)
+_STRING_COLUMNS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ("display_name", ("display_name",)),
+    ("phone", ("phone",)),
+    ("store_email", ("store_email",)),
+    ("address_1", ("address", "address_1")),
+    ("city", ("address", "city")),
+    ("country", ("address", "country")),
+    ("postal_code", ("address", "postal_code")),
+)
+_TOP_LEVEL_KEYS = {"display_name", "phone", "store_email", "address"}
+_ADDRESS_KEYS = {"address_1", "city", "country", "postal_code", "latitude", "longitude"}
+
+_TABLE: Optional["StoreTable"] = None
+
+
+class _PackedColumn:
+    """Optional strings packed into one UTF-8 blob plus offsets."""
+
+    __slots__ = ("_blob", "_offsets", "_nulls")
+
+    def __init__(self, blob: bytes, offsets: array, nulls: bytes):
+        self._blob = blob
+        self._offsets = offsets
+        self._nulls = nulls
+
+    @classmethod
+    def from_values(cls, values: List[Optional[str]]) -> "_PackedColumn":
+        parts: List[bytes] = []
+        offsets = array("I", [0])
+        nulls = bytearray(len(values))
+        position = 0
+        for row, value in enumerate(values):
+            if value is None:
+                nulls[row] = 1
+            else:
+                encoded = value.encode("utf-8")
+                parts.append(encoded)
+                position += len(encoded)
+            offsets.append(position)
+        return cls(b"".join(parts), offsets, bytes(nulls))
+
+    def __len__(self) -> int:
+        return len(self._nulls)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        if self._nulls[row]:
+            return None
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].decode("utf-8")
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self[row] for row in range(len(self)))
+
+    def dump(self) -> Tuple[str, bytes, bytes, bytes]:
+        return ("packed", self._blob, self._offsets.tobytes(), self._nulls)
+
+    @classmethod
+    def load(cls, blob: bytes, offsets: bytes, nulls: bytes) -> "_PackedColumn":
+        offset_array = array("I")
+        offset_array.frombytes(offsets)
+        return cls(blob, offset_array, nulls)
+
+
+class _DictColumn:
+    """Dictionary-encoded strings: distinct interned values plus row codes."""
+
+    __slots__ = ("_values", "_codes")
+
+    def __init__(self, values: List[Optional[str]], codes: array):
+        self._values = values
+        self._codes = codes
+
+    @classmethod
+    def from_values(cls, values: List[Optional[str]]) -> "_DictColumn":
+        distinct: Dict[Optional[str], int] = {}
+        codes = array("I")
+        for value in values:
+            code = distinct.get(value)
+            if code is None:
+                code = distinct[value] = len(distinct)
+            codes.append(code)
+        return cls([_intern(value) for value in distinct], codes)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        return self._values[self._codes[row]]
+
+    def __iter__(self) -> Iterator[Optional[str]]:
+        return (self._values[code] for code in self._codes)
+
+    def dump(self) -> Tuple[str, Tuple[Optional[str], ...], bytes]:
+        return ("dict", tuple(self._values), self._codes.tobytes())
+
+    @classmethod
+    def load(cls, values: Tuple[Optional[str], ...], codes: bytes) -> "_DictColumn":
+        code_array = array("I")
+        code_array.frombytes(codes)
+        return cls([_intern(value) for value in values], code_array)
+
+
+def _build_column(values: List[Optional[str]]) -> Any:
+    # dictionary encoding pays off as soon as values repeat noticeably
+    if len(set(values)) * 2 <= len(values):
+        return _DictColumn.from_values(values)
+    return _PackedColumn.from_values(values)
+
+
+def _load_column(dumped: Tuple[Any, ...]) -> Any:
+    kind = dumped[0]
+    if kind == "dict":
+        return _DictColumn.load(dumped[1], dumped[2])
+    if kind == "packed":
+        return _PackedColumn.load(dumped[1], dumped[2], dumped[3])
+    raise ValueError(f"Unknown column type {kind!r}")
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _coordinate(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else math.nan
+
+
+class StoreView:
+    """Read-only, dict-like view on one row of a :class:`StoreTable`."""
+
+    __slots__ = ("_table", "_pos")
+
+    def __init__(self, table: "StoreTable", pos: int):
+        self._table = table
+        self._pos = pos
+
+    @property
+    def id(self) -> str:
+        return self._table.ids[self._pos]
+
+    @property
+    def coordinates(self) -> Optional[Tuple[float, float]]:
+        return self._table.coordinates_at(self._pos)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        table, pos = self._table, self._pos
+        if key == "address":
+            return table.address_at(pos)
+        column = table.columns.get(key)
+        if column is not None:
+            return column[pos]
+        extra = table.extras[pos]
+        if extra and key in extra:
+            return extra[key]
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self.get(key, _MISSING) is not _MISSING
+
+    def __bool__(self) -> bool:
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the record in the original JSON shape."""
+        table, pos = self._table, self._pos
+        record: Dict[str, Any] = {
+            "address": table.address_at(pos),
+            "display_name": table.columns["display_name"][pos],
+            "phone": table.columns["phone"][pos],
+            "store_email": table.columns["store_email"][pos],
+        }
+        extra = table.extras[pos]
+        if extra:
+            record.update({k: v for k, v in extra.items() if not k.startswith("address.")})
+        return record
+
+    def __repr__(self) -> str:
+        return f"StoreView({self.id!r}, {self.get('display_name')!r})"
+
+
+_MISSING = object()
+
+
+class StoreTable:
+    """Column store of all Tesla locations with O(1) lookup by id."""
+
+    __slots__ = ("ids", "latitudes", "longitudes", "columns", "extras", "_positions")
+
+    def __init__(
+        self,
+        ids: List[str],
+        latitudes: array,
+        longitudes: array,
+        columns: Dict[str, Any],
+        extras: List[Optional[Dict[str, Any]]],
+    ):
+        self.ids = ids
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.columns = columns
+        self.extras = extras
+        self._positions = {store_id: pos for pos, store_id in enumerate(ids)}
+
+    @classmethod
+    def from_json(cls, stores: Any) -> "StoreTable":
+        ids: List[str] = []
+        latitudes, longitudes = array("d"), array("d")
+        raw_columns: Dict[str, List[Optional[str]]] = {name: [] for name, _ in _STRING_COLUMNS}
+        extras: List[Optional[Dict[str, Any]]] = []
+        if not isinstance(stores, dict):
+            stores = {}
+        for store_id, store in stores.items():
+            if not isinstance(store, dict):
+                continue
+            address = store.get("address") if isinstance(store.get("address"), dict) else {}
+            ids.append(sys.intern(str(store_id)))
+            latitudes.append(_coordinate(address.get("latitude")))
+            longitudes.append(_coordinate(address.get("longitude")))
+            for name, path in _STRING_COLUMNS:
+                value = address.get(path[1]) if len(path) == 2 else store.get(path[0])
+                raw_columns[name].append(value if isinstance(value, str) else None)
+            # keep unknown fields so nothing gets lost; they are rare
+            extra = {k: v for k, v in store.items() if k not in _TOP_LEVEL_KEYS}
+            extra.update({f"address.{k}": v for k, v in address.items() if k not in _ADDRESS_KEYS})
+            extras.append(extra or None)
+        columns = {name: _build_column(values) for name, values in raw_columns.items()}
+        return cls(ids, latitudes, longitudes, columns, extras)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, store_id: object) -> bool:
+        return str(store_id) in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def position(self, store_id: Any) -> Optional[int]:
+        if store_id is None:
+            return None
+        return self._positions.get(str(store_id))
+
+    def get(self, store_id: Any, default: Any = None) -> Any:
+        pos = self.position(store_id)
+        return default if pos is None else StoreView(self, pos)
+
+    def items(self) -> Iterator[Tuple[str, StoreView]]:
+        for pos, store_id in enumerate(self.ids):
+            yield store_id, StoreView(self, pos)
+
+    def coordinates_at(self, pos: int) -> Optional[Tuple[float, float]]:
+        lat, lon = self.latitudes[pos], self.longitudes[pos]
+        if math.isnan(lat) or math.isnan(lon):
+            return None
+        return lat, lon
+
+    def address_at(self, pos: int) -> Dict[str, Any]:
+        columns = self.columns
+        address: Dict[str, Any] = {
+            "address_1": columns["address_1"][pos],
+            "city": columns["city"][pos],
+            "country": columns["country"][pos],
+            "postal_code": columns["postal_code"][pos],
+        }
+        coordinates = self.coordinates_at(pos)
+        if coordinates is not None:
+            address["latitude"], address["longitude"] = coordinates
+        extra = self.extras[pos]
+        if extra:
+            address.update({k[len("address."):]: v for k, v in extra.items() if k.startswith("address.")})
+        return address
+
+    # --- binary cache -------------------------------------------------
+    def _dump(self, signature: List[int]) -> bytes:
+        return marshal.dumps((
+            STORES_CACHE_VERSION,
+            signature,
+            tuple(self.ids),
+            self.latitudes.tobytes(),
+            self.longitudes.tobytes(),
+            {name: column.dump() for name, column in self.columns.items()},
+            tuple(self.extras),
+        ))
+
+    @classmethod
+    def _load(cls, data: bytes, signature: List[int]) -> Optional["StoreTable"]:
+        payload = marshal.loads(data)
+        if not isinstance(payload, tuple) or len(payload) != 7:
+            return None
+        version, cached_signature, ids, lat_bytes, lon_bytes, columns, extras = payload
+        if version != STORES_CACHE_VERSION or list(cached_signature) != signature:
+            return None
+        latitudes, longitudes = array("d"), array("d")
+        latitudes.frombytes(lat_bytes)
+        longitudes.frombytes(lon_bytes)
+        return cls(
+            [sys.intern(i) for i in ids],
+            latitudes,
+            longitudes,
+            {name: _load_column(dumped) for name, dumped in columns.items()},
+            list(extras),
+        )
+
+
+def _source_signature() -> Optional[List[int]]:
+    try:
+        stat = TESLA_STORES_FILE.stat()
+    except OSError:
+        return None
+    # the Python version is part of the key because marshal's format may change
+    return [stat.st_mtime_ns, stat.st_size, sys.version_info[0], sys.version_info[1]]
+
+
+def _load_cached_table(signature: List[int]) -> Optional[StoreTable]:
+    try:
+        return StoreTable._load(STORES_CACHE_FILE.read_bytes(), signature)
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+
+def _save_cached_table(table: StoreTable, signature: List[int]) -> None:
+    try:
+        STORES_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = STORES_CACHE_FILE.with_suffix(STORES_CACHE_FILE.suffix + ".tmp")
+        tmp.write_bytes(table._dump(signature))
+        tmp.replace(STORES_CACHE_FILE)
+    except OSError:
+        pass
+
+
+def load_store_table() -> StoreTable:
+    """Build the table from the binary cache, or from JSON if the cache is stale."""
+    signature = _source_signature()
+    if signature is None:
+        return StoreTable.from_json({})
+    table = _load_cached_table(signature)
+    if table is not None:
+        return table
+    try:
+        with open(TESLA_STORES_FILE, encoding="utf-8") as f:
+            table = StoreTable.from_json(json.load(f))
+    except (OSError, ValueError):
+        return StoreTable.from_json({})
+    _save_cached_table(table, signature)
+    return table
+
+
+def get_store_table() -> StoreTable:
+    global _TABLE
+    if _TABLE is None:
+        _TABLE = load_store_table()
+    return _TABLE
+
+
+def get_store(store_id: Any) -> Any:
+    """Return the :class:`StoreView` for *store_id*, or ``{}`` if unknown."""
+    return get_store_table().get(store_id, {})
@@ -1,12 +1,48 @@
+import atexit
+import json
 import re
+import threading
+import time
 import webbrowser
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional, Set
 
-from app.config import OPTION_CODES_URL, TELEMETRIC_URL, VERSION, cfg as Config
+from app.config import OPTION_CODES_URL, PRIVATE_DIR, TELEMETRIC_URL, VERSION, cfg as Config
 from app.utils.helpers import pseudonymize_data
-from app.utils.params import DETAILS_MODE, SHARE_MODE, STATUS_MODE, CACHED_MODE, ALL_KEYS_MODE, ORDER_FILTER
+from app.utils.params import DETAILS_MODE, SHARE_MODE, STATUS_MODE, CACHED_MODE, ALL_KEYS_MODE, ORDER_FILTER, JSON_OUTPUT
 from app.utils.connection import request_with_retry
+from app.utils.filelock import FileLock
 from app.utils.locale import t, LANGUAGE, LOCALE
+from app.utils.option_codes import get_known_option_codes
+
+# Telemetry is sent by a background thread. Events that could not be sent
+# (offline, server down, exit deadline reached) or were created in cached
+# mode are kept in the spool and go out with the next online runs, one
+# request per event (the endpoint takes single events only), oldest first
+# and at most TELEMETRY_SEND_LIMIT of them per run so the sends fit into
+# the exit deadline even on slow links. Other processes may append to the spool
+# while a send is running; every change of the spool file is a
+# read-modify-write under a lock file, and a finished send only removes what
+# it actually sent.
+TELEMETRY_SPOOL_FILE = PRIVATE_DIR / "telemetry_spool.json"
+TELEMETRY_SPOOL_LOCK_FILE = PRIVATE_DIR / "telemetry_spool.lock"
+TELEMETRY_SPOOL_LIMIT = 50  # max. events kept while offline
+TELEMETRY_SEND_LIMIT = 5  # spooled events sent per run, besides the run's own
+TELEMETRY_SPOOL_LOCK_TIMEOUT = 5  # seconds
+TELEMETRY_SPOOL_LOCK_STALE = 30  # seconds
+TELEMETRY_EXIT_DEADLINE = 2  # seconds a running send may delay the exit
+
+# Ledger of option codes already reported to OPTION_CODES_URL. Codes are
+# only submitted again once their re-sync interval has passed; codes that
+# are missing from the local catalogue are re-sent more often.
+OPTION_CODES_LEDGER_FILE = PRIVATE_DIR / "option_codes_submitted.json"
+OPTION_CODES_RESYNC = 30 * 24 * 3600  # seconds
+OPTION_CODES_UNKNOWN_RESYNC = 24 * 3600  # seconds
+OPTION_CODES_LEDGER_LIMIT = 1000
+
+_SENDER_THREAD: Optional[threading.Thread] = None
+_SPOOL_LOCK = threading.Lock()
+# progress of the running send (see _send_pending); None once settled
+_PENDING: Optional[Dict[str, Any]] = None
 
 
 def _normalize_option_code(raw_code: str) -> str:
@@ -34,6 +70,9 @@ def _collect_option_codes(orders: List[dict]) -> List[str]:
 
 def ensure_telemetry_consent() -> None:
     """Ask user for tracking consent if not already given."""
+    # --json/--jsonl output is piped into other tools: never prompt on stdout
+    if JSON_OUTPUT:
+        return
     if Config.has("telemetry-consent"):
         if Config.get("telemetry-consent"):
             return
@@ -71,7 +110,202 @@ def ask_for_telemetry_consent() -> None:
         input(t("Telemetry disabled. (ENTER): "))
 
 
+def _load_spool() -> Dict[str, Any]:
+    try:
+        with TELEMETRY_SPOOL_FILE.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {"events": [], "option_codes": []}
+    events = data.get("events") if isinstance(data, dict) else None
+    codes = data.get("option_codes") if isinstance(data, dict) else None
+    return {
+        "events": [e for e in events if isinstance(e, dict)] if isinstance(events, list) else [],
+        "option_codes": [c for c in codes if isinstance(c, str)] if isinstance(codes, list) else [],
+    }
+
+
+def _save_spool(spool: Dict[str, Any]) -> None:
+    if not spool["events"] and not spool["option_codes"]:
+        try:
+            TELEMETRY_SPOOL_FILE.unlink()
+        except FileNotFoundError:
+            pass
+        return
+    TELEMETRY_SPOOL_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = TELEMETRY_SPOOL_FILE.with_suffix(TELEMETRY_SPOOL_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps(spool), encoding="utf-8")
+    tmp.replace(TELEMETRY_SPOOL_FILE)
+
+
+def _update_spool(update: Callable[[Dict[str, Any]], Dict[str, Any]]) -> None:
+    """Apply *update* to the spool, guarded against other threads and processes."""
+    with _SPOOL_LOCK, FileLock(TELEMETRY_SPOOL_LOCK_FILE, TELEMETRY_SPOOL_LOCK_TIMEOUT, TELEMETRY_SPOOL_LOCK_STALE):
+        try:
+            _save_spool(update(_load_spool()))
+        except OSError:
+            pass
+
+
+def _add_to_spool(spool: Dict[str, Any], events: List[Dict[str, Any]], option_codes: List[str]) -> Dict[str, Any]:
+    return {
+        "events": (spool["events"] + events)[-TELEMETRY_SPOOL_LIMIT:],
+        "option_codes": sorted(set(spool["option_codes"]).union(option_codes)),
+    }
+
+
+def _load_ledger() -> Dict[str, float]:
+    try:
+        with OPTION_CODES_LEDGER_FILE.open("r", encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        return {}
+    codes = data.get("codes") if isinstance(data, dict) else None
+    if not isinstance(codes, dict):
+        return {}
+    return {code: ts for code, ts in codes.items() if isinstance(code, str) and isinstance(ts, (int, float))}
+
+
+def _save_ledger(ledger: Dict[str, float]) -> None:
+    if len(ledger) > OPTION_CODES_LEDGER_LIMIT:
+        newest = sorted(ledger.items(), key=lambda item: item[1], reverse=True)[:OPTION_CODES_LEDGER_LIMIT]
+        ledger = dict(newest)
+    OPTION_CODES_LEDGER_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = OPTION_CODES_LEDGER_FILE.with_suffix(OPTION_CODES_LEDGER_FILE.suffix + ".tmp")
+    tmp.write_text(json.dumps({"codes": ledger}, sort_keys=True), encoding="utf-8")
+    tmp.replace(OPTION_CODES_LEDGER_FILE)
+
+
+def _codes_due(option_codes: List[str], ledger: Dict[str, float], now: float) -> List[str]:
+    """Return the codes that were never submitted or whose re-sync is due."""
+    if not option_codes:
+        return []
+    known: Optional[Set[str]] = None
+    due = []
+    for code in option_codes:
+        submitted = ledger.get(code)
+        if submitted is None or now - submitted >= OPTION_CODES_RESYNC:
+            due.append(code)
+            continue
+        if now - submitted >= OPTION_CODES_UNKNOWN_RESYNC:
+            if known is None:
+                known = get_known_option_codes()
+            if code not in known:
+                due.append(code)
+    return due
+
+
+def _settle(pending: Dict[str, Any]) -> None:
+    """Drop what *pending* sent from the spool and keep what it did not."""
+    def update(current: Dict[str, Any]) -> Dict[str, Any]:
+        # keep whatever other runs spooled meanwhile
+        remaining = list(current["events"])
+        for sent in pending["sent"]:
+            if sent in remaining:
+                remaining.remove(sent)
+        codes = current["option_codes"]
+        if pending["codes_sent"]:
+            codes = [code for code in codes if code not in pending["codes"]]
+        return _add_to_spool(
+            {"events": remaining, "option_codes": codes},
+            [] if pending["event_sent"] else [pending["event"]],
+            [] if pending["codes_sent"] else pending["due"],
+        )
+
+    _update_spool(update)
+
+
+def _send_pending(event: Dict[str, Any], option_codes: List[str]) -> None:
+    global _PENDING
+    spool = _load_spool()
+    had_spool = bool(spool["events"] or spool["option_codes"])
+    ledger = _load_ledger()
+    due = _codes_due(option_codes, ledger, time.time())
+    codes = sorted(set(spool["option_codes"]).union(due))
+    pending: Dict[str, Any] = {
+        "event": event,
+        "due": due,
+        "codes": codes,
+        "sent": [],
+        "event_sent": False,
+        "codes_sent": False,
+    }
+    with _SPOOL_LOCK:
+        _PENDING = pending
+
+    try:
+        for spooled in spool["events"][:TELEMETRY_SEND_LIMIT]:
+            request_with_retry(TELEMETRIC_URL, json=spooled, max_retries=1, exit_on_error=False)
+            pending["sent"].append(spooled)
+        request_with_retry(TELEMETRIC_URL, json=event, max_retries=1, exit_on_error=False)
+        pending["event_sent"] = True
+    except Exception:
+        # Telemetry failures should not impact the main application flow
+        pass
+
+    if codes:
+        try:
+            request_with_retry(
+                OPTION_CODES_URL,
+                json={"codes": codes},
+                max_retries=1,
+                exit_on_error=False
+            )
+            pending["codes_sent"] = True
+            submitted_at = time.time()
+            ledger.update((code, submitted_at) for code in codes)
+            try:
+                _save_ledger(ledger)
+            except OSError:
+                pass
+        except Exception:
+            # Swallow errors to keep endpoint stable
+            pass
+
+    with _SPOOL_LOCK:
+        if _PENDING is None:
+            # the exit deadline already settled it
+            return
+        _PENDING = None
+    # no write at all when there was no spool and everything went out
+    if not had_spool and pending["event_sent"] and (pending["codes_sent"] or not codes):
+        return
+    _settle(pending)
+
+
+def _finish_telemetry() -> None:
+    """Give the sender a hard deadline at exit and spool whatever is still unsent."""
+    global _PENDING
+    if _SENDER_THREAD is None:
+        return
+    _SENDER_THREAD.join(TELEMETRY_EXIT_DEADLINE)
+    if not _SENDER_THREAD.is_alive():
+        return
+    with _SPOOL_LOCK:
+        pending, _PENDING = _PENDING, None
+    if pending is not None:
+        # copies, the sender may still be appending
+        _settle(dict(pending, sent=list(pending["sent"])))
+
+
+def _spool_offline(event: Dict[str, Any], option_codes: List[str]) -> None:
+    """Keep the event for the next online run; cached mode sends nothing."""
+    due = _codes_due(option_codes, _load_ledger(), time.time())
+    _update_spool(lambda spool: _add_to_spool(spool, [event], due))
+
+
+def _enqueue(event: Dict[str, Any], option_codes: List[str]) -> None:
+    global _SENDER_THREAD
+    if _SENDER_THREAD is not None:
+        return
+    _SENDER_THREAD = threading.Thread(
+        target=_send_pending, args=(event, option_codes), name="telemetry", daemon=True
+    )
+    _SENDER_THREAD.start()
+    atexit.register(_finish_telemetry)
+
+
 def track_usage(orders: List[dict]) -> None:
+    """Queue a usage event; sending happens in the background."""
     if not Config.get("telemetry-consent"):
         return
 
@@ -104,6 +338,7 @@ def track_usage(orders: List[dict]) -> None:
         "cached": CACHED_MODE,
         "all": ALL_KEYS_MODE,
         "filter": bool(ORDER_FILTER),
+        "json": JSON_OUTPUT,
     }
 
     data = {
@@ -112,23 +347,11 @@ def track_usage(orders: List[dict]) -> None:
         "params": params,
         "lang": LOCALE,
         "ui_lang": LANGUAGE,
-        "version": VERSION
+        "version": VERSION,
+        "timestamp": int(time.time()),
     }
 
-    try:
-        request_with_retry(TELEMETRIC_URL, json=data, max_retries=3, exit_on_error=False)
-    except Exception:
-        # Telemetry failures should not impact the main application flow
-        pass
-
-    if option_codes:
-        try:
-            request_with_retry(
-                OPTION_CODES_URL,
-                json={"codes": option_codes},
-                max_retries=3,
-                exit_on_error=False
-            )
-        except Exception:
-            # Swallow errors to keep endpoint stable
-            pass
+    if CACHED_MODE:
+        _spool_offline(data, option_codes)
+    else:
+        _enqueue(data, option_codes)
@@ -1,37 +1,42 @@
 from __future__ import annotations
-from datetime import datetime
+import hashlib
+import json
+import os
 from typing import Any, Dict, List, Optional, Tuple
 
+from app.config import TIMELINE_FILE
 from app.utils.colors import color_text
-from app.utils.helpers import (
-    get_date_from_timestamp,
-    normalize_str,
-    get_delivery_appointment_display,
-    _parse_iso_timestamp,
+from app.utils.history import (
+    filter_history_entries,
+    get_history_of_order,
+    get_history_rewrites,
+    get_history_signature,
+    load_history_of_order,
 )
-from app.utils.history import get_history_of_order
+import app.utils.history as history_module
 from app.utils.locale import t
+from app.utils.orderdata import (
+    TIMELINE_WHITELIST_NORMALIZED,
+    fold_history_changes as _fold_history_changes,
+    get_order_startdate,
+    materialize_timeline_record,
+    new_timeline_record as _new_timeline_record,
+    normalize_str,
+    order_timeline_entries,
+    sort_timeline_entries as _sort_timeline_entries,
+    timeline_entry as _timeline_entry,
+)
+from app.utils.params import ALL_KEYS_MODE
+from app.utils.timestamps import parse_timestamp
 
-TIMELINE_WHITELIST = {
-    'Reservation',
-    'Order Booked',
-    'Delivery Window',
-    'Expected Registration Date',
-    'ETA to Delivery Center',
-    'Delivery Appointment Date',
-    'VIN',
-    'Order Status',
-    'CAR BUILT',
-    'Vehicle Odometer'
-}
-TIMELINE_WHITELIST_NORMALIZED = {normalize_str(key) for key in TIMELINE_WHITELIST}
+TIMELINE_INDEX_VERSION = 2
 
 
 def _split_timestamp(value: Any) -> Tuple[str, Optional[str]]:
-    parsed = _parse_iso_timestamp(value) if isinstance(value, str) else None
+    parsed = parse_timestamp(value)
     if parsed:
         date_display = parsed.date().isoformat()
-        has_time_info = isinstance(value, str) and (":" in value or "T" in value)
+        has_time_info = ":" in value or "T" in value
         time_display = parsed.strftime("%H:%M") if has_time_info else None
         return date_display, time_display if time_display and time_display != "00:00" else None
     if isinstance(value, str) and value.strip():
@@ -39,11 +44,6 @@ def _split_timestamp(value: Any) -> Tuple[str, Optional[str]]:
     return t("unknown"), None
 
 
-def _sort_timeline_entries(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    enumerated = list(enumerate(entries))
-    enumerated.sort(key=lambda item: (_parse_iso_timestamp(item[1].get("timestamp")) or datetime.max, item[0]))
-    return [entry for _, entry in enumerated]
-
 def is_order_key_in_timeline(timeline, key, value = None):
     """Return ``True`` if *timeline* contains an entry with *key* and *value*."""
 
@@ -56,7 +56,126 @@ def is_order_key_in_timeline(timeline, key, value = None):
     return False
 
 
-def get_timeline_from_history(order_reference: str, startdate) -> List[Dict[str, Any]]:
+# ---------------------------
+# Persisted timeline index
+# ---------------------------
+# Every order keeps the timeline entries derived from its history together with
+# the fold state, a dict of normalized keys and the number of history entries
+# already folded in. Only history entries appended since the last render are
+# processed; a rewritten history (different length, digest or rewrite count of
+# the store, see app/utils/shards.py) rebuilds the record from scratch. Only the history file of the rendered order is read.
+_TIMELINE_INDEX: Optional[Dict[str, Any]] = None
+# [mtime_ns, size] of TIMELINE_FILE when _TIMELINE_INDEX was loaded or saved;
+# a deleted or replaced file (see migration.invalidate_derived_caches) is read again
+_TIMELINE_INDEX_SIGNATURE: Optional[List[int]] = None
+_ODOMETER_KEY = normalize_str("Vehicle Odometer")
+_DELIVERY_WINDOW_KEY = normalize_str("Delivery Window")
+
+
+def _empty_timeline_index() -> Dict[str, Any]:
+    return {"version": TIMELINE_INDEX_VERSION, "orders": {}}
+
+
+def _timeline_file_signature() -> Optional[List[int]]:
+    try:
+        stat = os.stat(TIMELINE_FILE)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _load_timeline_index() -> Dict[str, Any]:
+    global _TIMELINE_INDEX, _TIMELINE_INDEX_SIGNATURE
+    signature = _timeline_file_signature()
+    if _TIMELINE_INDEX is not None and signature == _TIMELINE_INDEX_SIGNATURE:
+        return _TIMELINE_INDEX
+    index = _empty_timeline_index()
+    if os.path.exists(TIMELINE_FILE):
+        try:
+            with open(TIMELINE_FILE, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if (
+                isinstance(data, dict)
+                and data.get("version") == TIMELINE_INDEX_VERSION
+                and isinstance(data.get("orders"), dict)
+            ):
+                index = data
+        except (OSError, ValueError):
+            pass
+    _TIMELINE_INDEX = index
+    _TIMELINE_INDEX_SIGNATURE = signature
+    return index
+
+
+def _save_timeline_index(index: Dict[str, Any]) -> None:
+    global _TIMELINE_INDEX_SIGNATURE
+    try:
+        TIMELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TIMELINE_FILE.with_suffix(TIMELINE_FILE.suffix + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        tmp.replace(TIMELINE_FILE)
+    except OSError:
+        # The index is only a cache; rendering works without it
+        pass
+    _TIMELINE_INDEX_SIGNATURE = _timeline_file_signature()
+
+
+def _history_entry_digest(entry: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(entry, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _get_timeline_record(order_reference: str) -> Dict[str, Any]:
+    """Return the up-to-date timeline record of *order_reference*."""
+    reference = str(order_reference)
+    index = _load_timeline_index()
+    orders = index["orders"]
+    signature = get_history_signature(reference)
+    record = orders.get(reference)
+    if (
+        isinstance(record, dict)
+        and record.get("history_signature") == signature
+        # no history at all: up to date while nothing was folded in
+        and (signature is not None or not record.get("folded"))
+    ):
+        return record
+
+    entries = load_history_of_order(reference)
+    rewrites = get_history_rewrites(reference)
+    if (
+        not isinstance(record, dict)
+        or record.get("rewrites", 0) != rewrites
+        or record.get("folded", 0) > len(entries)
+        or (record.get("folded") and record.get("digest") != _history_entry_digest(entries[record["folded"] - 1]))
+    ):
+        record = _new_timeline_record()
+
+    new_entries = entries[record["folded"]:]
+    if new_entries:
+        _fold_history_changes(record, filter_history_entries(new_entries, anonymize=False))
+        record["folded"] = len(entries)
+        record["digest"] = _history_entry_digest(entries[-1])
+    record["history_signature"] = signature
+    record["rewrites"] = rewrites
+    orders[reference] = record
+    _save_timeline_index(index)
+    return record
+
+
+def _materialize_timeline_record(
+    record: Dict[str, Any],
+    startdate: Any,
+    translate: bool = True,
+) -> List[Dict[str, Any]]:
+    timeline = materialize_timeline_record(record, startdate, history_module.SHARE_MODE)
+    if translate:
+        for entry in timeline:
+            if entry.pop("removed", False):
+                entry["value"] = t("removed")
+    return timeline
+
+
+def _get_timeline_from_history_uncached(order_reference: str, startdate) -> List[Dict[str, Any]]:
     # history liefert bereits Einträge mit timestamp/key/value (übersetzbar in history.py)
     history = get_history_of_order(order_reference)
     timeline = []
@@ -68,7 +187,7 @@ def get_timeline_from_history(order_reference: str, startdate) -> List[Dict[str,
         value = entry.get("value")
         old_value = entry.get("old_value")
 
-        if key_normalized == normalize_str("Vehicle Odometer"):
+        if key_normalized == _ODOMETER_KEY:
             if new_car or value in [None, "", "N/A"]:
                 continue
             timeline.append(
@@ -76,20 +195,15 @@ def get_timeline_from_history(order_reference: str, startdate) -> List[Dict[str,
                    "timestamp": entry["timestamp"],
                    "key": "CAR BUILT",
                    "value": "",
+                   "epoch": entry.get("epoch"),
                 }
             )
             new_car = True
             continue
 
-        if key_normalized == normalize_str("Delivery Window") and first_delivery_window:
+        if key_normalized == _DELIVERY_WINDOW_KEY and first_delivery_window:
             if old_value not in ['None', 'N/A', '']:
-                timeline.append(
-                    {
-                       "timestamp": startdate,
-                       "key": "Delivery Window",
-                       "value": old_value,
-                    }
-                )
+                timeline.append(_timeline_entry(startdate, "Delivery Window", old_value))
                 first_delivery_window = False
 
         if old_value != "" and value == "":
@@ -101,76 +215,30 @@ def get_timeline_from_history(order_reference: str, startdate) -> List[Dict[str,
         timeline.append(entry)
     return _sort_timeline_entries(timeline)
 
-def get_timeline_from_order(order_reference: str, detailed_order: Dict[str, Any]) -> List[Dict[str, Any]]:
-    timeline: List[Dict[str, Any]] = []
-
-    order_details = detailed_order.get("details", {})
-    tasks = order_details.get("tasks", {})
-    scheduling = tasks.get('scheduling', {})
-    registration_data = tasks.get("registration", {})
-    order_info = registration_data.get("orderDetails", {})
-    final_payment_data = tasks.get("finalPayment", {}).get("data", {})
-
-    if order_info.get("reservationDate"):
-        timeline.append(
-            {
-                "timestamp": get_date_from_timestamp(order_info.get("reservationDate")),
-                "key": "Reservation",
-                "value": "",
-            }
-        )
-
-    if order_info.get("orderBookedDate"):
-        timeline.append(
-            {
-                "timestamp": get_date_from_timestamp(order_info.get("orderBookedDate")),
-                "key": "Order Booked",
-                "value": "",
-            }
-        )
-
-    timeline_from_history = get_timeline_from_history(order_reference, get_date_from_timestamp(order_info.get("reservationDate")))
-
-    if scheduling.get('deliveryWindowDisplay'):
-        if not is_order_key_in_timeline(timeline_from_history, 'Delivery Window'):
-            timeline.append(
-                {
-                    "timestamp": get_date_from_timestamp(order_info.get("orderBookedDate")),
-                    "key": "Delivery Window",
-                    "value": scheduling.get('deliveryWindowDisplay'),
-                }
-            )
 
+def get_timeline_from_history(order_reference: str, startdate) -> List[Dict[str, Any]]:
+    if ALL_KEYS_MODE:
+        # --all keeps raw history keys, which the index does not cover
+        return _get_timeline_from_history_uncached(order_reference, startdate)
+    record = _get_timeline_record(order_reference)
+    return _sort_timeline_entries(_materialize_timeline_record(record, startdate))
 
-    if registration_data.get('expectedRegDate'):
-        if not is_order_key_in_timeline(timeline_from_history, 'Expected Registration Date'):
-            timeline.append(
-                {
-                    "timestamp": get_date_from_timestamp(registration_data.get("expectedRegDate")),
-                    "key": "Expected Registration Date",
-                    "value": "",
-                }
-            )
-        
-    if final_payment_data.get('etaToDeliveryCenter'):
-        if not is_order_key_in_timeline(timeline_from_history, 'ETA To Delivery Center'):
-            timeline.append(
-                {
-                    "timestamp": get_date_from_timestamp(final_payment_data.get("etaToDeliveryCenter")),
-                    "key": "ETA To Delivery Center",
-                    "value": "",
-                }
-            )
-        
-    appointment_display = get_delivery_appointment_display(tasks)
-    if appointment_display:
-        if not is_order_key_in_timeline(timeline_from_history, 'Delivery Appointment Date'):
-            timeline.append({
-                "timestamp": appointment_display,
-                "key": "Delivery Appointment Date",
-                "value": "",
-            })
+def get_timeline_from_order(
+    order_reference: str,
+    detailed_order: Dict[str, Any],
+    translate: bool = True,
+) -> List[Dict[str, Any]]:
+    startdate = get_order_startdate(detailed_order)
+    if ALL_KEYS_MODE:
+        timeline_from_history = _get_timeline_from_history_uncached(order_reference, startdate)
+        history_keys = {normalize_str(entry.get("key")) for entry in timeline_from_history}
+    else:
+        record = _get_timeline_record(order_reference)
+        timeline_from_history = _materialize_timeline_record(record, startdate, translate)
+        history_keys = record["keys"]
 
+    timeline = order_timeline_entries(detailed_order, history_keys)
+    # order-derived entries precede history entries on equal timestamps
     timeline.extend(timeline_from_history)
     return _sort_timeline_entries(timeline)
 
@@ -0,0 +1,92 @@
+"""Shared, memoized timestamp parsing.
+
+Tesla payloads and the local history use a mix of ISO-8601 flavours
+(``Z`` suffix, offsets, space instead of ``T``, fractional seconds) and
+the same strings are parsed over and over while rendering. Every helper
+that needs a ``datetime`` goes through :func:`parse_timestamp_raw`, which
+is tolerant and backed by a bounded LRU cache.
+"""
+
+from __future__ import annotations
+
+import calendar
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Optional
+
+PARSE_CACHE_SIZE = 4096
+
+_FALLBACK_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S.%f",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%dT%H:%M",
+)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(value: str) -> Optional[datetime]:
+    normalized = value.strip()
+    if not normalized or normalized.upper() == "N/A":
+        return None
+    if normalized.endswith(("Z", "z")):
+        normalized = normalized[:-1] + "+00:00"
+    if "T" not in normalized and len(normalized) >= 16 and normalized[10] == " ":
+        normalized = normalized[:10] + "T" + normalized[11:]
+    try:
+        return datetime.fromisoformat(normalized)
+    except ValueError:
+        pass
+    for fmt in _FALLBACK_FORMATS:
+        try:
+            return datetime.strptime(normalized, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def parse_timestamp_raw(value: Any) -> Optional[datetime]:
+    """Return *value* parsed as ``datetime`` keeping its original offset.
+
+    Non-strings and unparsable values yield ``None``.
+    """
+    if not isinstance(value, str):
+        return None
+    return _parse_cached(value)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_utc_naive_cached(value: str) -> Optional[datetime]:
+    dt = _parse_cached(value)
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Return *value* as naive UTC ``datetime`` (offsets are converted)."""
+    if not isinstance(value, str):
+        return None
+    return _parse_utc_naive_cached(value)
+
+
+def parse_timestamp_utc(value: Any) -> Optional[datetime]:
+    """Return *value* as timezone-aware UTC ``datetime``; naive input counts as UTC."""
+    dt = parse_timestamp(value)
+    if dt is None:
+        return None
+    return dt.replace(tzinfo=timezone.utc)
+
+
+def timestamp_epoch(value: Any) -> Optional[float]:
+    """Return epoch seconds for *value* (naive timestamps count as UTC)."""
+    dt = parse_timestamp(value)
+    if dt is None:
+        return None
+    return calendar.timegm(dt.timetuple()) + dt.microsecond / 1_000_000
+
+
+def clear_timestamp_cache() -> None:
+    _parse_cached.cache_clear()
+    _parse_utc_naive_cached.cache_clear()
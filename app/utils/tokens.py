@@ -0,0 +1,187 @@
+"""Tesla OAuth tokens without command line side effects.
+
+Nothing in here parses the command line, prints or exits, so the tool
+(:mod:`app.utils.auth`) and long-running users of :mod:`app.client` share
+the same token file, expiry cache, refresh lock and background refresh.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import requests
+
+from app.config import PRIVATE_DIR, TESLA_BASE_URLS, TOKEN_FILE
+from app.utils.filelock import FileLock
+
+CLIENT_ID = 'ownerapi'
+TOKEN_REFRESH_SKEW = 300  # seconds before expiry
+TOKEN_RETRY_INTERVAL = 60
+TOKEN_LOCK_FILE = PRIVATE_DIR / 'tesla_tokens.lock'
+TOKEN_LOCK_TIMEOUT = 30
+TOKEN_LOCK_STALE = 120
+
+
+def decode_token_expiry(access_token: Any) -> Optional[float]:
+    """Return the ``exp`` claim of the JWT *access_token* or ``None``."""
+    try:
+        payload = access_token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload).decode('utf-8'))['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def load_tokens(path: Path = TOKEN_FILE) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_tokens(tokens: Dict[str, Any], path: Path = TOKEN_FILE) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(tokens, f)
+    tmp.replace(path)
+
+
+class TokenManager:
+    """Keeps the Tesla tokens fresh.
+
+    The parsed JWT expiry is cached as ``expires_at`` in the token file so it
+    is decoded only once. Tokens are refreshed *skew* seconds ahead of
+    expiry. Concurrent processes serialize refreshes through a lock file and
+    pick up the tokens another process just wrote. Long-running callers keep
+    the tokens fresh with :meth:`start_background_refresh`; failed refreshes
+    raise ``requests`` exceptions.
+    """
+
+    def __init__(
+        self,
+        tokens: Optional[Dict[str, Any]] = None,
+        skew: int = TOKEN_REFRESH_SKEW,
+        *,
+        token_file: Path = TOKEN_FILE,
+        lock_file: Path = TOKEN_LOCK_FILE,
+        auth_url: str = TESLA_BASE_URLS['auth'],
+        timeout: float = 30.0,
+    ):
+        self.token_file = token_file
+        self.lock_file = lock_file
+        self.auth_url = auth_url.rstrip('/')
+        self.timeout = timeout
+        self._tokens: Dict[str, Any] = tokens if tokens is not None else load_tokens(token_file)
+        self._skew = skew
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # validate required keys early (KeyError is handled by the caller)
+        self._tokens['access_token']
+        self._tokens['refresh_token']
+        if self.ensure_expiry(self._tokens):
+            self._save(self._tokens, quiet=True)
+
+    @staticmethod
+    def ensure_expiry(tokens: Dict[str, Any]) -> bool:
+        """Cache the JWT expiry in *tokens*; returns True if it had to be added."""
+        cached = tokens.get('expires_at')
+        if isinstance(cached, (int, float)):
+            return False
+        tokens['expires_at'] = decode_token_expiry(tokens.get('access_token'))
+        return True
+
+    def _request_refresh(self, refresh_token: str) -> Dict[str, Any]:
+        response = requests.post(
+            f"{self.auth_url}/oauth2/v3/token",
+            json={'grant_type': 'refresh_token', 'client_id': CLIENT_ID, 'refresh_token': refresh_token},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def _save(self, tokens: Dict[str, Any], quiet: bool) -> None:
+        save_tokens(tokens, self.token_file)
+
+    @property
+    def access_token(self) -> str:
+        return self._tokens['access_token']
+
+    @property
+    def expires_at(self) -> Optional[float]:
+        return self._tokens.get('expires_at')
+
+    def is_expired(self, now: Optional[float] = None) -> bool:
+        expires_at = self.expires_at
+        return expires_at is None or expires_at <= (time.time() if now is None else now)
+
+    def needs_refresh(self, now: Optional[float] = None) -> bool:
+        expires_at = self.expires_at
+        now = time.time() if now is None else now
+        return expires_at is None or expires_at - self._skew <= now
+
+    def get_access_token(self) -> str:
+        """Return a current access token, refreshing first if it is due."""
+        if self.needs_refresh():
+            self.refresh()
+        return self.access_token
+
+    def refresh(self) -> str:
+        with self._lock, FileLock(self.lock_file, TOKEN_LOCK_TIMEOUT, TOKEN_LOCK_STALE):
+            # another process may have refreshed while we waited for the lock
+            try:
+                on_disk = load_tokens(self.token_file)
+                self.ensure_expiry(on_disk)
+                if on_disk.get('refresh_token') and (on_disk.get('expires_at') or 0) > (self.expires_at or 0):
+                    self._tokens = on_disk
+            except (OSError, ValueError):
+                pass
+            if not self.needs_refresh():
+                return self.access_token
+
+            token_response = self._request_refresh(self._tokens['refresh_token'])
+            tokens = dict(self._tokens)
+            tokens['access_token'] = token_response['access_token']
+            if token_response.get('refresh_token'):
+                # Tesla may rotate the refresh token; the old one stops working
+                tokens['refresh_token'] = token_response['refresh_token']
+            for key in ('id_token', 'expires_in', 'token_type'):
+                if key in token_response:
+                    tokens[key] = token_response[key]
+            tokens['expires_at'] = decode_token_expiry(tokens['access_token'])
+            if tokens['expires_at'] is None and isinstance(token_response.get('expires_in'), (int, float)):
+                tokens['expires_at'] = time.time() + token_response['expires_in']
+            self._save(tokens, quiet=self._thread is not None)
+            self._tokens = tokens
+            return self.access_token
+
+    def start_background_refresh(self) -> None:
+        """Refresh the tokens in a daemon thread shortly before they expire."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop_background_refresh(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop.is_set():
+            expires_at = self.expires_at or 0
+            wait = max(expires_at - self._skew - time.time(), 0)
+            if self._stop.wait(wait):
+                return
+            try:
+                self.refresh()
+            except Exception:
+                # keep the current token and retry later; the next API call reports real errors
+                if self._stop.wait(TOKEN_RETRY_INTERVAL):
+                    return
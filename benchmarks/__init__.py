@@ -0,0 +1,4 @@
+"""Benchmarks for the hot paths of the Tesla order status tool.
+
+Run ``python -m benchmarks --help`` from the repository root.
+"""
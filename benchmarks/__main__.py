@@ -0,0 +1,168 @@
+"""Command line interface of the benchmark suite.
+
+    python -m benchmarks run [--orders N] [--entries N] [--depth N] [--output FILE]
+    python -m benchmarks compare BASELINE [--current FILE] [--threshold PCT]
+    python -m benchmarks generate DIRECTORY [--orders N] [--entries N] [--depth N]
+
+``run`` works on synthetic data in a scratch directory, so the files in
+``data/private`` are never read or written by the measured code.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.synthetic import write_dataset
+
+DEFAULT_ORDERS = 20
+DEFAULT_ENTRIES = 50
+DEFAULT_DEPTH = 2
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 10.0
+
+
+def _parse_args(argv: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark the hot paths of the tool.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_size_arguments(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--orders", type=int, default=DEFAULT_ORDERS, help="number of synthetic orders")
+        command.add_argument("--entries", type=int, default=DEFAULT_ENTRIES, help="history entries per order")
+        command.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="nesting depth of extra payload data")
+        command.add_argument("--seed", type=int, default=1, help="seed of the data generator")
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    add_size_arguments(run)
+    run.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timing repetitions per benchmark")
+    run.add_argument("--only", action="append", metavar="NAME", help="run only benchmarks starting with NAME")
+    run.add_argument("--output", type=Path, help="write the results as JSON (e.g. a baseline)")
+
+    compare = commands.add_parser("compare", help="compare results against a baseline")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("--current", type=Path, help="results to compare; runs the suite when omitted")
+    compare.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                         help="allowed slowdown or memory growth in percent (default %(default)s)")
+    compare.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+
+    generate = commands.add_parser("generate", help="write a synthetic data set into DIRECTORY")
+    generate.add_argument("directory", type=Path)
+    add_size_arguments(generate)
+    return parser.parse_args(argv)
+
+
+def _run(orders: int, entries: int, depth: int, seed: int, repeat: int, only: Optional[List[str]] = None) -> Dict[str, Any]:
+    # the app parses sys.argv on import, keep our own flags away from it
+    sys.argv = sys.argv[:1]
+    from benchmarks import cases
+
+    with tempfile.TemporaryDirectory(prefix="tost-bench-") as scratch:
+        private_dir = Path(scratch) / "private"
+        # write_dataset() already imports app modules, and some of them write
+        # settings or caches on import
+        cases.use_private_dir(private_dir)
+        dataset = write_dataset(private_dir, orders, entries, depth, seed)
+        results = cases.run_all(private_dir, dataset, repeat, only)
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "orders": orders,
+            "entries": entries,
+            "depth": depth,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+def _print_results(report: Dict[str, Any]) -> None:
+    meta = report["meta"]
+    print(f"{meta['orders']} orders x {meta['entries']} history entries, depth {meta['depth']} (Python {meta['python']})")
+    width = max((len(name) for name in report["results"]), default=10)
+    for name, result in report["results"].items():
+        print(f"{name:<{width}}  {_format_seconds(result['seconds']):>10}  {result['peak_bytes'] / 1024:>9.1f} KiB")
+
+
+def _compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    sizes = ("orders", "entries", "depth", "seed")
+    if any(baseline["meta"].get(key) != current["meta"].get(key) for key in sizes):
+        print("Warning: baseline and current results use different data sizes", file=sys.stderr)
+    limit = 1 + threshold / 100
+    regressions = 0
+    width = max((len(name) for name in current["results"]), default=10)
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            print(f"{name:<{width}}  {_format_seconds(result['seconds']):>10}  (new)")
+            continue
+        time_ratio = result["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        memory_ratio = result["peak_bytes"] / base["peak_bytes"] if base["peak_bytes"] else 1.0
+        flags = []
+        if time_ratio > limit:
+            flags.append("SLOWER")
+        if memory_ratio > limit:
+            flags.append("MORE MEMORY")
+        regressions += bool(flags)
+        print(
+            f"{name:<{width}}  {_format_seconds(base['seconds']):>10} -> {_format_seconds(result['seconds']):>10}"
+            f"  {(time_ratio - 1) * 100:+7.1f} %  mem {(memory_ratio - 1) * 100:+7.1f} %"
+            f"  {' '.join(flags)}"
+        )
+    for name in baseline["results"]:
+        if name not in current["results"]:
+            print(f"{name:<{width}}  (missing)")
+    if regressions:
+        print(f"\n{regressions} regression(s) above {threshold:g} %")
+        return 1
+    print(f"\nNo regressions above {threshold:g} %")
+    return 0
+
+
+def _load_report(path: Path) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command == "generate":
+        write_dataset(args.directory, args.orders, args.entries, args.depth, args.seed)
+        print(f"Synthetic data written to {args.directory}")
+        return 0
+
+    if args.command == "run":
+        report = _run(args.orders, args.entries, args.depth, args.seed, args.repeat, args.only)
+        _print_results(report)
+        if args.output:
+            args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+            print(f"Results written to {args.output}")
+        return 0
+
+    baseline = _load_report(args.baseline)
+    if args.current:
+        current = _load_report(args.current)
+    else:
+        meta = baseline["meta"]
+        current = _run(meta["orders"], meta["entries"], meta["depth"], meta.get("seed", 1), args.repeat)
+    return _compare(baseline, current, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
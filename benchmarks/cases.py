@@ -0,0 +1,177 @@
+"""The measured hot paths.
+
+Every case is a zero-argument callable built by a ``bench_*`` factory. The
+app modules keep their file locations in module-level constants, so
+``use_private_dir`` points every path below ``data/private`` to the
+scratch directory before any other app module is imported.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import gc
+import io
+import sys
+import timeit
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.synthetic import mutate_orders, option_catalogue
+
+MIN_TIMING_SECONDS = 0.2
+
+Case = Callable[[], Any]
+
+
+def use_private_dir(private_dir: Path) -> None:
+    import app.config as config
+
+    original = config.PRIVATE_DIR
+    for name, module in list(sys.modules.items()):
+        if not (name == "app" or name.startswith("app.")) or module is None:
+            continue
+        for attribute, value in list(vars(module).items()):
+            if isinstance(value, Path) and (value == original or original in value.parents):
+                setattr(module, attribute, private_dir / value.relative_to(original))
+    config.cfg._path = private_dir / config.SETTINGS_FILE.name
+    config.cfg.load()
+
+
+def _prepare(private_dir: Path) -> None:
+    # first, so the modules imported below already see the scratch directory
+    use_private_dir(private_dir)
+
+    import app.utils.option_codes as option_codes
+    import app.utils.orders as orders
+    from app.utils.migration import invalidate_derived_caches
+    from app.utils.shards import import_single_files
+
+    # the data set is written in the single-file layout, store it per order like the migration does
+    import_single_files()
+    # no clipboard and no network: decode against the synthetic catalogue
+    orders.HAS_PYPERCLIP = False
+    option_codes._OPTION_CODES = option_catalogue()
+    invalidate_derived_caches()
+
+
+def build_cases(dataset: Dict[str, Any]) -> Dict[str, Case]:
+    from app.config import HISTORY_COMPACTION_DEFAULTS
+    from app.utils.compaction import compact_entries
+    from app.utils.helpers import compare_dicts, decode_option_codes
+    from app.utils.history import get_history_of_order, load_history_from_file, save_history_to_file
+    from app.utils.orders import (
+        _compare_orders,
+        _load_orders_from_file,
+        _save_orders_to_file,
+        display_orders,
+        generate_share_output,
+        get_order,
+    )
+    from app.utils.orderdata import project_orders
+    from app.utils.timeline import get_timeline_from_order
+
+    orders = dataset["orders"]
+    changed = mutate_orders(orders)
+    history = dataset["history"]
+    first_reference = next(iter(orders), None)
+    silent = contextlib.redirect_stdout
+
+    def bench_compare_dicts() -> None:
+        for reference, order in orders.items():
+            compare_dicts(order, changed[reference])
+
+    def bench_compare_orders() -> None:
+        _compare_orders(orders, changed)
+
+    def bench_project_orders() -> None:
+        project_orders(changed)
+
+    def bench_history_of_order() -> None:
+        get_history_of_order(first_reference)
+
+    def bench_compact_history() -> None:
+        for entries in history.values():
+            compact_entries(entries, HISTORY_COMPACTION_DEFAULTS)
+
+    def bench_timeline_from_order() -> None:
+        for reference, order in orders.items():
+            get_timeline_from_order(reference, order)
+
+    def bench_decode_option_codes() -> None:
+        for order in orders.values():
+            decode_option_codes(order["order"]["mktOptions"])
+
+    def bench_display_orders() -> None:
+        with silent(io.StringIO()):
+            display_orders(orders)
+
+    def bench_share_output() -> None:
+        generate_share_output(orders)
+
+    def bench_load_orders() -> None:
+        _load_orders_from_file()
+
+    def bench_load_order() -> None:
+        get_order(first_reference)
+
+    def bench_save_orders() -> None:
+        with silent(io.StringIO()):
+            _save_orders_to_file(orders)
+
+    def bench_load_history() -> None:
+        load_history_from_file()
+
+    def bench_save_history() -> None:
+        save_history_to_file(history)
+
+    return {
+        "compare_dicts": bench_compare_dicts,
+        "compare_orders": bench_compare_orders,
+        "project_orders": bench_project_orders,
+        "history.get_history_of_order": bench_history_of_order,
+        "history.compact": bench_compact_history,
+        "timeline.get_timeline_from_order": bench_timeline_from_order,
+        "decode_option_codes": bench_decode_option_codes,
+        "display_orders": bench_display_orders,
+        "generate_share_output": bench_share_output,
+        "json.load_orders": bench_load_orders,
+        "json.load_order": bench_load_order,
+        "json.save_orders": bench_save_orders,
+        "json.load_history": bench_load_history,
+        "json.save_history": bench_save_history,
+    }
+
+
+def measure(case: Case, repeat: int) -> Dict[str, Any]:
+    """Return the best time per call and the peak traced allocation of one call."""
+    case()  # warm caches, the first run of the tool is not what we compare
+    timer = timeit.Timer(case)
+    number, elapsed = timer.autorange()
+    if elapsed < MIN_TIMING_SECONDS:
+        number = max(1, int(number * MIN_TIMING_SECONDS / max(elapsed, 1e-9)))
+    timings = [total / number for total in timer.repeat(repeat=max(1, repeat), number=number)]
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        case()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": min(timings),
+        "mean_seconds": sum(timings) / len(timings),
+        "loops": number,
+        "peak_bytes": peak,
+    }
+
+
+def run_all(private_dir: Path, dataset: Dict[str, Any], repeat: int, only: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    _prepare(private_dir)
+    results = {}
+    for name, case in build_cases(dataset).items():
+        if only and not any(name.startswith(prefix) for prefix in only):
+            continue
+        results[name] = measure(case, repeat)
+    return results
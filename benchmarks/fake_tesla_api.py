@@ -0,0 +1,372 @@
+"""Local stand-in for the Tesla owner, tasks and auth APIs.
+
+Serves synthetic orders from :mod:`benchmarks.synthetic`, mints JWT access
+tokens with a configurable lifetime and can inject latency, 429 and 5xx
+responses. It also serves the option code catalogue, in full or as the
+changes since a ``since`` timestamp (see ``app.utils.option_codes``).
+Start it and point the tool at it::
+
+    python -m benchmarks.fake_tesla_api --port 8765 --orders 300 --latency 50 --error-rate 0.05
+    TOST_OWNER_API_URL=http://127.0.0.1:8765 TOST_TASKS_API_URL=http://127.0.0.1:8765 \\
+    TOST_AUTH_URL=http://127.0.0.1:8765 TOST_OPTION_CODES_URL=http://127.0.0.1:8765 python tesla_order_status.py
+
+The login flow works as usual: the authorize page redirects straight to the
+callback URL carrying a code, which can be pasted back into the tool.
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.synthetic import OPTION_CODES, generate_orders
+
+DEFAULT_PORT = 8765
+DEFAULT_TOKEN_TTL = 8 * 3600
+OPTION_CODES_PATH = "/get/option_codes.php"
+OPTION_CODES_SCHEMA = "3"
+
+
+def _now() -> str:
+    # fixed width, so the timestamps compare as strings
+    return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64url_decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class FakeTeslaState:
+    """Data, token secret, fault settings and request counters of one server."""
+
+    def __init__(
+        self,
+        orders: int = 10,
+        depth: int = 2,
+        seed: int = 1,
+        token_ttl: int = DEFAULT_TOKEN_TTL,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        catalogue_delta: bool = True,
+    ):
+        self.orders = generate_orders(orders, depth, seed)
+        self.option_codes: Dict[str, Dict[str, Any]] = OrderedDict(
+            (code, {"code": code, "label_en": label, "category": category})
+            for code, (label, category) in OPTION_CODES.items()
+        )
+        self.catalogue_delta = catalogue_delta
+        # deltas are only served for states this server has seen
+        self.catalogue_since = _now()
+        self.option_code_changes: List[Tuple[str, str, str]] = []
+        self.token_ttl = token_ttl
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.secret = os.urandom(32)
+        self.refresh_tokens: Dict[str, str] = {}
+        self.stats: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + amount
+
+    def roll(self) -> Tuple[float, Optional[int]]:
+        """Return the delay in seconds and an injected status code (or None)."""
+        with self._lock:
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            draw = self._random.random()
+        if draw < self.rate_limit_rate:
+            return delay, 429
+        if draw < self.rate_limit_rate + self.error_rate:
+            return delay, 503
+        return delay, None
+
+    # -- tokens ----------------------------------------------------------
+    def mint_access_token(self, subject: str) -> str:
+        now = int(time.time())
+        header = _b64url(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+        payload = _b64url(json.dumps({
+            "iss": "fake-tesla-api",
+            "sub": subject,
+            "aud": "ownerapi",
+            "iat": now,
+            "exp": now + self.token_ttl,
+        }).encode())
+        signature = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+        return f"{header}.{payload}.{_b64url(signature)}"
+
+    def verify_access_token(self, token: str) -> bool:
+        try:
+            header, payload, signature = token.split(".")
+            expected = hmac.new(self.secret, f"{header}.{payload}".encode(), hashlib.sha256).digest()
+            if not hmac.compare_digest(expected, _b64url_decode(signature)):
+                return False
+            return json.loads(_b64url_decode(payload))["exp"] > time.time()
+        except (ValueError, KeyError, TypeError):
+            return False
+
+    def issue_tokens(self, subject: str) -> Dict[str, Any]:
+        refresh_token = _b64url(os.urandom(24))
+        with self._lock:
+            self.refresh_tokens[refresh_token] = subject
+        return {
+            "access_token": self.mint_access_token(subject),
+            "refresh_token": refresh_token,
+            "id_token": self.mint_access_token(subject),
+            "expires_in": self.token_ttl,
+            "token_type": "Bearer",
+        }
+
+    def issue_code(self) -> str:
+        code = _b64url(os.urandom(16))
+        with self._lock:
+            self.refresh_tokens[f"code:{code}"] = "user"
+        return code
+
+    def redeem_code(self, code: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            subject = self.refresh_tokens.pop(f"code:{code}", None)
+        return None if subject is None else self.issue_tokens(subject)
+
+    def rotate_refresh_token(self, refresh_token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            subject = self.refresh_tokens.pop(refresh_token, None)
+        return None if subject is None else self.issue_tokens(subject)
+
+    # -- option codes ----------------------------------------------------
+    def set_option_code(self, code: str, label: Optional[str] = None, category: Optional[str] = None) -> None:
+        """Add or change *code* in the catalogue; without *label* it is removed."""
+        with self._lock:
+            exists = code in self.option_codes
+            if label is None:
+                if not exists:
+                    return
+                del self.option_codes[code]
+                operation = "removed"
+            else:
+                self.option_codes[code] = {"code": code, "label_en": label, "category": category}
+                operation = "changed" if exists else "added"
+            self.option_code_changes.append((_now(), code, operation))
+
+    def option_codes_payload(self, since: Optional[str], schema: Optional[str]) -> Dict[str, Any]:
+        """Return the catalogue, or only its changes after *since* if that state is known."""
+        with self._lock:
+            now = _now()
+            if not (
+                self.catalogue_delta
+                and since
+                and schema == OPTION_CODES_SCHEMA
+                and self.catalogue_since <= since <= now
+            ):
+                return {"ok": True, "fetched_at": now, "option_codes": list(self.option_codes.values())}
+            # operation of the first change after *since* per code, in catalogue order
+            first: Dict[str, str] = {}
+            for changed_at, code, operation in self.option_code_changes:
+                if changed_at > since:
+                    first.setdefault(code, operation)
+            payload: Dict[str, Any] = {
+                "ok": True,
+                "delta": True,
+                "since": since,
+                "fetched_at": now,
+                "added": [],
+                "changed": [],
+                "removed": [],
+            }
+            for code, operation in first.items():
+                if code in self.option_codes:
+                    payload["added" if operation == "added" else "changed"].append(self.option_codes[code])
+                elif operation != "added":
+                    payload["removed"].append(code)
+            return payload
+
+
+class FakeTeslaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeTeslaAPI/1.0"
+    state: FakeTeslaState
+
+    def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - signature of the base class
+        if self.server.verbose:  # type: ignore[attr-defined]
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self) -> bool:
+        """Sleep for the configured latency; returns True if an error was sent."""
+        delay, status = self.state.roll()
+        if delay:
+            time.sleep(delay)
+        if status == 429:
+            self.state.count("injected_429")
+            self._send_json(429, {"error": "too many requests"}, {"Retry-After": "1"})
+            return True
+        if status is not None:
+            self.state.count("injected_5xx")
+            self._send_json(status, {"error": "service unavailable"})
+            return True
+        return False
+
+    def _authorized(self) -> bool:
+        auth = self.headers.get("Authorization", "")
+        if auth.startswith("Bearer ") and self.state.verify_access_token(auth[7:]):
+            return True
+        self.state.count("unauthorized")
+        self._send_json(401, {"error": "invalid or expired token"})
+        return False
+
+    def do_GET(self) -> None:  # noqa: N802 - http.server naming
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.state.count(f"GET {url.path}")
+
+        if url.path == "/__stats":
+            self._send_json(200, self.state.stats)
+            return
+        if url.path == "/oauth2/v3/authorize":
+            code = self.state.issue_code()
+            location = f"/void/callback?{urlencode({'code': code, 'state': query.get('state', [''])[0]})}"
+            self.send_response(302)
+            self.send_header("Location", location)
+            self.end_headers()
+            return
+        if url.path == "/void/callback":
+            self._send_json(404, {"error": "Page Not Found"})
+            return
+
+        if self._inject_faults():
+            return
+        if url.path == OPTION_CODES_PATH:
+            payload = self.state.option_codes_payload(query.get("since", [None])[0], query.get("schema", [None])[0])
+            self.state.count("option_codes delta" if payload.get("delta") else "option_codes full")
+            self.state.count("option_codes bytes", len(json.dumps(payload)))
+            self._send_json(200, payload)
+            return
+        if url.path == "/api/1/users/orders":
+            if self._authorized():
+                self._send_json(200, {"response": [order["order"] for order in self.state.orders.values()]})
+            return
+        if url.path == "/tasks":
+            if self._authorized():
+                reference = query.get("referenceNumber", [""])[0]
+                order = self.state.orders.get(reference)
+                if order is None:
+                    self._send_json(404, {"error": "unknown reference"})
+                else:
+                    self._send_json(200, order["details"])
+            return
+        self._send_json(404, {"error": "not found"})
+
+    def do_POST(self) -> None:  # noqa: N802 - http.server naming
+        url = urlparse(self.path)
+        self.state.count(f"POST {url.path}")
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        if url.path != "/oauth2/v3/token":
+            self._send_json(404, {"error": "not found"})
+            return
+        if self._inject_faults():
+            return
+        try:
+            form = json.loads(raw or b"{}")
+        except ValueError:
+            form = {key: values[0] for key, values in parse_qs(raw.decode("utf-8")).items()}
+
+        grant_type = form.get("grant_type")
+        if grant_type == "authorization_code":
+            tokens = self.state.redeem_code(str(form.get("code")))
+            if tokens is None:
+                self._send_json(400, {"error": "invalid_grant"})
+                return
+            self._send_json(200, tokens)
+            return
+        if grant_type == "refresh_token":
+            tokens = self.state.rotate_refresh_token(str(form.get("refresh_token")))
+            if tokens is None:
+                self._send_json(401, {"error": "invalid_grant"})
+                return
+            self._send_json(200, tokens)
+            return
+        self._send_json(400, {"error": "unsupported_grant_type"})
+
+
+def make_server(state: FakeTeslaState, host: str = "127.0.0.1", port: int = DEFAULT_PORT, verbose: bool = False) -> ThreadingHTTPServer:
+    """Return a threaded server bound to *host*:*port* (0 picks a free port)."""
+    handler = type("BoundFakeTeslaHandler", (FakeTeslaHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.verbose = verbose  # type: ignore[attr-defined]
+    return server
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.fake_tesla_api", description="Local stand-in Tesla API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--orders", type=int, default=10, help="number of generated orders")
+    parser.add_argument("--depth", type=int, default=2, help="nesting depth of extra payload data")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--token-ttl", type=int, default=DEFAULT_TOKEN_TTL, help="access token lifetime in seconds")
+    parser.add_argument("--latency", type=float, default=0.0, help="added latency per request in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random latency variation in ms")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--no-catalogue-delta", action="store_true", help="always serve the full option code catalogue")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    state = FakeTeslaState(
+        orders=args.orders,
+        depth=args.depth,
+        seed=args.seed,
+        token_ttl=args.token_ttl,
+        latency_ms=args.latency,
+        jitter_ms=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit,
+        catalogue_delta=not args.no_catalogue_delta,
+    )
+    server = make_server(state, args.host, args.port, args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Fake Tesla API with {len(state.orders)} orders on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(state.stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
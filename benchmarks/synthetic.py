@@ -0,0 +1,163 @@
+"""Synthetic orders and histories shaped like the Tesla API payloads.
+
+The generator is deterministic for a given seed, so two benchmark runs
+with the same parameters work on identical data.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+MODELS = ("MDLY", "MDL3", "MDLS", "MDLX")
+OPTION_CODES = {
+    "MTY47": ("Model Y Long Range Dual Motor - AWD LR (Juniper)", "models"),
+    "MT353": ("Model 3 Long Range Dual Motor - AWD LR", "models"),
+    "PPSB": ("Deep Blue Metallic", "paints"),
+    "PPSW": ("Pearl White Multi-Coat", "paints"),
+    "PN01": ("Stealth Grey", "paints"),
+    "IPB8": ("Black Interior", "interiors"),
+    "IPW8": ("Black and White Interior", "interiors"),
+    "WY19P": ("19'' Gemini Wheels", "wheels"),
+    "APBS": ("Autopilot", "autopilot"),
+    "CPF0": ("Standard Connectivity", None),
+}
+STATUSES = ("BOOKED", "ORDERED", "IN_TRANSIT", "DELIVERED")
+DELIVERY_CENTERS = ("Hanau", "Berlin", "München", "Warszawa", "Stockholm")
+
+
+def option_catalogue() -> Dict[str, Dict[str, Any]]:
+    """Option code catalogue in the format of ``option_codes_cache.json``."""
+    return {
+        code: {"label": label, **({"category": category} if category else {})}
+        for code, (label, category) in OPTION_CODES.items()
+    }
+
+
+def _nested_payload(rng: random.Random, depth: int, width: int = 3) -> Dict[str, Any]:
+    if depth <= 0:
+        return {f"field{i}": rng.choice(("a", "b", 1, 2.5, None, True)) for i in range(width)}
+    return {f"level{depth}_{i}": _nested_payload(rng, depth - 1, width) for i in range(width)}
+
+
+def generate_order(rng: random.Random, index: int, depth: int = 2) -> Dict[str, Any]:
+    """Return one ``{order, details}`` record like ``_get_all_orders`` builds it."""
+    reference = f"RN{100000000 + index}"
+    booked = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(days=rng.randint(0, 300), minutes=rng.randint(0, 1440))
+    eta = booked + timedelta(days=rng.randint(20, 90), hours=rng.randint(0, 23))
+    options = [rng.choice(MODELS)] + rng.sample(sorted(OPTION_CODES), 5)
+    return {
+        "order": {
+            "referenceNumber": reference,
+            "orderStatus": rng.choice(STATUSES),
+            "mktOptions": ",".join(options),
+            "vin": None if rng.random() < 0.5 else f"LRW{rng.randint(10**13, 10**14 - 1)}",
+            "locale": rng.choice(("de_DE", "en_US", "pl_PL", "sv_SE")),
+        },
+        "details": {
+            "tasks": {
+                "scheduling": {
+                    "deliveryWindowDisplay": f"{rng.randint(1, 15)} - {rng.randint(16, 30)} September",
+                    "deliveryAddressTitle": rng.choice(DELIVERY_CENTERS),
+                    "strings": {"title": "Schedule Delivery", "subtitle": f"Step {rng.randint(1, 5)}"},
+                },
+                "registration": {
+                    "expectedRegDate": eta.strftime("%Y-%m-%dT00:00:00"),
+                    "orderDetails": {
+                        "reservationDate": booked.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        "orderBookedDate": (booked + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+                        "vehicleRoutingLocation": rng.randint(1, 500),
+                        "vehicleOdometer": rng.choice((30, 12, 8)),
+                        "vehicleOdometerType": "KM",
+                    },
+                },
+                "finalPayment": {
+                    "data": {
+                        "etaToDeliveryCenter": eta.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "financingIntent": rng.random() < 0.5,
+                        "amountDue": rng.randint(0, 60000),
+                    },
+                },
+                "extra": _nested_payload(rng, depth),
+            },
+        },
+    }
+
+
+def generate_orders(count: int, depth: int = 2, seed: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Return *count* orders keyed by reference number."""
+    rng = random.Random(seed)
+    orders = (generate_order(rng, index, depth) for index in range(count))
+    return {order["order"]["referenceNumber"]: order for order in orders}
+
+
+def _mutate(rng: random.Random, node: Dict[str, Any], rate: float) -> None:
+    for key, value in list(node.items()):
+        if isinstance(value, dict):
+            _mutate(rng, value, rate)
+        elif rng.random() < rate:
+            node[key] = f"{value}*" if isinstance(value, str) else rng.randint(0, 10**6)
+
+
+def mutate_orders(orders: Dict[str, Dict[str, Any]], rate: float = 0.05, seed: int = 2) -> Dict[str, Dict[str, Any]]:
+    """Return a copy of *orders* with roughly *rate* of all leaf values changed."""
+    rng = random.Random(seed)
+    copied = json.loads(json.dumps(orders))
+    for order in copied.values():
+        _mutate(rng, order, rate)
+    return copied
+
+
+def generate_history(orders: Dict[str, Dict[str, Any]], entries: int, seed: int = 3) -> Dict[str, List[Dict[str, Any]]]:
+    """Return a history with *entries* change sets per order, oldest first."""
+    rng = random.Random(seed)
+    keys = (
+        "details.tasks.scheduling.deliveryWindowDisplay",
+        "details.tasks.finalPayment.data.etaToDeliveryCenter",
+        "details.tasks.registration.expectedRegDate",
+        "details.tasks.scheduling.strings.subtitle",
+        "order.orderStatus",
+        "order.vin",
+    )
+    start = datetime(2025, 1, 1)
+    history: Dict[str, List[Dict[str, Any]]] = {}
+    for reference in orders:
+        day = start
+        order_entries = []
+        for index in range(entries):
+            day += timedelta(days=rng.randint(0, 3))
+            changes = []
+            for key in rng.sample(keys, rng.randint(1, 3)):
+                operation = rng.choice(("changed", "changed", "changed", "added", "removed"))
+                change = {"operation": operation, "key": key}
+                if operation != "added":
+                    change["old_value"] = f"value {index}"
+                if operation != "removed":
+                    change["value"] = f"value {index + 1}"
+                changes.append(change)
+            order_entries.append({"timestamp": day.strftime("%Y-%m-%d"), "changes": changes})
+        history[reference] = order_entries
+    return history
+
+
+def write_dataset(private_dir: Path, orders: int, entries: int, depth: int = 2, seed: int = 1) -> Dict[str, Any]:
+    """Write orders, history and an option code cache into *private_dir*."""
+    from app.utils.option_codes import SCHEMA_VERSION
+
+    private_dir.mkdir(parents=True, exist_ok=True)
+    order_map = generate_orders(orders, depth, seed)
+    history = generate_history(order_map, entries, seed + 2)
+    with open(private_dir / "tesla_orders.json", "w", encoding="utf-8") as f:
+        json.dump(order_map, f)
+    with open(private_dir / "tesla_order_history.json", "w", encoding="utf-8") as f:
+        json.dump(history, f)
+    with open(private_dir / "option_codes_cache.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            "schema_version": SCHEMA_VERSION,
+            "option_codes": option_catalogue(),
+        }, f)
+    return {"orders": order_map, "history": history}
@@ -2,9 +2,10 @@
 """Download and apply the latest project files without external dependencies.
 
 This script can be used as a fallback update mechanism if the regular
-auto-updater fails. It fetches the current ``main`` branch as a zip
-archive from GitHub, extracts it and copies the contents over the local
-installation.
+auto-updater fails. It streams the current ``main`` branch as a zip
+archive from GitHub to disk, extracts it and copies the contents over the
+local installation. The install manifest is removed afterwards so the
+regular updater rebuilds it from the fresh files.
 """
 
 import shutil
@@ -34,6 +35,9 @@ def _copytree_compat(src: Path, dst: Path) -> None:
 
 
 ZIP_URL = "https://github.com/chrisi51/tesla-order-status/archive/refs/heads/main.zip"
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+BASE_DIR = Path(__file__).resolve().parent
+MANIFEST_FILE = BASE_DIR / "data" / "private" / "install_manifest.json"
 
 
 def main() -> None:
@@ -50,24 +54,24 @@ def main() -> None:
 
     print("\nDownloading latest files...")
     try:
-        with urllib.request.urlopen(ZIP_URL, timeout=10) as resp:
-            data = resp.read()
-
         with tempfile.TemporaryDirectory() as tmpdir:
             tmp_path = Path(tmpdir)
             zip_path = tmp_path / "repo.zip"
-            zip_path.write_bytes(data)
+            with urllib.request.urlopen(ZIP_URL, timeout=10) as resp, open(zip_path, "wb") as f:
+                shutil.copyfileobj(resp, f, DOWNLOAD_CHUNK_SIZE)
 
             with zipfile.ZipFile(zip_path) as zf:
                 zf.extractall(tmp_path)
 
             extracted_dir = next(p for p in tmp_path.iterdir() if p.is_dir())
             for item in extracted_dir.iterdir():
-                target = Path('.') / item.name
+                target = BASE_DIR / item.name
                 if item.is_dir():
                     _copytree_compat(item, target)
                 else:
                     shutil.copy2(item, target)
+        if MANIFEST_FILE.exists():
+            MANIFEST_FILE.unlink()
         print("...Hotfix applied. Please rerun tesla_order_status.py")
         print("\nIf the problem persists, please create an issue including the complete output of tesla_order_status.py")
         print("GitHub Issues: https://github.com/chrisi51/tesla-order-status/issues")
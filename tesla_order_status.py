@@ -15,9 +15,32 @@ def main() -> None:
     from app.utils.migration import main as run_all_migrations
     run_all_migrations()
 
-    # Run check for updates
-    from app.update_check import main as run_update_check
-    run_update_check()
+    # Local location lookup, no network or login required
+    from app.utils.params import NEAREST_QUERY, NEAREST_RADIUS, NEAREST_LIMIT
+    if NEAREST_QUERY:
+        from app.utils.locations import main as run_location_query
+        run_location_query(NEAREST_QUERY, NEAREST_RADIUS, NEAREST_LIMIT)
+        return
+
+    # Local history query, no network or login required
+    from app.utils.params import HISTORY_QUERY
+    if HISTORY_QUERY is not None:
+        from app.utils.history_query import main as run_history_query
+        run_history_query(HISTORY_QUERY)
+        return
+
+    # History compaction, no network or login required
+    from app.utils.params import COMPACT_HISTORY
+    if COMPACT_HISTORY:
+        from app.utils.compaction import main as run_history_compaction
+        run_history_compaction()
+        return
+
+    # Run check for updates (replays and cached runs stay offline)
+    from app.utils.params import CACHED_MODE, REPLAY_FILE
+    if REPLAY_FILE is None and not CACHED_MODE:
+        from app.update_check import main as run_update_check
+        run_update_check()
 
     """Import and run the application modules."""
     from app.config import cfg as Config
@@ -25,7 +48,7 @@ def main() -> None:
     from app.utils.banner import display_banner
     from app.utils.helpers import generate_token
     from app.utils.orders import main as run_orders
-    from app.utils.params import STATUS_MODE
+    from app.utils.params import QUIET_MODE
     from app.utils.telemetry import ensure_telemetry_consent
 
 
@@ -36,9 +59,14 @@ def main() -> None:
         Config.set("fingerprint", generate_token(16, 32))
 
     ensure_telemetry_consent()
-    if not STATUS_MODE:
+    if CACHED_MODE:
+        # no banner, no login and no token refresh: the next online run catches up
+        run_orders(None)
+        return
+    if not QUIET_MODE:
         display_banner()
-    access_token = run_tesla_auth()
+    # replayed responses do not depend on the token, keep the stored one untouched
+    access_token = run_tesla_auth() if REPLAY_FILE is None else "replay"
     run_orders(access_token)
 
 